@@ -0,0 +1,11 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+
+@pytest.fixture(autouse=True)
+def _isolated_manifest_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("SKILL_AGENT_MANIFEST_CACHE", str(tmp_path / "manifest_cache"))
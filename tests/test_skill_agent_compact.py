@@ -0,0 +1,124 @@
+import json
+
+from dify_plugin.entities.model.message import (
+    AssistantPromptMessage,
+    SystemPromptMessage,
+    ToolPromptMessage,
+    UserPromptMessage,
+)
+
+from utils.skill_agent_compact import JSON_TOOL_RESULT_PREFIX, _ContextCompactor, _is_tool_result
+
+
+def _call_turn(n, *, result_chars=4000):
+    call = AssistantPromptMessage.ToolCall(
+        id=f"call-{n}",
+        type="function",
+        function=AssistantPromptMessage.ToolCall.ToolCallFunction(
+            name="read_skill_file", arguments=json.dumps({"skill_name": "docx", "relative_path": f"f{n}.md"})
+        ),
+    )
+    return [
+        AssistantPromptMessage(content="", tool_calls=[call]),
+        ToolPromptMessage(tool_call_id=f"call-{n}", name="read_skill_file", content="x" * result_chars),
+    ]
+
+
+def _conversation(turns, **kwargs):
+    query = UserPromptMessage(content="make a report")
+    messages = [SystemPromptMessage(content="rules"), query]
+    for n in range(turns):
+        messages.extend(_call_turn(n, **kwargs))
+    return messages, query
+
+
+def _assert_calls_and_results_stay_paired(messages):
+    for i, msg in enumerate(messages):
+        if isinstance(msg, ToolPromptMessage):
+            j = i
+            while j > 0 and _is_tool_result(messages[j - 1]):
+                j -= 1
+            owner = messages[j - 1]
+            assert msg.tool_call_id in {c.id for c in owner.tool_calls or []}
+
+
+def test_under_budget_is_left_alone():
+    messages, _ = _conversation(2, result_chars=100)
+    before = list(messages)
+    assert _ContextCompactor(budget=10_000, max_messages=100, pinned=[]).compact(messages) is None
+    assert messages == before
+
+
+def test_old_tool_results_are_stubbed_first_and_the_newest_group_kept():
+    messages, query = _conversation(6)
+    newest = messages[-2:]
+    stats = _ContextCompactor(budget=3000, max_messages=100, pinned=[query]).compact(messages)
+
+    assert stats["stubbed"] >= 1 and stats["after_tokens"] <= 3000
+    assert messages[-2] is newest[0] and messages[-1] is newest[1]
+    stubs = [m for m in messages if isinstance(m, ToolPromptMessage) and "已省略" in m.content]
+    assert stubs and "read_skill_file(skill_name=docx, relative_path=f0.md)" in stubs[0].content
+    _assert_calls_and_results_stay_paired(messages)
+
+
+def test_dropping_removes_calls_with_their_results_and_keeps_pins():
+    messages, query = _conversation(8)
+    stats = _ContextCompactor(budget=float("inf"), max_messages=6, pinned=[query]).compact(messages)
+
+    assert stats["dropped"] > 0
+    assert messages[0].content == "rules" and query in messages
+    assert len(messages) - 1 <= 6
+    _assert_calls_and_results_stay_paired(messages)
+
+
+def test_pinned_group_survives_a_tight_budget():
+    messages, query = _conversation(5)
+    pinned_call = messages[4]
+    _ContextCompactor(budget=1, max_messages=100, pinned=[query, pinned_call]).compact(messages)
+
+    assert query in messages and pinned_call in messages
+    assert messages[messages.index(pinned_call) + 1].tool_call_id == pinned_call.tool_calls[0].id
+    _assert_calls_and_results_stay_paired(messages)
+
+
+def test_gate_prompt_between_results_stays_in_the_turn():
+    messages, query = _conversation(4)
+    calls = [
+        AssistantPromptMessage.ToolCall(
+            id=f"gate-{n}",
+            type="function",
+            function=AssistantPromptMessage.ToolCall.ToolCallFunction(name="run_skill_command", arguments="{}"),
+        )
+        for n in range(2)
+    ]
+    gated = [
+        AssistantPromptMessage(content="", tool_calls=calls),
+        ToolPromptMessage(tool_call_id="gate-0", name="run_skill_command", content="x" * 4000),
+        UserPromptMessage(content="confirm the next command"),
+        ToolPromptMessage(tool_call_id="gate-1", name="run_skill_command", content="x" * 4000),
+    ]
+    messages[2:2] = gated
+    compactor = _ContextCompactor(budget=float("inf"), max_messages=100, pinned=[query])
+    groups = compactor._groups(messages[1:])
+    assert gated in groups
+
+    for limit in range(1, len(messages)):
+        trimmed = list(messages)
+        _ContextCompactor(budget=float("inf"), max_messages=limit, pinned=[query]).compact(trimmed)
+        kept = [m for m in gated if any(m is t for t in trimmed)]
+        assert kept in ([], gated)
+        _assert_calls_and_results_stay_paired([m for m in trimmed if not isinstance(m, UserPromptMessage)])
+
+
+def test_json_protocol_results_are_stubbed_with_their_prefix():
+    action = AssistantPromptMessage(
+        content=json.dumps({"type": "tool", "name": "read_temp_file", "arguments": {"relative_path": "a.txt"}})
+    )
+    result = AssistantPromptMessage(
+        content=JSON_TOOL_RESULT_PREFIX + json.dumps({"name": "read_temp_file", "result": "y" * 4000})
+    )
+    messages = [SystemPromptMessage(content="rules"), action, result, *_call_turn(99, result_chars=10)]
+    _ContextCompactor(budget=200, max_messages=100, pinned=[]).compact(messages)
+
+    assert messages[1] is action
+    assert messages[2].content.startswith(JSON_TOOL_RESULT_PREFIX + "[已省略较早的工具结果] read_temp_file(relative_path=a.txt)")
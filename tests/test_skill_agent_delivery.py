@@ -0,0 +1,69 @@
+import pytest
+
+from utils import skill_agent_delivery as delivery
+from utils.skill_agent_delivery import _FileDelivery, _iter_blob_chunks
+
+
+def _chunks(messages):
+    return [m.message for m in messages]
+
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_chunks_carry_the_file_and_finish_with_an_end_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(delivery, "DELIVERY_CHUNK_BYTES", 4)
+    path = _write(tmp_path / "a.bin", b"0123456789")
+    chunks = _chunks(_iter_blob_chunks(path, meta={"filename": "a.bin"}))
+
+    assert [c.sequence for c in chunks] == [0, 1, 2, 3]
+    assert b"".join(c.blob for c in chunks) == b"0123456789"
+    assert [c.end for c in chunks] == [False, False, False, True]
+    assert len({c.id for c in chunks}) == 1 and all(c.total_length == 10 for c in chunks)
+
+
+def test_empty_file_still_gets_an_end_chunk(tmp_path):
+    chunks = _chunks(_iter_blob_chunks(_write(tmp_path / "e.bin", b""), meta={}))
+    assert len(chunks) == 1 and chunks[0].end is True and chunks[0].blob == b""
+
+
+def test_read_failure_raises_without_an_end_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(delivery, "DELIVERY_CHUNK_BYTES", 4)
+    path = _write(tmp_path / "s.bin", b"0123456789")
+    received = []
+    with pytest.raises(OSError):
+        for message in _iter_blob_chunks(path, meta={}, length=20):
+            received.append(message.message)
+    assert [c.end for c in received] == [False, False, False]
+    assert b"".join(c.blob for c in received) == b"0123456789"
+
+
+def test_missing_file_fails_before_any_chunk(tmp_path):
+    gen = _iter_blob_chunks(str(tmp_path / "missing.bin"), meta={})
+    with pytest.raises(OSError):
+        next(gen)
+
+
+def test_split_parts_each_end_and_reassemble(tmp_path, monkeypatch):
+    monkeypatch.setenv("SKILL_AGENT_DELIVERY_SPLIT_BYTES", "1")
+    monkeypatch.setattr(delivery, "DELIVERY_CHUNK_BYTES", 4)
+    data = bytes(range(10))
+    messages = list(_FileDelivery().deliver(_write(tmp_path / "big.bin", data), mime_type="x", filename="big.bin"))
+
+    by_blob = {}
+    for m in messages:
+        by_blob.setdefault(m.message.id, []).append(m)
+    assert len(by_blob) == 3
+    assert [ms[0].meta["filename"] for ms in by_blob.values()] == ["big.bin.part001", "big.bin.part002", "big.bin.part003"]
+    assert all(ms[-1].message.end for ms in by_blob.values())
+    assert b"".join(m.message.blob for m in messages) == data
+
+
+def test_identical_content_is_delivered_once(tmp_path):
+    sender = _FileDelivery()
+    first = list(sender.deliver(_write(tmp_path / "a.txt", b"same"), mime_type="text/plain", filename="out.txt"))
+    again = list(sender.deliver(_write(tmp_path / "b.txt", b"same"), mime_type="text/plain", filename="out.txt"))
+    other = list(sender.deliver(_write(tmp_path / "c.txt", b"diff"), mime_type="text/plain", filename="out.txt"))
+    assert first and not again and other
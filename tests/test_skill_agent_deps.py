@@ -0,0 +1,64 @@
+import json
+import subprocess
+
+import pytest
+
+from utils import skill_agent_deps as deps
+
+
+def test_skill_venv_sees_packages_from_the_plugin_venv(tmp_path, monkeypatch):
+    plugin_site = tmp_path / "plugin-venv-site"
+    (plugin_site / "plugin_only_pkg").mkdir(parents=True)
+    (plugin_site / "plugin_only_pkg" / "__init__.py").write_text("VALUE = 'from plugin'\n")
+    monkeypatch.setenv("SKILL_AGENT_DEPS_CACHE", str(tmp_path / "deps"))
+    monkeypatch.setattr(deps, "_plugin_site_dirs", lambda: [str(plugin_site)])
+    requirements = tmp_path / "skill" / "requirements.txt"
+    requirements.parent.mkdir()
+    requirements.write_text("")
+
+    env = deps._ensure_python_env(str(requirements))
+    assert env["ok"] is True and env["deps_cache"] == "built"
+    out = subprocess.run(
+        [env["python"], "-c", "import plugin_only_pkg; print(plugin_only_pkg.VALUE)"],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "from plugin"
+    assert deps._ensure_python_env(str(requirements))["deps_cache"] == "hit"
+
+
+def _project(tmp_path, package):
+    project = tmp_path / "skill"
+    project.mkdir(exist_ok=True)
+    (project / "package.json").write_text(json.dumps(package))
+    return project
+
+
+def test_node_key_covers_install_config(tmp_path):
+    project = _project(tmp_path, {"dependencies": {"left-pad": "^1.3.0"}})
+    key, inputs = deps._node_cache_key(str(project), "npm")
+    (project / ".npmrc").write_text("registry=https://registry.example/\n")
+    key2, inputs2 = deps._node_cache_key(str(project), "npm")
+    assert key2 != key and str(project / ".npmrc") in inputs2
+
+
+@pytest.mark.parametrize(
+    "package",
+    [
+        {"dependencies": {"helper": "file:../helper"}},
+        {"devDependencies": {"helper": "link:./vendor/helper"}},
+        {"workspaces": ["packages/*"]},
+        {"scripts": {"postinstall": "node scripts/patch.js"}},
+    ],
+)
+def test_node_installs_that_reach_other_skill_files_are_not_cached(tmp_path, package):
+    project = _project(tmp_path, package)
+    cached_tree = tmp_path / "cache" / "node_modules"
+    cached_tree.mkdir(parents=True)
+    (project / "node_modules").symlink_to(cached_tree, target_is_directory=True)
+
+    assert deps._node_cache_key(str(project), "npm") is None
+    assert deps._ensure_node_modules(str(project), exe="npm", exe_path="npm", args=["install"]) is None
+    assert not (project / "node_modules").exists() and cached_tree.is_dir()
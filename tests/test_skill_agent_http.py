@@ -0,0 +1,84 @@
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from utils.skill_agent_http import _http_download
+
+
+class _FlakyFile:
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+        self.requests = []
+        self.drop_first = True
+
+
+@pytest.fixture
+def server():
+    state = _FlakyFile(bytes(range(256)) * 1024, '"v1"')
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            state.requests.append({"range": self.headers.get("Range"), "if_range": self.headers.get("If-Range")})
+            body = state.body
+            start = 0
+            rng = self.headers.get("Range")
+            if rng and self.headers.get("If-Range") == state.etag:
+                start = int(rng.split("=", 1)[1].rstrip("-"))
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            else:
+                self.send_response(200)
+            self.send_header("ETag", state.etag)
+            self.send_header("Content-Length", str(len(body) - start))
+            self.end_headers()
+            if state.drop_first:
+                state.drop_first = False
+                self.wfile.write(body[start : start + len(body) // 2])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body[start:])
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    state.url = f"http://127.0.0.1:{httpd.server_address[1]}/file.bin"
+    yield state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_broken_transfer_resumes_with_range_and_if_range(server, tmp_path):
+    path = tmp_path / "out.bin"
+    digest, size = _http_download(server.url, str(path), timeout=10)
+
+    assert path.read_bytes() == server.body
+    assert (digest, size) == (hashlib.sha256(server.body).hexdigest(), len(server.body))
+    assert server.requests[0] == {"range": None, "if_range": None}
+    resumed = server.requests[-1]
+    assert resumed["if_range"] == '"v1"'
+    assert int(resumed["range"].split("=", 1)[1].rstrip("-")) > 0
+
+
+def test_changed_resource_restarts_from_zero(server, tmp_path):
+    original = server.body
+
+    class Changing(list):
+        def append(self, item):
+            super().append(item)
+            if len(self) == 2:
+                server.body = original[::-1]
+                server.etag = '"v2"'
+
+    server.requests = Changing()
+    path = tmp_path / "out.bin"
+    digest, size = _http_download(server.url, str(path), timeout=10)
+
+    assert path.read_bytes() == original[::-1]
+    assert digest == hashlib.sha256(original[::-1]).hexdigest() and size == len(original)
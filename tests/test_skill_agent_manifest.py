@@ -0,0 +1,90 @@
+import os
+
+from utils.skill_agent_manifest import (
+    SKILL_MANIFEST_NAME,
+    _get_skill_manifest,
+    _invalidate_skill_manifest,
+    _manifest_has_python_module,
+    _manifest_path,
+    _skill_content_hash,
+)
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _make_skill(tmp_path):
+    skill = tmp_path / "demo"
+    _write(str(skill / "SKILL.md"), "---\nname: demo\ndescription: demo skill\n---\nbody\n")
+    _write(str(skill / "scripts" / "run.py"), "from lib import util\n")
+    _write(str(skill / "lib" / "util.py"), "VALUE = 1\n")
+    _invalidate_skill_manifest()
+    return str(skill)
+
+
+def _bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_manifest_is_stored_outside_the_skill_and_reused(tmp_path):
+    skill = _make_skill(tmp_path)
+    mtime = os.stat(skill).st_mtime_ns
+    first = _get_skill_manifest(skill)
+
+    assert os.path.isfile(_manifest_path(skill))
+    assert not os.path.exists(os.path.join(skill, SKILL_MANIFEST_NAME))
+    assert os.stat(skill).st_mtime_ns == mtime
+    assert first["frontmatter"]["name"] == "demo"
+    assert _manifest_has_python_module(first, "lib.util")
+    assert _get_skill_manifest(skill) is first
+
+    _invalidate_skill_manifest()
+    assert _get_skill_manifest(skill)["dirs"] == first["dirs"]
+
+
+def test_listing_does_not_hash_contents(tmp_path):
+    skill = _make_skill(tmp_path)
+    assert _get_skill_manifest(skill)["digests"] == {}
+
+
+def test_added_file_rebuilds(tmp_path):
+    skill = _make_skill(tmp_path)
+    _get_skill_manifest(skill)
+    _write(os.path.join(skill, "lib", "extra.py"), "X = 1\n")
+    _bump_mtime(os.path.join(skill, "lib"))
+
+    second = _get_skill_manifest(skill)
+    assert "lib/extra.py" in {e["relative_path"] for e in second["files"]}
+
+
+def test_skill_md_edit_in_place_rebuilds(tmp_path):
+    skill = _make_skill(tmp_path)
+    _get_skill_manifest(skill)
+    skill_md = os.path.join(skill, "SKILL.md")
+    _write(skill_md, "---\nname: demo\ndescription: demo skill\ncacheable: true\n---\n")
+    _bump_mtime(skill_md)
+
+    assert _get_skill_manifest(skill)["frontmatter"]["cacheable"] == "true"
+
+
+def test_content_hash_catches_in_place_edits_of_nested_files(tmp_path):
+    skill = _make_skill(tmp_path)
+    manifest = _get_skill_manifest(skill)
+    first = _skill_content_hash(skill, manifest)
+    assert _skill_content_hash(skill, manifest) == first
+
+    util = os.path.join(skill, "lib", "util.py")
+    _write(util, "VALUE = 2\n")
+    _bump_mtime(util)
+    assert _get_skill_manifest(skill) is manifest
+    second = _skill_content_hash(skill, manifest)
+    assert second != first
+
+    _invalidate_skill_manifest()
+    reloaded = _get_skill_manifest(skill)
+    assert reloaded["digests"]["lib/util.py"][1] == os.stat(util).st_mtime_ns
+    assert _skill_content_hash(skill, reloaded) == second
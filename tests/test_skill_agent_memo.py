@@ -0,0 +1,159 @@
+import os
+
+import pytest
+
+from utils.skill_agent_manifest import _invalidate_skill_manifest
+from utils.skill_agent_memo import (
+    _command_memo_key,
+    _is_cacheable_command,
+    _load_result_index,
+    _memo_restore,
+    _memo_store,
+)
+from utils.skill_agent_runtime import _AgentRuntime
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def _bump_mtime(path):
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def runtime(tmp_path, monkeypatch):
+    monkeypatch.setenv("SKILL_AGENT_RESULT_CACHE", str(tmp_path / "result_cache"))
+    skills = tmp_path / "skills"
+    skill = skills / "demo"
+    _write(str(skill / "SKILL.md"), "---\nname: demo\ndescription: demo\ncacheable: scripts/run.py\n---\n")
+    _write(
+        str(skill / "scripts" / "run.py"),
+        "import os, sys\n"
+        "sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))\n"
+        "from lib import util\n"
+        "print(util.VALUE)\n",
+    )
+    _write(str(skill / "lib" / "__init__.py"), "")
+    _write(str(skill / "lib" / "util.py"), "VALUE = 'one'\n")
+    _invalidate_skill_manifest()
+    session = tmp_path / "session"
+    session.mkdir()
+    return _AgentRuntime(skills_root=str(skills), session_dir=str(session), max_steps=1, memory_turns=0)
+
+
+def _run(runtime):
+    return runtime.run_skill_command(skill_name="demo", command=["python", "scripts/run.py"])
+
+
+def test_repeated_command_is_served_from_cache(runtime):
+    first = _run(runtime)
+    second = _run(runtime)
+    assert first["returncode"] == 0 and not first.get("cached")
+    assert second.get("cached") is True
+    assert second["stdout"] == first["stdout"]
+
+
+def test_editing_an_imported_helper_misses_the_cache(runtime):
+    assert _run(runtime)["stdout"].strip() == "one"
+    util = os.path.join(runtime.skills_root, "demo", "lib", "util.py")
+    _write(util, "VALUE = 'two'\n")
+    _bump_mtime(util)
+
+    second = _run(runtime)
+    assert not second.get("cached")
+    assert second["stdout"].strip() == "two"
+
+
+def test_cacheable_targets():
+    fm = {"cacheable": "scripts/run.py, pkg"}
+    assert _is_cacheable_command(fm, ["python", "scripts/run.py"])
+    assert _is_cacheable_command(fm, ["python", "-m", "pkg"])
+    assert not _is_cacheable_command(fm, ["python", "scripts/other.py"])
+    assert not _is_cacheable_command({"cacheable": "false"}, ["python", "scripts/run.py"])
+    assert _is_cacheable_command({"cacheable": "true"}, ["node", "anything.js"])
+
+
+def test_install_commands_are_never_cacheable():
+    fm = {"cacheable": "true"}
+    assert not _is_cacheable_command(fm, ["/usr/bin/python3", "-m", "pip", "install", "requests"])
+    assert not _is_cacheable_command(fm, ["/usr/bin/pip", "install", "-r", "requirements.txt"])
+    assert not _is_cacheable_command(fm, ["/usr/bin/npm", "install"])
+    assert not _is_cacheable_command(fm, ["/usr/bin/npm", "--silent", "ci"])
+    assert not _is_cacheable_command(fm, ["/usr/bin/bun", "add", "left-pad"])
+    assert not _is_cacheable_command(fm, ["/usr/bin/uv", "pip", "install", "x"])
+    assert _is_cacheable_command(fm, ["/usr/bin/npm", "run", "build"])
+
+
+def test_run_that_writes_into_the_skill_folder_is_not_stored(runtime):
+    script = os.path.join(runtime.skills_root, "demo", "scripts", "run.py")
+    with open(script, "a", encoding="utf-8") as f:
+        f.write("open(os.path.join(os.path.dirname(__file__), 'state.txt'), 'a').write('x')\n")
+
+    first = _run(runtime)
+    assert first["returncode"] == 0
+    assert first["memo_skipped"] == "command wrote outside the session directory"
+    second = _run(runtime)
+    assert not second.get("cached")
+    with open(os.path.join(runtime.skills_root, "demo", "scripts", "state.txt"), encoding="utf-8") as f:
+        assert f.read() == "xx"
+
+
+def test_absolute_path_outside_session_and_skill_is_not_memoized(tmp_path):
+    session = tmp_path / "session"
+    skill = tmp_path / "skill"
+    _write(str(skill / "data.csv"), "a")
+
+    def key(path):
+        return _command_memo_key(
+            skill_hash="h",
+            command=["/usr/bin/python3", "run.py", "--out", path],
+            cwd_relative=None,
+            session_dir=str(session),
+            skill_path=str(skill),
+        )
+
+    assert key(str(tmp_path / "elsewhere" / "out.txt")) is None
+    assert key(str(skill / "data.csv")) is not None
+    assert key(str(session / "out.txt")) is not None
+
+
+def test_memo_key_hashes_session_inputs_not_their_paths(tmp_path):
+    a, b = tmp_path / "a", tmp_path / "b"
+    for session in (a, b):
+        _write(str(session / "uploads" / "in.txt"), "same")
+
+    def key(session):
+        return _command_memo_key(
+            skill_hash="h",
+            command=["/usr/bin/python3", "run.py", str(session / "uploads" / "in.txt")],
+            cwd_relative=None,
+            session_dir=str(session),
+        )
+
+    assert key(a) == key(b)
+    _write(str(b / "uploads" / "in.txt"), "different")
+    assert key(a) != key(b)
+
+
+def test_store_evicts_least_recently_used_entries_by_index(tmp_path, monkeypatch):
+    cache = tmp_path / "result_cache"
+    monkeypatch.setenv("SKILL_AGENT_RESULT_CACHE", str(cache))
+    monkeypatch.setenv("SKILL_AGENT_RESULT_CACHE_BYTES", "7000")
+    session = tmp_path / "session"
+    _write(str(session / "out.bin"), "x" * 2000)
+    keys = [f"{i:02x}" + "0" * 62 for i in range(4)]
+
+    _memo_store(keys[0], {"returncode": 0}, str(session), ["out.bin"])
+    _memo_store(keys[1], {"returncode": 0}, str(session), ["out.bin"])
+    assert _memo_restore(keys[0], str(session))["cached"] is True
+    _memo_store(keys[2], {"returncode": 0}, str(session), ["out.bin"])
+    _memo_store(keys[3], {"returncode": 0}, str(session), ["out.bin"])
+
+    index = _load_result_index(str(cache))
+    assert set(index["entries"]) == {keys[0], keys[2], keys[3]}
+    assert not os.path.exists(cache / keys[1][:2] / keys[1])
+    assert _memo_restore(keys[1], str(session)) is None
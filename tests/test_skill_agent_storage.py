@@ -0,0 +1,91 @@
+import json
+
+from utils.skill_agent_constants import HISTORY_SEGMENT_TURNS
+from utils.skill_agent_storage import (
+    _append_history_turn,
+    _history_segment_key,
+    _read_history_turns,
+)
+
+KEY = "skill:history:conv-1"
+
+
+class _Storage:
+    def __init__(self):
+        self.data = {}
+        self.writes = 0
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.writes += 1
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class _StorageWithoutDelete(_Storage):
+    delete = None
+
+
+def _append(storage, n, max_turns=50):
+    _append_history_turn(storage, history_key=KEY, user_text=f"q{n}", assistant_text=f"a{n}", max_turns=max_turns)
+
+
+def _users(turns):
+    return [t["user"] for t in turns]
+
+
+def test_turns_read_back_in_order_across_segments():
+    storage = _Storage()
+    for n in range(HISTORY_SEGMENT_TURNS * 2 + 3):
+        _append(storage, n)
+    total = HISTORY_SEGMENT_TURNS * 2 + 3
+    assert _users(_read_history_turns(storage, KEY, 5)) == [f"q{n}" for n in range(total - 5, total)]
+    assert _users(_read_history_turns(storage, KEY, 1000)) == [f"q{n}" for n in range(total)]
+    assert _read_history_turns(storage, KEY, 0) == []
+
+
+def test_each_append_writes_one_segment_and_the_head():
+    storage = _Storage()
+    for n in range(HISTORY_SEGMENT_TURNS + 1):
+        _append(storage, n)
+    before = storage.writes
+    _append(storage, 99)
+    assert storage.writes - before == 2
+
+
+def test_segments_outside_the_window_are_deleted():
+    storage = _Storage()
+    seg = HISTORY_SEGMENT_TURNS
+    for n in range(seg * 4):
+        _append(storage, n, max_turns=seg + 1)
+
+    head = json.loads(storage.data[KEY])
+    assert head["count"] == seg * 4 and head["first"] == seg * 3 - 1
+    live = sorted(k for k in storage.data if k.startswith(KEY + ":seg:"))
+    assert live == [_history_segment_key(KEY, 2), _history_segment_key(KEY, 3)]
+    assert _users(_read_history_turns(storage, KEY, 1000)) == [f"q{n}" for n in range(seg * 3 - 1, seg * 4)]
+
+
+def test_storage_without_delete_blanks_released_segments():
+    storage = _StorageWithoutDelete()
+    seg = HISTORY_SEGMENT_TURNS
+    for n in range(seg * 3):
+        _append(storage, n, max_turns=seg)
+    assert storage.data[_history_segment_key(KEY, 0)] == b""
+    assert _users(_read_history_turns(storage, KEY, 1000)) == [f"q{n}" for n in range(seg * 2, seg * 3)]
+
+
+def test_legacy_single_blob_is_read_then_migrated_on_append():
+    storage = _Storage()
+    legacy = [{"user": f"old{n}", "assistant": "x", "created_at": 0} for n in range(12)]
+    storage.set(KEY, json.dumps({"turns": legacy}).encode("utf-8"))
+    assert _users(_read_history_turns(storage, KEY, 3)) == ["old9", "old10", "old11"]
+
+    _append(storage, 0, max_turns=10)
+    head = json.loads(storage.data[KEY])
+    assert head["v"] == 2 and "turns" not in head
+    assert _users(_read_history_turns(storage, KEY, 1000)) == [f"old{n}" for n in range(3, 12)] + ["q0"]
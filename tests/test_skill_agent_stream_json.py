@@ -0,0 +1,78 @@
+import json
+import random
+
+import pytest
+
+from utils.skill_agent_stream_json import _JsonStreamSniffer
+from utils.tools import _extract_first_json_object
+
+
+def _should_emit_user_text(text):
+    # The whole-buffer check the sniffer replaced, kept here as the reference.
+    if not text:
+        return False
+    stripped = text.lstrip()
+    if stripped.startswith("{") and _extract_first_json_object(text) is None:
+        return False
+    if stripped.startswith("```") and stripped.count("```") < 2:
+        return False
+    json_text = _extract_first_json_object(text)
+    if not json_text:
+        return True
+    try:
+        obj = json.loads(json_text)
+    except Exception:
+        return True
+    if not isinstance(obj, dict):
+        return True
+    return obj.get("type") not in {"tool", "final"}
+
+
+def _feed_and_compare(chunks):
+    sniffer = _JsonStreamSniffer()
+    seen = ""
+    visible = ""
+    for chunk in chunks:
+        sniffer.feed(chunk)
+        seen += chunk
+        combined = seen.strip()
+        assert sniffer.text() == combined
+        expected = _should_emit_user_text(combined) if combined else False
+        assert sniffer.should_emit() == expected, (chunks, combined)
+        if expected:
+            visible += sniffer.take_visible()
+            assert visible == combined
+    return sniffer
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        ['{"type":', ' "tool", "name": "x", "arguments": {}}'],
+        ["好的，", "这是结果。"],
+        ['{"type": "final", "content": "done"}'],
+        ['{"note": "not a protocol action"}', " trailing"],
+        ["```json\n", '{"type": "tool"}\n', "```"],
+        ["  \n", "{", '"a": "}"', "}"],
+        ['prefix {"type": "final", "content": "x"} suffix'],
+        ['{"s": "\\"{"', "}"],
+        ["``", "`js\ncode``", "`"],
+    ],
+)
+def test_matches_the_whole_buffer_check(chunks):
+    _feed_and_compare(chunks)
+
+
+def test_protocol_json_is_never_emitted():
+    sniffer = _feed_and_compare(['{"type": "tool", ', '"name": "get_skill_metadata", "arguments": {"skill_name": "a"}}'])
+    assert sniffer.should_emit() is False
+
+
+def test_randomized_streams_match_the_whole_buffer_check():
+    rng = random.Random(20240601)
+    pieces = ["{", "}", '"', "\\", "`", "```", " ", "\n", "a", "文", ":", ",", '"type"', '"tool"', '"final"', "json"]
+    for _ in range(3000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(1, 30)))
+        cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(0, 5)))) if len(text) > 1 else []
+        chunks = [text[i:j] for i, j in zip([0, *cuts], [*cuts, len(text)])]
+        _feed_and_compare(chunks)
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import stat
+
+import pytest
+
+from utils import skill_agent_upload_store as store
+from utils.skill_agent_runtime import _AgentRuntime
+
+BODY = b"shared upload body"
+
+
+@pytest.fixture
+def fake_http(tmp_path, monkeypatch):
+    monkeypatch.setenv("SKILL_AGENT_UPLOAD_STORE", str(tmp_path / "store"))
+    calls = {"download": 0}
+
+    def head(url, timeout):
+        return {"size": len(BODY), "etag": '"v1"', "accept_ranges": True}
+
+    def download(url, path, *, timeout, on_bytes=None):
+        calls["download"] += 1
+        with open(path, "wb") as f:
+            f.write(BODY)
+        if on_bytes is not None:
+            on_bytes(len(BODY), len(BODY))
+        return hashlib.sha256(BODY).hexdigest(), len(BODY)
+
+    monkeypatch.setattr(store, "_http_head", head)
+    monkeypatch.setattr(store, "_http_download", download)
+    return calls
+
+
+def test_upload_key_ignores_only_signature_params():
+    meta = {"size": 10, "etag": "e"}
+    base = store._upload_key("https://h/files/a.pdf?id=1&timestamp=1&nonce=a&sign=x", meta)
+    assert base == store._upload_key("https://h/files/a.pdf?sign=y&nonce=b&timestamp=2&id=1", meta)
+    assert base != store._upload_key("https://h/files/a.pdf?id=2&timestamp=1&nonce=a&sign=x", meta)
+    assert base != store._upload_key("https://h/files/a.pdf?id=1", {"size": 10, "etag": "f"})
+
+
+def test_repeated_upload_is_copied_from_a_read_only_blob(tmp_path, fake_http):
+    first = store._fetch_upload("https://h/f/a.txt?timestamp=1&sign=a", str(tmp_path / "s1.txt"))
+    second = store._fetch_upload("https://h/f/a.txt?timestamp=2&sign=b", str(tmp_path / "s2.txt"))
+
+    assert first["cached"] is False and second["cached"] is True
+    assert fake_http["download"] == 1
+    blob = store._blob_path(str(tmp_path / "store"), first["sha256"])
+    assert stat.S_IMODE(os.stat(blob).st_mode) == 0o444
+    assert (tmp_path / "s2.txt").read_bytes() == BODY
+
+
+def test_in_place_edit_of_an_upload_stays_private(tmp_path, fake_http):
+    fetched = store._fetch_upload("https://h/f/a.txt", str(tmp_path / "s1.txt"))
+    store._fetch_upload("https://h/f/a.txt", str(tmp_path / "s2.txt"))
+    blob = store._blob_path(str(tmp_path / "store"), fetched["sha256"])
+
+    assert os.stat(tmp_path / "s1.txt").st_ino != os.stat(blob).st_ino
+    assert stat.S_IMODE(os.stat(tmp_path / "s1.txt").st_mode) == 0o644
+    with open(tmp_path / "s1.txt", "r+b") as f:
+        f.write(b"EDITED")
+
+    assert (tmp_path / "s2.txt").read_bytes() == BODY
+    with open(blob, "rb") as f:
+        assert f.read() == BODY
+
+
+def test_write_temp_file_leaves_the_blob_alone(tmp_path, fake_http):
+    session = tmp_path / "session"
+    (session / "uploads").mkdir(parents=True)
+    fetched = store._fetch_upload("https://h/f/a.txt", str(session / "uploads" / "a.txt"))
+    blob = store._blob_path(str(tmp_path / "store"), fetched["sha256"])
+
+    runtime = _AgentRuntime(skills_root=None, session_dir=str(session), max_steps=1, memory_turns=0)
+    assert "error" not in runtime.write_temp_file("uploads/a.txt", "edited")
+
+    assert (session / "uploads" / "a.txt").read_text() == "edited"
+    with open(blob, "rb") as f:
+        assert f.read() == BODY
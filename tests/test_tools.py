@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from utils import tools
+from utils.tools import _read_text_head, _read_text_range
+
+
+def _write_bytes(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_head_byte_count_is_a_valid_offset_with_crlf(tmp_path):
+    path = _write_bytes(tmp_path / "a.txt", "héllo\r\nwörld\r\n".encode("utf-8"))
+    head, consumed = _read_text_head(path, 6)
+    assert head == "héllo\n"
+    assert consumed == len("héllo\r\n".encode("utf-8"))
+    rest = _read_text_range(path, offset=consumed, max_bytes=1000)
+    assert rest["content"] == "wörld\r\n" and rest["eof"] is True
+
+
+@pytest.mark.parametrize("limit", [0, 1, 5, 6, 7, 12, 1000])
+def test_head_matches_text_mode_read_on_crlf_file(tmp_path, limit):
+    data = "a\r\nb\rc\n".encode("utf-8") + b"\xff\r\xfe\nd\xe6\x95" + "数据\r\n".encode("utf-8") * 3
+    path = _write_bytes(tmp_path / "crlf.txt", data)
+    head, consumed = _read_text_head(path, limit)
+    assert head == tools._read_text(path, limit)
+    assert 0 <= consumed <= len(data)
+
+
+def test_byte_pages_reassemble_multibyte_text(tmp_path):
+    text = "数据" * 500 + "tail"
+    path = _write_bytes(tmp_path / "b.txt", text.encode("utf-8"))
+    parts, offset = [], 0
+    while offset is not None:
+        page = _read_text_range(path, offset=offset, length=101)
+        assert page["bytes_read"] <= 101
+        parts.append(page["content"])
+        offset = page["next_offset"]
+    assert "".join(parts) == text
+
+
+def test_byte_offset_inside_a_character_skips_to_the_next_one(tmp_path):
+    path = _write_bytes(tmp_path / "c.txt", "数据".encode("utf-8"))
+    page = _read_text_range(path, offset=1, length=100)
+    assert page["offset"] == 3 and page["content"] == "据"
+
+
+def test_line_pages_use_checkpoints_and_reassemble(tmp_path, monkeypatch):
+    monkeypatch.setattr(tools, "_LINE_INDEX_STRIDE", 4)
+    lines = [f"line {i}\n" for i in range(1, 31)]
+    path = _write_bytes(tmp_path / "d.txt", "".join(lines).encode("utf-8"))
+
+    page = _read_text_range(path, start_line=22, end_line=24)
+    assert page["content"] == "".join(lines[21:24])
+    assert page["next_line"] is None
+    st = os.stat(path)
+    checkpoints = tools._LINE_INDEX_CACHE[(os.path.abspath(path), st.st_mtime_ns, st.st_size)]
+    assert len(checkpoints) == 6
+    with open(path, "rb") as f:
+        for n, pos in enumerate(checkpoints):
+            f.seek(pos)
+            assert f.readline().decode() == lines[n * 4]
+
+    parts, line = [], 1
+    while line is not None:
+        page = _read_text_range(path, start_line=line, max_bytes=40)
+        parts.append(page["content"])
+        line = page["next_line"]
+    assert "".join(parts) == "".join(lines)
+
+
+def test_line_longer_than_the_page_continues_by_offset(tmp_path):
+    path = _write_bytes(tmp_path / "e.txt", b"short\n" + b"x" * 100 + b"\nend\n")
+    page = _read_text_range(path, start_line=2, max_bytes=30)
+    assert page["line_truncated"] is True
+    assert page["content"] == "x" * 30
+    assert page["next_offset"] == 6 + 30 and page["next_line"] == 3
+    assert _read_text_range(path, start_line=3)["content"] == "end\n"
+
+
+def test_line_past_the_end_is_eof(tmp_path):
+    path = _write_bytes(tmp_path / "f.txt", b"one\ntwo\n")
+    page = _read_text_range(path, start_line=9)
+    assert page["content"] == "" and page["eof"] is True
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import mimetypes
+import os
 import re
 import shutil
 import tempfile
@@ -9,18 +10,25 @@ from collections.abc import Generator
 from pathlib import Path
 from typing import Any
 from urllib.parse import urlparse
-from urllib.request import Request, urlopen
-from zipfile import ZipFile
+from zipfile import ZIP_DEFLATED, ZipFile
 
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 
+from utils.skill_agent_exec import _populate_wheelhouse
+from utils.skill_agent_http import _http_get_bytes
+from utils.skill_agent_index import _invalidate_skills_index
+from utils.skill_agent_manifest import (
+    SKILL_MANIFEST_NAME,
+    _get_skill_manifest,
+    _invalidate_skill_manifest,
+    _write_skill_manifest,
+)
+
 
 def get_file_content(url: str, timeout: int = 30) -> bytes:
     try:
-        req = Request(url, headers={"User-Agent": "dify-plugin-skill/1.0"})
-        with urlopen(req, timeout=timeout) as resp:
-            return resp.read()
+        return _http_get_bytes(url, timeout=timeout)
     except Exception as e:
         raise RuntimeError(f"文件下载失败: {str(e)}") from e
 
@@ -98,6 +106,38 @@ def _safe_extract_zip(zip_path: Path, dest_dir: Path) -> None:
                 shutil.copyfileobj(src, dst)
 
 
+def _skill_requirements(skill_dir: Path) -> list[Path]:
+    manifest = _get_skill_manifest(str(skill_dir)) or {}
+    rels = (manifest.get("entry_points") or {}).get("requirements") or []
+    paths = [skill_dir / Path(*str(r).split("/")) for r in rels]
+    if not paths and (skill_dir / "requirements.txt").is_file():
+        paths = [skill_dir / "requirements.txt"]
+    return [p for p in paths if p.is_file()]
+
+
+def _cache_skill_wheels(skill_dir: Path) -> list[str]:
+    lines: list[str] = []
+    for req in _skill_requirements(skill_dir):
+        rel = req.relative_to(skill_dir).as_posix()
+        result = _populate_wheelhouse(str(req))
+        if result.get("returncode") == 0:
+            lines.append(f"✅{skill_dir.name}/{rel} 的依赖已缓存到 {result.get('wheelhouse')}")
+        else:
+            detail = str(result.get("stderr") or result.get("stdout") or result.get("error") or "").strip()[-800:]
+            lines.append(f"❌{skill_dir.name}/{rel} 的依赖缓存失败：{detail or result.get('returncode')}")
+    return lines
+
+
+def _archive_skill(skill_dir: Path, zip_path: Path) -> None:
+    # Older installs kept a manifest inside the skill folder; that local cache must not travel with an export.
+    with ZipFile(zip_path, "w", compression=ZIP_DEFLATED) as zf:
+        zf.write(skill_dir, skill_dir.name)
+        for p in sorted(skill_dir.rglob("*")):
+            if p.name.startswith(SKILL_MANIFEST_NAME):
+                continue
+            zf.write(p, (Path(skill_dir.name) / p.relative_to(skill_dir)).as_posix())
+
+
 def _find_skill_folders(extracted_root: Path) -> list[Path]:
     candidates: list[Path] = []
     for p in extracted_root.iterdir():
@@ -201,10 +241,24 @@ class TMTool(Tool):
                             shutil.move(str(folder), str(target))
                             installed.append(target.name)
                         except Exception as e:
+                            _invalidate_skills_index(str(skills_dir))
                             yield self.create_text_message(f"❌安装技能失败：{e}\n")
                             return
+                        try:
+                            _write_skill_manifest(str(target))
+                        except Exception:
+                            # The manifest is only a cache; it is rebuilt on first use.
+                            pass
+                        _invalidate_skills_index(str(skills_dir))
 
             yield self.create_text_message("✅技能已安装：\n" + "\n".join(installed) + "\n")
+            if os.getenv("SKILL_AGENT_WHEELHOUSE"):
+                # Pre-build wheels now so runtime auto_install is a local copy, even on offline nodes.
+                wheel_lines: list[str] = []
+                for name in installed:
+                    wheel_lines.extend(_cache_skill_wheels(skills_dir / name))
+                if wheel_lines:
+                    yield self.create_text_message("\n".join(wheel_lines) + "\n")
             skills = list_skills_sorted()
             lines = [f"{idx + 1}. {p.name}" for idx, p in enumerate(skills)]
             yield self.create_text_message("👓当前技能列表：\n" + ("\n".join(lines) if lines else "（空）\n"))
@@ -221,8 +275,11 @@ class TMTool(Tool):
             try:
                 shutil.rmtree(target, ignore_errors=False)
             except Exception as e:
+                _invalidate_skills_index(str(target.parent))
                 yield self.create_text_message(f"❌删除失败：{e}\n")
                 return
+            _invalidate_skills_index(str(target.parent))
+            _invalidate_skill_manifest(str(target))
             yield self.create_text_message(f"✅已删除技能{idx}：{target.name}\n")
             skills = list_skills_sorted()
             if not skills:
@@ -245,7 +302,7 @@ class TMTool(Tool):
                 with tempfile.TemporaryDirectory(prefix="skill-zip-") as td:
                     tmp_dir = Path(td)
                     zip_path = tmp_dir / f"{target.name}.zip"
-                    shutil.make_archive(str(zip_path.with_suffix("")), "zip", root_dir=target.parent, base_dir=target.name)
+                    _archive_skill(target, zip_path)
                     blob = zip_path.read_bytes()
             except Exception as e:
                 yield self.create_text_message(f"❌读取文件失败：{e}\n")
@@ -265,5 +322,20 @@ class TMTool(Tool):
             )
             return
 
-        yield self.create_text_message("😑未识别的技能管理命令。支持：查看技能、新增技能、删除技能N、下载技能N。\n")
+        m_wh = re.match(r"^缓存依赖(\d+)$", command)
+        if m_wh:
+            idx = int(m_wh.group(1))
+            skills = list_skills_sorted()
+            if idx < 1 or idx > len(skills):
+                yield self.create_text_message("❌技能序号无效或超出范围。请先使用“查看技能”确认序号。\n")
+                return
+            target = skills[idx - 1]
+            if not _skill_requirements(target):
+                yield self.create_text_message(f"😑技能{idx}：{target.name} 未声明 requirements.txt，无需缓存依赖。\n")
+                return
+            yield self.create_text_message(f"⏳正在缓存技能{idx}：{target.name} 的依赖…\n")
+            yield self.create_text_message("\n".join(_cache_skill_wheels(target)) + "\n")
+            return
+
+        yield self.create_text_message("😑未识别的技能管理命令。支持：查看技能、新增技能、删除技能N、下载技能N、缓存依赖N。\n")
         return
@@ -10,14 +10,14 @@ from typing import Any
 
 from utils.tools import (
     _build_prompt_message_tools,
-    _download_file_content,
+    _coerce_optional_int,
+    _coerce_string_list,
     _extract_first_json_object,
     _extract_url_and_name,
     _guess_mime_type,
     _infer_ext_from_url,
     _is_allow_reply,
     _is_deny_reply,
-    _list_dir,
     _parse_tool_call,
     _safe_filename,
     _safe_get,
@@ -26,21 +26,46 @@ from utils.tools import (
     _split_message_content,
  )
 
-from utils.skill_agent_constants import HISTORY_TRANSCRIPT_MAX_CHARS
+from utils.skill_agent_cache import _FILE_READ_CACHE
+from utils.skill_agent_compact import _ContextCompactor
+from utils.skill_agent_constants import (
+    CONTEXT_TOKEN_BUDGET,
+    HISTORY_TRANSCRIPT_MAX_CHARS,
+    STREAM_FLUSH_CHARS,
+    STREAM_FLUSH_MS,
+)
 from utils.skill_agent_debug import _dbg, _model_brief
-from utils.skill_agent_exec import _cleanup_old_temp_sessions, _detect_skills_root
-from utils.skill_agent_runtime import _AgentRuntime
-from utils.skill_agent_schemas import TOOL_SCHEMAS, _tool_call_retry_prompt, _validate_tool_arguments
+from utils.skill_agent_delivery import _FileDelivery
+from utils.skill_agent_emitter import _TextCoalescer
+from utils.skill_agent_exec import (
+    _cleanup_old_temp_sessions,
+    _detect_skills_root,
+    _executable_summary,
+    _probe_executables,
+)
+from utils.skill_agent_prompt import _build_system_prompt
+from utils.skill_agent_retrieval import _shortlist_skills
+from utils.skill_agent_runtime import _AgentRuntime, _get_tool_executor
+from utils.skill_agent_schemas import (
+    READ_ONLY_TOOLS,
+    TOOL_SCHEMAS,
+    _tool_call_retry_prompt,
+    _validate_tool_arguments,
+)
 from utils.skill_agent_storage import (
     _append_history_turn,
     _get_history_storage_key,
     _get_resume_storage_key,
     _get_session_dir_storage_key,
+    _read_history_turns,
     _storage_get_json,
     _storage_get_text,
     _storage_set_json,
     _storage_set_text,
 )
+from utils.skill_agent_stream_json import _JsonStreamSniffer
+from utils.skill_agent_tool_results import _offload_tool_result
+from utils.skill_agent_upload_store import _fetch_uploads
 from utils.skill_agent_uploads import _build_uploads_context
 
 from dify_plugin import Tool
@@ -60,8 +85,18 @@ class SkillAgentTool(Tool):
         max_steps = int(tool_parameters.get("max_steps") or 8)
         memory_turns = int(tool_parameters.get("memory_turns") or 10)
         history_turns = int(tool_parameters.get("history_turns") or 0)
+        skills_top_k = int(tool_parameters.get("skills_top_k") or 8)
+        context_token_budget = _coerce_optional_int(tool_parameters.get("context_token_budget"))
+        if context_token_budget is None:
+            context_token_budget = CONTEXT_TOKEN_BUDGET
+        stream_flush_chars = _coerce_optional_int(tool_parameters.get("stream_flush_chars")) or STREAM_FLUSH_CHARS
+        stream_flush_ms = _coerce_optional_int(tool_parameters.get("stream_flush_ms"))
+        if stream_flush_ms is None:
+            stream_flush_ms = STREAM_FLUSH_MS
         system_prompt = tool_parameters.get("system_prompt") or "你是一个xxxx"
         skills_root = _detect_skills_root(tool_parameters.get("skills_root"))
+        # Kick off the one-time command probe so it overlaps with upload handling.
+        _probe_executables()
 
         if not query or not isinstance(query, str):
             yield self.create_text_message("❌缺少 query 参数\n")
@@ -121,31 +156,31 @@ class SkillAgentTool(Tool):
             file_items = [tool_parameters.get("file")]
 
         uploads_context = ""
+        upload_errors_context = ""
         if file_items:
             uploads_dir = _safe_join(session_dir, "uploads")
             os.makedirs(uploads_dir, exist_ok=True)
             uploaded: list[dict[str, Any]] = []
-            for item in file_items:
+            jobs: list[dict[str, Any]] = []
+            taken: set[str] = set()
+            upload_failures: list[dict[str, Any]] = []
+            for idx, item in enumerate(file_items):
                 url, name = _extract_url_and_name(item)
                 if not url:
-                    yield self.create_text_message("❌未能获取上传文件 URL（files[i].url）。\n")
-                    return
-                try:
-                    content = _download_file_content(str(url), timeout=45)
-                except Exception as e:
-                    yield self.create_text_message(f"❌文件下载失败：{str(e)}\n")
-                    return
+                    upload_failures.append(
+                        {"filename": str(name or f"files[{idx}]"), "ok": False, "error": "未能获取上传文件 URL"}
+                    )
+                    continue
                 ext = _infer_ext_from_url(str(url))
                 filename = _safe_filename(str(name) if name else None, fallback_ext=ext)
-                abs_path = os.path.join(uploads_dir, filename)
-                try:
-                    with open(abs_path, "wb") as f:
-                        f.write(content)
-                except Exception as e:
-                    yield self.create_text_message(f"❌保存上传文件失败：{str(e)}\n")
-                    return
-
-                rel_path = f"uploads/{filename}"
+                if filename in taken:
+                    stem, dot, suffix = filename.rpartition(".")
+                    base, tail = (stem, dot + suffix) if dot else (filename, "")
+                    n = 1
+                    while f"{base}-{n}{tail}" in taken:
+                        n += 1
+                    filename = f"{base}-{n}{tail}"
+                taken.add(filename)
                 mime = None
                 if isinstance(item, dict) and item.get("mime_type"):
                     mime = str(item.get("mime_type") or "").strip() or None
@@ -154,15 +189,29 @@ class SkillAgentTool(Tool):
                         mime = _guess_mime_type(filename)
                     except Exception:
                         mime = None
+                jobs.append({"url": str(url), "filename": filename, "mime_type": mime or ""})
+
+            for fetched in _fetch_uploads(jobs, uploads_dir, timeout=45):
+                if not fetched.get("ok"):
+                    upload_failures.append(fetched)
+                    continue
                 uploaded.append(
                     {
-                        "relative_path": rel_path,
-                        "bytes": len(content),
-                        "mime_type": mime or "",
-                        "filename": filename,
-                        "source_url": str(url),
+                        "relative_path": f"uploads/{fetched['filename']}",
+                        "bytes": int(fetched.get("bytes") or 0),
+                        "mime_type": fetched.get("mime_type") or "",
+                        "filename": fetched["filename"],
+                        "source_url": fetched["url"],
                     }
                 )
+            if upload_failures:
+                report = "\n".join(f"- {f['filename']}：{f.get('error')}" for f in upload_failures)
+                yield self.create_text_message(f"❌以下文件下载失败：\n{report}\n")
+                if not uploaded:
+                    return
+                upload_errors_context = (
+                    "\n[上传失败文件]\n以下附件未能获取，不要假设其内容；如任务依赖它们，请告知用户重新上传：\n" + report + "\n"
+                )
 
             lines = ["\n\n[上传文件清单]", "以下路径均相对于本次会话的 session_dir："]
             for f in uploaded:
@@ -174,7 +223,7 @@ class SkillAgentTool(Tool):
             uploads_dir = _safe_join(session_dir, "uploads")
             os.makedirs(uploads_dir, exist_ok=True)
 
-        uploads_context = _build_uploads_context(session_dir)
+        uploads_context = _build_uploads_context(session_dir) + upload_errors_context
 
         runtime = _AgentRuntime(
             skills_root=skills_root,
@@ -182,14 +231,15 @@ class SkillAgentTool(Tool):
             max_steps=max_steps,
             memory_turns=memory_turns,
         )
+        if file_items:
+            runtime.session_files().record([str(f.get("relative_path") or "") for f in uploaded])
 
         history_messages: list[Any] = []
         if history_turns > 0:
-            history_state = _storage_get_json(storage, history_key)
-            turns = history_state.get("turns")
-            if isinstance(turns, list) and turns:
+            turns = _read_history_turns(storage, history_key, history_turns)
+            if turns:
                 picked: list[tuple[str, str]] = []
-                for t in reversed(turns[-history_turns:]):
+                for t in reversed(turns):
                     if not isinstance(t, dict):
                         continue
                     u = str(t.get("user") or "").strip()
@@ -220,72 +270,45 @@ class SkillAgentTool(Tool):
             skills_count = len(skills_index.get("skills") or []) if isinstance(skills_index, dict) else 0
         except Exception:
             skills_count = 0
+        retrieval_text = "\n".join(
+            [str(getattr(m, "content", "") or "") for m in history_messages if isinstance(m, UserPromptMessage)][-2:]
+            + [str(query)]
+        )
+        skills_shortlist = _shortlist_skills(skills_index, retrieval_text, skills_top_k)
         _dbg(
             "start "
             + _model_brief(model)
             + f" session_dir={session_dir} skills_root={skills_root!s} skills_count={skills_count} "
-            + f"query_len={len(query)}"
+            + f"query_len={len(query)} skills_shortlisted={len(skills_shortlist)}"
         )
-        system_content = (
-            system_prompt.strip()
-            + "\n\n你是一个使用 Skills 文件夹作为“工具箱”的通用型 Agent。\n"
-            + "\n[会话路径]\n"
-            + f"- session_dir: {session_dir}\n"
-            + f"- skills_root: {skills_root}\n"
-            + "你必须遵循渐进式披露流程：\n"
-            + "1) 只根据技能元数据（name/description）判断可能相关的技能\n"
-            + "2) 触发时才调用 get_skill_metadata 读取 SKILL.md（说明文档）\n"
-            + "3) 任何对技能的进一步操作（list_skill_files/read_skill_file/run_skill_command）之前，必须先 get_skill_metadata；若未执行，本系统会拒绝该调用并要求你先补读说明书。\n"
-            + "4) 按说明书内容执行脚本/命令，或进一步搜索资料前，必须先调用 list_skill_files 查看技能包的目录结构，以确保在正确的目录执行命令。\n"
-            + "5) 只有在需要更深信息时，才调用 read_skill_file\n"
-            + "6) 只有在明确需要执行脚本/命令时，才调用 run_skill_command\n"
-            + "7) 执行前必须先确认技能包内确实存在可执行入口（脚本/模块等），不要猜测模块名；如果缺少可执行入口，则先交付当前可交付产物，并询问用户是否允许你在 temp 目录中自行创建脚本后再尝试生成。\n"
-            + "8) 按说明书要求生成最终文件后，必须用 export_temp_file 标记最终文件\n"
-            + "路径规则：uploads/ 与你用 write_temp_file 生成的中间产物都位于 session_dir 下；run_skill_command 的 cwd 在 skills_root/<skill_name> 下。\n"
-            + "因此：只要命令参数需要引用 uploads/ 或 temp 中间文件，一律使用 read_temp_file 返回的绝对路径（result.path）传给命令；不要使用 ../uploads、../../temp 这类相对路径猜测。\n"
-            + "依赖安装规则：如需 npm install/npm ci/bun install，必须用 run_skill_command 在技能包内含 package.json 的目录执行（通过 cwd_relative 指到该目录）；禁止在 session_dir 执行 install，否则会写入 temp/<session>/node_modules 导致每次会话重复安装。\n"
-            + "补充规则1：如果用户请求中已经明确给出具体类型/参数，则视为已确认，不要重复追问，直接进入对应分支执行。\n"
-            + "补充规则2：当你需要向用户追问任何信息时：本轮必须只输出问题与选项，并立刻结束；不得在同一轮继续读取任何文件、执行任何命令、生成任何产物。\n"
-            + "补充规则3：默认值只能在用户明确说‘默认/随便/你决定’时启用；用户未回复不等于选择了默认。"
-            + "补充规则4：当你准备调用 write_temp_file 时，必须先在自然语言里输出一行“写入意图确认”，包含：relative_path + 内容摘要（前 80 字）+ 大致长度；然后再发起工具调用。relative_path 必须是文件路径（不能是空、'.'、'..'、不能以 '/' 结尾，不能指向目录）。\n"
-            + (uploads_context or "")
-            + "你必须把实现过程中的中间产物写入 temp 会话目录（脚本、草稿、生成物等）：\n"
-            + "- 写文本：write_temp_file\n"
-            + "- 运行命令生成文件：run_temp_command\n"
-            + "对任何“有明确交付物”的请求，你必须在同一轮内推进直到：生成可交付文件，或给出明确失败原因。\n"
-            + "只有调用 export_temp_file 标记的文件，才会作为最终交付文件返回给用户；uploads/ 与未标记文件不会回传。\n\n"
-            + "可用动作：\n"
-            + "- get_session_context()\n"
-            + "- get_skill_metadata(skill_name)\n"
-            + "- list_skill_files(skill_name, max_depth)\n"
-            + "- read_skill_file(skill_name, relative_path, max_chars)\n"
-            + "- run_skill_command(skill_name, command, cwd_relative, auto_install)\n"
-            + "- write_temp_file(relative_path, content)\n"
-            + "- read_temp_file(relative_path, max_chars)\n"
-            + "- list_temp_files(max_depth)\n"
-            + "- run_temp_command(command, cwd_relative, auto_install)\n"
-            + "- export_temp_file(temp_relative_path, workspace_relative_path, overwrite)  # 不复制，仅标记交付名\n\n"
-            + "如果模型支持 function call，请直接发起工具调用；若不支持，则用 JSON 协议响应：\n"
-            + '{"type":"tool","name":"get_skill_metadata","arguments":{"skill_name":"xxx"}}\n'
-            + '或 {"type":"final","content":"..."}\n\n'
-            + "技能索引（用于判断是否需要调用技能）：\n"
-            + json.dumps(skills_index, ensure_ascii=False)
-            + (resume_context or "")
+        system_content, prompt_prefix_hash = _build_system_prompt(
+            system_prompt=system_prompt,
+            skills_root=str(skills_root or ""),
+            skills_index=skills_index if isinstance(skills_index, dict) else {},
+            skills_count=skills_count,
+            skills_shortlist=skills_shortlist,
+            executable_summary=_executable_summary(),
+            session_dir=session_dir,
+            uploads_context=uploads_context,
+            resume_context=resume_context,
         )
+        _dbg(f"prompt_prefix sha256={prompt_prefix_hash[:16]} system_chars={len(system_content)}")
 
         messages: list[Any] = [SystemPromptMessage(content=system_content)]
         if history_messages:
             messages.extend(history_messages)
         messages.append(UserPromptMessage(content=query))
 
+        compactor = _ContextCompactor(
+            budget=context_token_budget if context_token_budget > 0 else float("inf"),
+            max_messages=memory_turns * 4 if memory_turns > 0 else float("inf"),
+            pinned=[messages[-1]],
+        )
+
         def compact() -> None:
-            if memory_turns <= 0:
-                return
-            keep = 1 + memory_turns * 4
-            if len(messages) > keep:
-                system_msg = messages[0]
-                tail = messages[-(keep - 1) :]
-                messages[:] = [system_msg, *tail]
+            stats = compactor.compact(messages)
+            if stats:
+                _dbg(f"compact {json.dumps(stats, ensure_ascii=False)}")
 
         final_text: str | None = None
         final_file_meta: dict[str, dict[str, str]] = {}
@@ -294,13 +317,12 @@ class SkillAgentTool(Tool):
         resume_saved = False
         final_text_already_streamed = False
 
-        def stream_text_to_user(text: str, chunk_size: int = 8) -> Generator[ToolInvokeMessage]:
+        def stream_text_to_user(text: str) -> Generator[ToolInvokeMessage]:
             s = (text or "").strip()
             if not s:
                 return
-            step = max(1, int(chunk_size))
-            for i in range(0, len(s), step):
-                yield self.create_text_message(s[i : i + step])
+            for piece in _TextCoalescer(stream_flush_chars, stream_flush_ms).split(s):
+                yield self.create_text_message(piece)
 
         def redact_user_visible_text(text: str) -> str:
             s = str(text or "")
@@ -385,45 +407,22 @@ class SkillAgentTool(Tool):
         ) -> Generator[ToolInvokeMessage, None, tuple[str, list[Any], Any, int, bool]]:
             nontext_content: list[dict[str, Any]] = []
             tool_calls_all: list[Any] = []
-            text_parts: list[str] = []
+            sniffer = _JsonStreamSniffer()
             chunks_count = 0
             streamed_any = False
             saw_tool_calls = False
-            typing_chunk = 6
+            live_text = _TextCoalescer(stream_flush_chars, stream_flush_ms)
             emitted_prefix = False
-            emitted_len = 0
 
             def emit_typing(text: str) -> Generator[ToolInvokeMessage, None, None]:
                 nonlocal streamed_any
                 if not text:
                     return
                 tagged = "\n【🤖Skill_Agent】\n" + text.strip() + "\n\n"
-                step = max(1, int(typing_chunk))
-                for i in range(0, len(tagged), step):
-                    yield self.create_text_message(tagged[i : i + step])
+                for piece in _TextCoalescer(stream_flush_chars, stream_flush_ms).split(tagged):
+                    yield self.create_text_message(piece)
                     streamed_any = True
             
-            def should_emit_user_text(text: str) -> bool:
-                if not text:
-                    return False
-                s = str(text)
-                stripped = s.lstrip()
-                if stripped.startswith("{") and _extract_first_json_object(s) is None:
-                    return False
-                if stripped.startswith("```") and stripped.count("```") < 2:
-                    return False
-                json_text = _extract_first_json_object(text)
-                if not json_text:
-                    return True
-                try:
-                    obj = json.loads(json_text)
-                except Exception:
-                    return True
-                if not isinstance(obj, dict):
-                    return True
-                t = obj.get("type")
-                return t not in {"tool", "final"}
-
             try:
                 try:
                     response = self.session.model.llm.invoke(
@@ -450,10 +449,9 @@ class SkillAgentTool(Tool):
                         tool_calls_all.extend(tool_calls)
                         if tool_calls:
                             saw_tool_calls = True
-                    if text:
-                        text_parts.append(text)
-                    combined_text = "".join(text_parts).strip()
-                    if combined_text and not saw_tool_calls and should_emit_user_text(combined_text):
+                    sniffer.feed(text)
+                    combined_text = sniffer.text()
+                    if combined_text and not saw_tool_calls and sniffer.should_emit():
                         yield from emit_typing(combined_text)
                     return combined_text, tool_calls_all, nontext_content, chunks_count, streamed_any
 
@@ -471,28 +469,95 @@ class SkillAgentTool(Tool):
                         if not saw_tool_calls:
                             saw_tool_calls = True
                     if t:
-                        text_parts.append(t)
-                        combined_text_live = "".join(text_parts).strip()
-                        if combined_text_live and not saw_tool_calls and should_emit_user_text(combined_text_live):
+                        sniffer.feed(t)
+                        if not saw_tool_calls and sniffer.should_emit():
                             if not emitted_prefix:
-                                yield self.create_text_message("\n【🤖Skill_Agent】\n")
+                                for piece in live_text.push("\n【🤖Skill_Agent】\n"):
+                                    yield self.create_text_message(piece)
                                 emitted_prefix = True
-                            new = combined_text_live[emitted_len:]
+                            new = sniffer.take_visible()
                             if new:
-                                step = max(1, int(typing_chunk))
-                                for i in range(0, len(new), step):
-                                    yield self.create_text_message(new[i : i + step])
+                                for piece in live_text.push(new):
+                                    yield self.create_text_message(piece)
                                     streamed_any = True
-                                emitted_len = len(combined_text_live)
-                combined_text = "".join(text_parts).strip()
+                combined_text = sniffer.text()
                 if emitted_prefix:
-                    yield self.create_text_message("\n\n")
-                elif combined_text and not saw_tool_calls and should_emit_user_text(combined_text):
+                    for piece in live_text.split("\n\n"):
+                        yield self.create_text_message(piece)
+                        streamed_any = True
+                elif combined_text and not saw_tool_calls and sniffer.should_emit():
                     yield from emit_typing(combined_text)
                 return combined_text, tool_calls_all, nontext_content, chunks_count, streamed_any
             except Exception as e:
                 return "", [], {"error": "stream_parse_failed", "exception": str(e)}, chunks_count, streamed_any
 
+        def call_readonly_tool(tool_name: str, arguments: dict[str, Any]) -> dict[str, Any]:
+            if tool_name == "search_skills":
+                return runtime.search_skills(
+                    str(arguments.get("query") or ""),
+                    int(arguments.get("top_k") or 10),
+                )
+            if tool_name == "get_skill_metadata":
+                return runtime.get_skill_metadata(str(arguments.get("skill_name") or ""))
+            if tool_name == "list_skill_files":
+                return runtime.list_skill_files(
+                    str(arguments.get("skill_name") or ""),
+                    int(arguments.get("max_depth") or 2),
+                    int(arguments.get("max_entries") or 500),
+                )
+            if tool_name == "read_skill_file":
+                return runtime.read_skill_file(
+                    str(arguments.get("skill_name") or ""),
+                    str(arguments.get("relative_path") or ""),
+                    int(arguments.get("max_chars") or 12000),
+                    offset=_coerce_optional_int(arguments.get("offset")),
+                    length=_coerce_optional_int(arguments.get("length")),
+                    start_line=_coerce_optional_int(arguments.get("start_line")),
+                    end_line=_coerce_optional_int(arguments.get("end_line")),
+                )
+            if tool_name == "get_session_context":
+                return runtime.get_session_context()
+            if tool_name == "read_temp_file":
+                return runtime.read_temp_file(
+                    str(arguments.get("relative_path") or ""),
+                    int(arguments.get("max_chars") or 12000),
+                    offset=_coerce_optional_int(arguments.get("offset")),
+                    length=_coerce_optional_int(arguments.get("length")),
+                    start_line=_coerce_optional_int(arguments.get("start_line")),
+                    end_line=_coerce_optional_int(arguments.get("end_line")),
+                )
+            if tool_name == "list_temp_files":
+                return runtime.list_temp_files(
+                    int(arguments.get("max_depth") or 4),
+                    int(arguments.get("max_entries") or 500),
+                )
+            return {"error": f"unknown tool: {tool_name}"}
+
+        pending_calls: list[tuple[str, str, dict[str, Any]]] = []
+
+        def flush_pending_calls() -> None:
+            if not pending_calls:
+                return
+            batch = list(pending_calls)
+            pending_calls.clear()
+            if len(batch) == 1:
+                results = [call_readonly_tool(batch[0][1], batch[0][2])]
+            else:
+                executor = _get_tool_executor()
+                futures = [executor.submit(call_readonly_tool, name, args) for _, name, args in batch]
+                results = [f.result() for f in futures]
+                _dbg(f"tool_batch concurrent={len(batch)}")
+            for (call_id, name, args), result in zip(batch, results):
+                _dbg(f"tool_result name={name} result={_shorten_text(result, 700)}")
+                result = _offload_tool_result(result, session_dir=session_dir, name=name, call_id=call_id)
+                messages.append(
+                    ToolPromptMessage(
+                        tool_call_id=call_id,
+                        name=name,
+                        content=json.dumps(result, ensure_ascii=False),
+                    )
+                )
+
         try:
             for step_idx in range(max_steps):
                 compact()
@@ -536,6 +601,8 @@ class SkillAgentTool(Tool):
                         _dbg(f"tool_call name={tool_name} id={call_id!s} args={_shorten_text(arguments, 400)}")
 
                         ok_args, arg_detail = _validate_tool_arguments(tool_name, arguments)
+                        if not ok_args or tool_name not in READ_ONLY_TOOLS:
+                            flush_pending_calls()
                         if not ok_args:
                             result = {
                                 "error": "invalid_tool_arguments",
@@ -556,6 +623,9 @@ class SkillAgentTool(Tool):
 
                         if tool_name in {"list_skill_files", "read_skill_file", "run_skill_command"}:
                             skill_name = str(arguments.get("skill_name") or "").strip()
+                            if skill_name and not runtime.has_skill_metadata(skill_name) and pending_calls:
+                                # The SKILL.md read may still be queued in this batch.
+                                flush_pending_calls()
                             if skill_name and not runtime.has_skill_metadata(skill_name):
                                 result = {
                                     "error": "skill_md_required",
@@ -603,7 +673,9 @@ class SkillAgentTool(Tool):
                                 )
                                 continue
 
-                        if tool_name == "get_skill_metadata":
+                        if tool_name == "search_skills":
+                            yield self.create_text_message("✅正在检索技能…\n")
+                        elif tool_name == "get_skill_metadata":
                             yield self.create_text_message(
                                 f"✅正在查看技能《{str(arguments.get('skill_name') or '')}》说明书…\n"
                             )
@@ -636,20 +708,11 @@ class SkillAgentTool(Tool):
                                 f"✅正在标记交付文件：{str(arguments.get('temp_relative_path') or '')}…\n"
                             )
 
-                        if tool_name == "get_skill_metadata":
-                            result = runtime.get_skill_metadata(str(arguments.get("skill_name") or ""))
-                        elif tool_name == "list_skill_files":
-                            result = runtime.list_skill_files(
-                                str(arguments.get("skill_name") or ""),
-                                int(arguments.get("max_depth") or 2),
-                            )
-                        elif tool_name == "read_skill_file":
-                            result = runtime.read_skill_file(
-                                str(arguments.get("skill_name") or ""),
-                                str(arguments.get("relative_path") or ""),
-                                int(arguments.get("max_chars") or 12000),
-                            )
-                        elif tool_name == "run_skill_command":
+                        if tool_name in READ_ONLY_TOOLS:
+                            pending_calls.append((str(call_id or ""), tool_name, arguments))
+                            continue
+
+                        if tool_name == "run_skill_command":
                             result = runtime.run_skill_command(
                                 skill_name=str(arguments.get("skill_name") or ""),
                                 command=arguments.get("command") if isinstance(arguments.get("command"), list) else [],
@@ -657,6 +720,8 @@ class SkillAgentTool(Tool):
                                     str(arguments.get("cwd_relative")) if arguments.get("cwd_relative") else None
                                 ),
                                 auto_install=bool(arguments.get("auto_install") or False),
+                                timeout=_coerce_optional_int(arguments.get("timeout_seconds")),
+                                requirements=_coerce_string_list(arguments.get("requirements")),
                             )
                             if (
                                 isinstance(result, dict)
@@ -698,20 +763,11 @@ class SkillAgentTool(Tool):
                                         300,
                                     )
                                 )
-                        elif tool_name == "get_session_context":
-                            result = runtime.get_session_context()
                         elif tool_name == "write_temp_file":
                             result = runtime.write_temp_file(
                                 str(arguments.get("relative_path") or ""),
                                 str(arguments.get("content") or ""),
                             )
-                        elif tool_name == "read_temp_file":
-                            result = runtime.read_temp_file(
-                                str(arguments.get("relative_path") or ""),
-                                int(arguments.get("max_chars") or 12000),
-                            )
-                        elif tool_name == "list_temp_files":
-                            result = runtime.list_temp_files(int(arguments.get("max_depth") or 4))
                         elif tool_name == "run_temp_command":
                             result = runtime.run_temp_command(
                                 command=arguments.get("command") if isinstance(arguments.get("command"), list) else [],
@@ -719,6 +775,8 @@ class SkillAgentTool(Tool):
                                     str(arguments.get("cwd_relative")) if arguments.get("cwd_relative") else None
                                 ),
                                 auto_install=bool(arguments.get("auto_install") or False),
+                                timeout=_coerce_optional_int(arguments.get("timeout_seconds")),
+                                requirements=_coerce_string_list(arguments.get("requirements")),
                             )
                             if (
                                 isinstance(result, dict)
@@ -754,6 +812,9 @@ class SkillAgentTool(Tool):
                             result = {"error": f"unknown tool: {tool_name}"}
 
                         _dbg(f"tool_result name={tool_name} result={_shorten_text(result, 700)}")
+                        result = _offload_tool_result(
+                            result, session_dir=session_dir, name=tool_name, call_id=str(call_id or "")
+                        )
                         messages.append(
                             ToolPromptMessage(
                                 tool_call_id=str(call_id or ""),
@@ -761,18 +822,12 @@ class SkillAgentTool(Tool):
                                 content=json.dumps(result, ensure_ascii=False),
                             )
                         )
+                    flush_pending_calls()
                     if forced_text:
                         final_text = forced_text
                         break
                     if step_idx >= max_steps - 1:
-                        try:
-                            has_files = any(
-                                e.get("type") == "file"
-                                for e in _list_dir(session_dir, max_depth=2)
-                                if isinstance(e, dict)
-                            )
-                        except Exception:
-                            has_files = False
+                        has_files = runtime.session_files().has_files()
                         if final_file_meta or has_files:
                             final_text = "已生成文件。"
                             break
@@ -886,7 +941,9 @@ class SkillAgentTool(Tool):
                 _dbg(f"json_tool name={name} args={_shorten_text(arguments, 400)}")
                 messages.append(AssistantPromptMessage(content=json.dumps(action, ensure_ascii=False)))
 
-                if name == "get_skill_metadata":
+                if name == "search_skills":
+                    yield self.create_text_message("✅正在检索技能…\n")
+                elif name == "get_skill_metadata":
                     yield self.create_text_message(f"✅正在查看技能《{str(arguments.get('skill_name') or '')}》说明书…\n")
                 elif name == "list_skill_files":
                     yield self.create_text_message(f"✅正在查看技能《{str(arguments.get('skill_name') or '')}》文件结构…\n")
@@ -909,45 +966,29 @@ class SkillAgentTool(Tool):
                 elif name == "export_temp_file":
                     yield self.create_text_message(f"✅正在标记交付文件：{str(arguments.get('temp_relative_path') or '')}…\n")
 
-                if name == "get_skill_metadata":
-                    result = runtime.get_skill_metadata(str(arguments.get("skill_name") or ""))
-                elif name == "list_skill_files":
-                    result = runtime.list_skill_files(
-                        str(arguments.get("skill_name") or ""),
-                        int(arguments.get("max_depth") or 2),
-                    )
-                elif name == "read_skill_file":
-                    result = runtime.read_skill_file(
-                        str(arguments.get("skill_name") or ""),
-                        str(arguments.get("relative_path") or ""),
-                        int(arguments.get("max_chars") or 12000),
-                    )
+                if name in READ_ONLY_TOOLS:
+                    result = call_readonly_tool(name, arguments)
                 elif name == "run_skill_command":
                     result = runtime.run_skill_command(
                         skill_name=str(arguments.get("skill_name") or ""),
                         command=arguments.get("command") if isinstance(arguments.get("command"), list) else [],
                         cwd_relative=(str(arguments.get("cwd_relative")) if arguments.get("cwd_relative") else None),
                         auto_install=bool(arguments.get("auto_install") or False),
+                        timeout=_coerce_optional_int(arguments.get("timeout_seconds")),
+                        requirements=_coerce_string_list(arguments.get("requirements")),
                     )
-                elif name == "get_session_context":
-                    result = runtime.get_session_context()
                 elif name == "write_temp_file":
                     result = runtime.write_temp_file(
                         str(arguments.get("relative_path") or ""),
                         str(arguments.get("content") or ""),
                     )
-                elif name == "read_temp_file":
-                    result = runtime.read_temp_file(
-                        str(arguments.get("relative_path") or ""),
-                        int(arguments.get("max_chars") or 12000),
-                    )
-                elif name == "list_temp_files":
-                    result = runtime.list_temp_files(int(arguments.get("max_depth") or 4))
                 elif name == "run_temp_command":
                     result = runtime.run_temp_command(
                         command=arguments.get("command") if isinstance(arguments.get("command"), list) else [],
                         cwd_relative=(str(arguments.get("cwd_relative")) if arguments.get("cwd_relative") else None),
                         auto_install=bool(arguments.get("auto_install") or False),
+                        timeout=_coerce_optional_int(arguments.get("timeout_seconds")),
+                        requirements=_coerce_string_list(arguments.get("requirements")),
                     )
                 elif name == "export_temp_file":
                     temp_rel = str(arguments.get("temp_relative_path") or "")
@@ -973,18 +1014,14 @@ class SkillAgentTool(Tool):
                     result = {"error": f"unknown tool: {name}"}
 
                 _dbg(f"json_tool_result name={name} result={_shorten_text(result, 700)}")
+                result = _offload_tool_result(result, session_dir=session_dir, name=name)
                 messages.append(
                     AssistantPromptMessage(
                         content="TOOL_RESULT\n" + json.dumps({"name": name, "result": result}, ensure_ascii=False)
                     )
                 )
             else:
-                try:
-                    has_files = any(
-                        e.get("type") == "file" for e in _list_dir(session_dir, max_depth=2) if isinstance(e, dict)
-                    )
-                except Exception:
-                    has_files = False
+                has_files = runtime.session_files().has_files()
                 if final_file_meta or has_files:
                     final_text = "已生成文件。"
                 else:
@@ -994,12 +1031,10 @@ class SkillAgentTool(Tool):
                 _storage_set_json(storage, resume_key, None)
             temp_files_text = ""
             try:
-                temp_entries = _list_dir(session_dir, max_depth=10)
-                rel_paths = [
-                    str(e.get("relative_path"))
-                    for e in temp_entries
-                    if e.get("type") == "file" and isinstance(e.get("relative_path"), str)
-                ]
+                session_files = runtime.session_files()
+                session_files.refresh()
+                session_files.save()
+                rel_paths = session_files.files()
                 if rel_paths:
                     temp_files_text = "\n\n[temp_files]\n" + "\n".join(rel_paths)
                 _dbg(f"temp_files_count={len(rel_paths)}")
@@ -1029,8 +1064,7 @@ class SkillAgentTool(Tool):
 
             has_any_files = False
             try:
-                temp_entries = _list_dir(session_dir, max_depth=10)
-                has_any_files = any(e.get("type") == "file" for e in temp_entries if isinstance(e, dict))
+                has_any_files = runtime.session_files().has_files()
             except Exception:
                 has_any_files = False
 
@@ -1076,23 +1110,17 @@ class SkillAgentTool(Tool):
                 yield from stream_text_to_user("未生成任何文本或文件输出。")
 
             yielded: set[str] = set()
-            yielded_fingerprints: set[str] = set()
+            delivery = _FileDelivery()
+            delivery_failures: list[str] = []
             for rel, path, mime_type, out_name in files_to_send:
                 if rel in yielded:
                     continue
                 yielded.add(rel)
                 try:
-                    with open(path, "rb") as fp:
-                        content = fp.read()
-                    try:
-                        content_fp = hashlib.sha1(content).hexdigest()
-                    except Exception:
-                        content_fp = str(len(content))
-                    fingerprint_key = f"{out_name}|{mime_type}|{content_fp}"
-                    if fingerprint_key in yielded_fingerprints:
-                        continue
-                    yielded_fingerprints.add(fingerprint_key)
-                    yield self.create_blob_message(blob=content, meta={"mime_type": mime_type, "filename": out_name})
-                except Exception:
-                    continue
+                    yield from delivery.deliver(path, mime_type=mime_type, filename=out_name)
+                except Exception as e:
+                    delivery_failures.append(f"- {out_name}：{str(e) or e.__class__.__name__}")
+            if delivery_failures:
+                yield self.create_text_message("❌以下文件发送失败：\n" + "\n".join(delivery_failures) + "\n")
+            _dbg(f"read_cache {_shorten_text(_FILE_READ_CACHE.stats(), 300)}")
             _dbg(f"temp_retained session_dir={session_dir}")
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any
+
+from utils.skill_agent_constants import FILE_READ_CACHE_MAX_BYTES
+from utils.skill_agent_exec import _env_int
+from utils.tools import _read_text_head
+
+
+class _FileReadCache:
+    def __init__(self, max_bytes: int = FILE_READ_CACHE_MAX_BYTES) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self._items: OrderedDict[tuple[str, int, int, int], tuple[str, int, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def read_text(self, path: str, max_chars: int = 12000) -> str:
+        return self.read_head(path, max_chars)[0]
+
+    def read_head(self, path: str, max_chars: int = 12000) -> tuple[str, int]:
+        abs_path = os.path.abspath(path)
+        st = os.stat(abs_path)
+        key = (abs_path, st.st_mtime_ns, st.st_size, int(max_chars))
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[0], item[2]
+            self.misses += 1
+        content, consumed = _read_text_head(abs_path, max_chars)
+        self._put(key, content, consumed)
+        return content, consumed
+
+    def _put(self, key: tuple[str, int, int, int], content: str, consumed: int) -> None:
+        size = len(content.encode("utf-8", errors="ignore"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (content, size, consumed)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._items:
+                _, (_, evicted_size, _) = self._items.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def set_max_bytes(self, max_bytes: int) -> None:
+        with self._lock:
+            self.max_bytes = max(0, int(max_bytes))
+            while self._bytes > self.max_bytes and self._items:
+                _, (_, evicted_size, _) = self._items.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._items),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+_FILE_READ_CACHE = _FileReadCache(_env_int("SKILL_AGENT_READ_CACHE_BYTES", FILE_READ_CACHE_MAX_BYTES))
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import json
+import re
+from typing import Any
+
+from dify_plugin.entities.model.message import AssistantPromptMessage, ToolPromptMessage
+
+from utils.skill_agent_constants import CONTEXT_STUB_MIN_TOKENS
+from utils.tools import _safe_get
+
+JSON_TOOL_RESULT_PREFIX = "TOOL_RESULT\n"
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_CJK_RE = re.compile(r"[⺀-鿿가-힯豈-﫿＀-￯]")
+_JSON_RESULT_NAME_RE = re.compile(r'^TOOL_RESULT\n\{"name": "([^"]*)"')
+
+
+def _estimate_tokens(text: str) -> int:
+    # CJK text runs close to one token per character; other scripts average about four characters per token.
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _message_text(msg: Any) -> str:
+    content = _safe_get(msg, "content")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(str(_safe_get(part, "data") or "") for part in content)
+    return ""
+
+
+def _tool_call_parts(call: Any) -> tuple[str, str, str]:
+    fn = _safe_get(call, "function") or {}
+    return str(_safe_get(call, "id") or ""), str(_safe_get(fn, "name") or ""), str(_safe_get(fn, "arguments") or "")
+
+
+def _is_tool_result(msg: Any) -> bool:
+    if isinstance(msg, ToolPromptMessage):
+        return True
+    return isinstance(msg, AssistantPromptMessage) and _message_text(msg).startswith(JSON_TOOL_RESULT_PREFIX)
+
+
+def _describe_arguments(raw: Any) -> str:
+    try:
+        args = json.loads(raw) if isinstance(raw, str) else raw
+    except Exception:
+        return ""
+    if not isinstance(args, dict):
+        return ""
+    parts = [f"{k}={v}" for k, v in args.items() if isinstance(v, (str, int)) and len(str(v)) <= 80][:3]
+    return ", ".join(parts)
+
+
+class _ContextCompactor:
+    def __init__(self, *, budget: float, max_messages: float, pinned: list[Any]) -> None:
+        self.budget = budget
+        self.max_messages = max_messages
+        self.pinned = list(pinned)
+        self._tokens: dict[int, tuple[Any, int]] = {}
+
+    def tokens(self, msg: Any) -> int:
+        cached = self._tokens.get(id(msg))
+        if cached is not None and cached[0] is msg:
+            return cached[1]
+        n = MESSAGE_OVERHEAD_TOKENS + _estimate_tokens(_message_text(msg))
+        for call in _safe_get(msg, "tool_calls") or []:
+            _, name, arguments = _tool_call_parts(call)
+            n += _estimate_tokens(name) + _estimate_tokens(arguments)
+        # Holding the message keeps its id from being reused while the entry lives.
+        self._tokens[id(msg)] = (msg, n)
+        return n
+
+    def _is_pinned(self, msg: Any) -> bool:
+        return any(msg is p for p in self.pinned)
+
+    def _groups(self, messages: list[Any]) -> list[list[Any]]:
+        # An assistant message and the tool results that answer it form one unit that is kept or dropped together.
+        # After native tool_calls, everything up to the next assistant message belongs to that unit, so a gate
+        # prompt inserted between two of its results cannot split them.
+        groups: list[list[Any]] = []
+        open_calls = False
+        for msg in messages:
+            if groups and (_is_tool_result(msg) or (open_calls and not isinstance(msg, AssistantPromptMessage))):
+                groups[-1].append(msg)
+            else:
+                groups.append([msg])
+                open_calls = isinstance(msg, AssistantPromptMessage) and bool(_safe_get(msg, "tool_calls"))
+        return groups
+
+    def _stub(self, msg: Any, group: list[Any]) -> Any:
+        text = _message_text(msg)
+        size = f"{len(text) / 1000:.1f}k 字符" if len(text) >= 1000 else f"{len(text)} 字符"
+        if isinstance(msg, ToolPromptMessage):
+            name, args = str(_safe_get(msg, "name") or ""), ""
+            for call in _safe_get(group[0], "tool_calls") or []:
+                call_id, call_name, arguments = _tool_call_parts(call)
+                if call_id and call_id == _safe_get(msg, "tool_call_id"):
+                    name, args = call_name or name, _describe_arguments(arguments)
+                    break
+            prefix = ""
+        else:
+            m = _JSON_RESULT_NAME_RE.match(text)
+            name, args = (m.group(1) if m else ""), ""
+            try:
+                action = json.loads(_message_text(group[0]))
+                if isinstance(action, dict):
+                    args = _describe_arguments(action.get("arguments"))
+            except Exception:
+                pass
+            prefix = JSON_TOOL_RESULT_PREFIX
+        call = f"{name}({args})" if name else "工具调用"
+        stub = f"{prefix}[已省略较早的工具结果] {call} 的结果共 {size}；如仍需要，请重新调用获取。"
+        return msg.model_copy(update={"content": stub})
+
+    def compact(self, messages: list[Any]) -> dict[str, int] | None:
+        if len(messages) < 2:
+            return None
+        total = sum(self.tokens(m) for m in messages)
+        if total <= self.budget and len(messages) - 1 <= self.max_messages:
+            return None
+        head, groups = messages[0], self._groups(messages[1:])
+        stats = {"before_tokens": total, "stubbed": 0, "dropped": 0}
+
+        def droppable(i: int) -> bool:
+            return i < len(groups) - 1 and not any(self._is_pinned(m) for m in groups[i])
+
+        count = len(messages) - 1
+        i = 0
+        while count > self.max_messages and i < len(groups):
+            if droppable(i):
+                count -= len(groups[i])
+                total -= sum(self.tokens(m) for m in groups[i])
+                stats["dropped"] += len(groups[i])
+                groups[i] = []
+            i += 1
+
+        # Old bulky tool output goes first; the newest group is what the model is acting on.
+        for group in groups[:-1]:
+            if total <= self.budget:
+                break
+            for j, msg in enumerate(group):
+                if total <= self.budget:
+                    break
+                if not _is_tool_result(msg) or self.tokens(msg) < CONTEXT_STUB_MIN_TOKENS:
+                    continue
+                stub = self._stub(msg, group)
+                total += self.tokens(stub) - self.tokens(msg)
+                group[j] = stub
+                stats["stubbed"] += 1
+
+        for i in range(len(groups)):
+            if total <= self.budget:
+                break
+            if groups[i] and droppable(i):
+                total -= sum(self.tokens(m) for m in groups[i])
+                stats["dropped"] += len(groups[i])
+                groups[i] = []
+
+        messages[:] = [head, *(m for g in groups for m in g)]
+        self._tokens = {id(m): self._tokens[id(m)] for m in messages if id(m) in self._tokens}
+        stats["after_tokens"] = total
+        return stats
@@ -3,6 +3,52 @@ HISTORY_KEY_PREFIX = "skill:history:"
 SESSION_DIR_KEY_PREFIX = "skill:session_dir:"
 
 HISTORY_TRANSCRIPT_MAX_CHARS = 6000
+HISTORY_MAX_TURNS = 50
+HISTORY_SEGMENT_TURNS = 8
 
 ALLOWED_COMMANDS = {"python", "pip", "node", "pandoc", "soffice", "pdftoppm", "npm", "npx", "bun", "curl", "uvx", "wget", "git", "bash","uv"}
 TEMP_SESSION_PREFIX = "dify-skill-"
+
+FILE_READ_CACHE_MAX_BYTES = 32 * 1024 * 1024
+COMMAND_TIMEOUT_SECONDS = 600
+COMMAND_TIMEOUT_MAX_SECONDS = 3600
+COMMAND_OUTPUT_HEAD_BYTES = 16000
+COMMAND_OUTPUT_TAIL_BYTES = 16000
+PIP_INSTALL_TIMEOUT_SECONDS = 300
+TOOL_CALL_MAX_WORKERS = 4
+WARM_POOL_SIZE = 2
+WARM_POOL_PRELOAD = ("numpy", "pandas", "reportlab", "docx", "openpyxl", "PyPDF2", "PIL")
+WARM_POOL_READY_TIMEOUT_SECONDS = 120
+DEPS_LOCK_TIMEOUT_SECONDS = 900
+MODULE_SPEC_POSITIVE_TTL_SECONDS = 600
+MODULE_SPEC_NEGATIVE_TTL_SECONDS = 30
+MODULE_INSTALL_FAILURE_TTL_SECONDS = 600
+PIP_PACKAGE_ALIASES = {
+    "PIL": "pillow",
+    "docx": "python-docx",
+    "pptx": "python-pptx",
+    "yaml": "pyyaml",
+    "cv2": "opencv-python",
+    "sklearn": "scikit-learn",
+    "fitz": "pymupdf",
+    "bs4": "beautifulsoup4",
+}
+EXECUTABLE_PROBE_TIMEOUT_SECONDS = 10
+EXECUTABLE_PROBE_WAIT_SECONDS = 3
+EXECUTABLE_VERSION_ARGS = {"pdftoppm": ["-v"], "soffice": ["--version"], "wget": ["--version"]}
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+UPLOAD_STORE_MAX_BYTES = 1024 * 1024 * 1024
+UPLOAD_MAX_WORKERS = 4
+UPLOAD_MAX_FILE_BYTES = 512 * 1024 * 1024
+UPLOAD_MAX_TOTAL_BYTES = 2 * 1024 * 1024 * 1024
+HTTP_MAX_ATTEMPTS = 4
+HTTP_POOL_MAXSIZE = 16
+DELIVERY_CHUNK_BYTES = 8192
+DELIVERY_SPLIT_BYTES = 30 * 1024 * 1024
+DELIVERY_LARGE_FILE_MODE = "split"
+STREAM_FLUSH_CHARS = 64
+STREAM_FLUSH_MS = 80
+CONTEXT_TOKEN_BUDGET = 32000
+CONTEXT_STUB_MIN_TOKENS = 400
+TOOL_RESULT_INLINE_MAX_CHARS = 8000
+TOOL_RESULT_PREVIEW_CHARS = 1500
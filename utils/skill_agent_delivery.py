@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+import uuid
+import zipfile
+from collections.abc import Generator
+from typing import Any
+
+from dify_plugin.entities.tool import ToolInvokeMessage
+
+from utils.skill_agent_constants import DELIVERY_CHUNK_BYTES, DELIVERY_LARGE_FILE_MODE, DELIVERY_SPLIT_BYTES
+from utils.skill_agent_exec import _env_int
+
+
+def _delivery_split_bytes() -> int:
+    # Dify reassembles blob chunks into one file and rejects files above its limit (30 MiB by default).
+    return max(DELIVERY_CHUNK_BYTES, _env_int("SKILL_AGENT_DELIVERY_SPLIT_BYTES", DELIVERY_SPLIT_BYTES))
+
+
+def _delivery_large_file_mode() -> str:
+    mode = str(os.getenv("SKILL_AGENT_DELIVERY_LARGE_FILE_MODE") or DELIVERY_LARGE_FILE_MODE).strip().lower()
+    return mode if mode in {"split", "zip"} else DELIVERY_LARGE_FILE_MODE
+
+
+def _blob_end(blob_id: str, sequence: int, total: int, meta: dict[str, Any]) -> ToolInvokeMessage:
+    return ToolInvokeMessage(
+        type=ToolInvokeMessage.MessageType.BLOB_CHUNK,
+        message=ToolInvokeMessage.BlobChunkMessage(id=blob_id, sequence=sequence, total_length=total, blob=b"", end=True),
+        meta=meta,
+    )
+
+
+def _iter_blob_chunks(
+    path: str,
+    *,
+    meta: dict[str, Any],
+    offset: int = 0,
+    length: int | None = None,
+    hasher: Any = None,
+) -> Generator[ToolInvokeMessage, None, None]:
+    # Open and size the file before the first chunk so a missing file fails without leaving a blob open.
+    with open(path, "rb") as f:
+        total = os.fstat(f.fileno()).st_size - offset if length is None else length
+        blob_id = uuid.uuid4().hex
+        sequence = 0
+        remaining = total
+        f.seek(offset)
+        # A failed read raises here without an end chunk: the receiver only assembles a blob once it sees
+        # end=True, so a partial body is dropped instead of being delivered as a truncated file.
+        while remaining > 0:
+            block = f.read(min(DELIVERY_CHUNK_BYTES, remaining))
+            if not block:
+                raise OSError(f"file shrank while sending: {path}")
+            remaining -= len(block)
+            if hasher is not None:
+                hasher.update(block)
+            yield ToolInvokeMessage(
+                type=ToolInvokeMessage.MessageType.BLOB_CHUNK,
+                message=ToolInvokeMessage.BlobChunkMessage(
+                    id=blob_id, sequence=sequence, total_length=total, blob=block, end=False
+                ),
+                meta=meta,
+            )
+            sequence += 1
+    yield _blob_end(blob_id, sequence, total, meta)
+
+
+def _iter_split_parts(
+    path: str, *, filename: str, hasher: Any = None
+) -> Generator[ToolInvokeMessage, None, None]:
+    size = os.path.getsize(path)
+    part_bytes = _delivery_split_bytes()
+    count = (size + part_bytes - 1) // part_bytes
+    width = max(3, len(str(count)))
+    for i in range(count):
+        offset = i * part_bytes
+        meta = {"mime_type": "application/octet-stream", "filename": f"{filename}.part{i + 1:0{width}d}"}
+        yield from _iter_blob_chunks(path, meta=meta, offset=offset, length=min(part_bytes, size - offset), hasher=hasher)
+
+
+def _zip_to_temp(path: str, arcname: str, *, hasher: Any = None) -> str:
+    fd, zip_path = tempfile.mkstemp(prefix="skill-delivery-", suffix=".zip")
+    os.close(fd)
+    try:
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            with open(path, "rb") as src, zf.open(arcname, "w", force_zip64=True) as dst:
+                for block in iter(lambda: src.read(1024 * 1024), b""):
+                    if hasher is not None:
+                        hasher.update(block)
+                    dst.write(block)
+    except Exception:
+        os.unlink(zip_path)
+        raise
+    return zip_path
+
+
+class _FileDelivery:
+    def __init__(self) -> None:
+        self._identities: set[tuple[Any, ...]] = set()
+        self._digests: dict[tuple[str, str, int], set[str]] = {}
+
+    def _sha256(self, path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+        return h.hexdigest()
+
+    def deliver(self, path: str, *, mime_type: str, filename: str) -> Generator[ToolInvokeMessage, None, None]:
+        st = os.stat(path)
+        identity = (filename, mime_type, st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        if identity in self._identities:
+            return
+        self._identities.add(identity)
+        # Content only needs hashing up front when a file of the same name, type and size was already sent.
+        group = (filename, mime_type, st.st_size)
+        seen = self._digests.setdefault(group, set())
+        if seen:
+            digest = self._sha256(path)
+            if digest in seen:
+                return
+            seen.add(digest)
+            hasher = None
+        else:
+            hasher = hashlib.sha256()
+
+        if st.st_size <= _delivery_split_bytes():
+            yield from _iter_blob_chunks(path, meta={"mime_type": mime_type, "filename": filename}, hasher=hasher)
+        elif _delivery_large_file_mode() == "zip":
+            zip_path = _zip_to_temp(path, filename, hasher=hasher)
+            try:
+                zip_name = f"{filename}.zip"
+                if os.path.getsize(zip_path) <= _delivery_split_bytes():
+                    yield from _iter_blob_chunks(zip_path, meta={"mime_type": "application/zip", "filename": zip_name})
+                else:
+                    yield from _iter_split_parts(zip_path, filename=zip_name)
+            finally:
+                os.unlink(zip_path)
+        else:
+            yield from _iter_split_parts(path, filename=filename, hasher=hasher)
+        if hasher is not None:
+            seen.add(hasher.hexdigest())
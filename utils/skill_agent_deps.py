@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import site
+import sys
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from typing import Any
+
+from utils.skill_agent_constants import DEPS_LOCK_TIMEOUT_SECONDS, PIP_INSTALL_TIMEOUT_SECONDS
+from utils.skill_agent_exec import _env_int, _run_bounded, _run_pip_preferring_wheelhouse
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+NODE_LOCKFILES = ("package-lock.json", "npm-shrinkwrap.json", "bun.lock", "bun.lockb", "yarn.lock")
+NODE_INSTALL_ARGS = {"npm": {"install", "i", "ci"}, "bun": {"install", "i"}}
+# Install-time configuration that changes what gets installed; copied into the build dir and hashed.
+NODE_CONFIG_FILES = (".npmrc", ".yarnrc", ".yarnrc.yml", "bunfig.toml")
+NODE_DEPENDENCY_FIELDS = ("dependencies", "devDependencies", "optionalDependencies", "peerDependencies")
+NODE_LIFECYCLE_SCRIPTS = ("preinstall", "install", "postinstall", "prepare")
+NODE_LOCAL_SPEC_PREFIXES = ("file:", "link:", "portal:", "workspace:", "./", "../", "/", "~/")
+DEPS_COMPLETE_MARKER = ".complete"
+PLUGIN_SITE_PTH_NAME = "_skill_agent_plugin_site.pth"
+
+_KEY_LOCKS: dict[str, threading.Lock] = {}
+_KEY_LOCKS_GUARD = threading.Lock()
+
+
+def _deps_cache_root() -> str:
+    env_path = os.getenv("SKILL_AGENT_DEPS_CACHE")
+    if env_path:
+        return os.path.abspath(env_path)
+    plugin_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(plugin_root, ".deps_cache")
+
+
+def _hash_files(paths: list[str], *, salt: str) -> str:
+    h = hashlib.sha256(salt.encode("utf-8"))
+    for path in paths:
+        h.update(b"\0" + os.path.basename(path).encode("utf-8") + b"\0")
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(block)
+    return h.hexdigest()[:32]
+
+
+@contextlib.contextmanager
+def _cache_lock(lock_path: str, timeout: float) -> Iterator[None]:
+    # Thread lock first (flock is per open file, and polling keeps gevent's hub free), then the
+    # cross-process file lock so only one worker on the node builds a given key.
+    with _KEY_LOCKS_GUARD:
+        key_lock = _KEY_LOCKS.setdefault(lock_path, threading.Lock())
+    if not key_lock.acquire(timeout=timeout):
+        raise TimeoutError(f"timed out waiting for {lock_path}")
+    try:
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                deadline = time.monotonic() + timeout
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() >= deadline:
+                            raise TimeoutError(f"timed out waiting for {lock_path}")
+                        time.sleep(0.2)
+            yield
+        finally:
+            os.close(fd)
+    finally:
+        key_lock.release()
+
+
+def _link_into(link_path: str, target: str) -> None:
+    tmp = f"{link_path}.{uuid.uuid4().hex[:8]}.tmp"
+    os.symlink(target, tmp, target_is_directory=True)
+    try:
+        os.replace(tmp, link_path)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+
+def _is_bare_node_install(exe: str, args: list[str]) -> bool:
+    # Only the bare form is served from the cache; adding/removing packages must run in place.
+    return len(args) == 1 and str(args[0]) in NODE_INSTALL_ARGS.get(exe, set())
+
+
+def _node_install_is_self_contained(package_json: str) -> bool:
+    # The cache builds from package.json, lockfiles and config alone; anything that reaches other files in the
+    # skill (local packages, workspaces, root install scripts) has to install in place.
+    try:
+        with open(package_json, "r", encoding="utf-8") as f:
+            pkg = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not isinstance(pkg, dict) or pkg.get("workspaces"):
+        return False
+    scripts = pkg.get("scripts")
+    if isinstance(scripts, dict) and any(name in scripts for name in NODE_LIFECYCLE_SCRIPTS):
+        return False
+    for field in NODE_DEPENDENCY_FIELDS:
+        specs = pkg.get(field)
+        if not isinstance(specs, dict):
+            continue
+        for spec in specs.values():
+            if str(spec or "").strip().startswith(NODE_LOCAL_SPEC_PREFIXES):
+                return False
+    return True
+
+
+def _node_cache_key(project_dir: str, exe: str) -> tuple[str, list[str]] | None:
+    package_json = os.path.join(project_dir, "package.json")
+    if not os.path.isfile(package_json) or not _node_install_is_self_contained(package_json):
+        return None
+    inputs = [package_json] + [
+        os.path.join(project_dir, n)
+        for n in (*NODE_LOCKFILES, *NODE_CONFIG_FILES)
+        if os.path.isfile(os.path.join(project_dir, n))
+    ]
+    return _hash_files(inputs, salt=f"node|{exe}"), inputs
+
+
+def _build_node_modules(
+    entry: str, *, inputs: list[str], key: str, command: list[str], timeout: float | None
+) -> dict[str, Any]:
+    staging = f"{entry}.build-{uuid.uuid4().hex[:8]}"
+    os.makedirs(staging, exist_ok=True)
+    try:
+        for path in inputs:
+            shutil.copy2(path, os.path.join(staging, os.path.basename(path)))
+        result = _run_bounded(command, cwd=staging, timeout=timeout)
+        if result.get("returncode") != 0:
+            result["deps_cache"] = "build_failed"
+            return result
+        # A package.json without dependencies installs nothing; cache the empty tree all the same.
+        os.makedirs(os.path.join(staging, "node_modules"), exist_ok=True)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(staging, entry)
+        with open(os.path.join(entry, DEPS_COMPLETE_MARKER), "w", encoding="utf-8") as f:
+            f.write(key)
+        return result
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _ensure_node_modules(
+    project_dir: str, *, exe: str, exe_path: str, args: list[str], timeout: float | None = None
+) -> dict[str, Any] | None:
+    keyed = _node_cache_key(project_dir, exe)
+    link_path = os.path.join(project_dir, "node_modules")
+    if keyed is None:
+        # Installing in place through a link left by an earlier cached build would write into the shared cache.
+        if os.path.islink(link_path):
+            os.unlink(link_path)
+        return None
+    key, inputs = keyed
+    if os.path.isdir(link_path) and not os.path.islink(link_path):
+        # Vendored node_modules shipped with the skill: nothing to share, nothing to install.
+        return {"returncode": 0, "stdout": "node_modules already present in skill", "stderr": "", "deps_cache": "vendored"}
+
+    root = os.path.join(_deps_cache_root(), "node")
+    entry = os.path.join(root, key)
+    modules = os.path.join(entry, "node_modules")
+    state = "hit"
+    started = time.monotonic()
+    result: dict[str, Any] = {"returncode": 0, "stdout": "", "stderr": ""}
+    if not os.path.isfile(os.path.join(entry, DEPS_COMPLETE_MARKER)):
+        try:
+            with _cache_lock(entry + ".lock", float(_env_int("SKILL_AGENT_DEPS_LOCK_TIMEOUT", DEPS_LOCK_TIMEOUT_SECONDS))):
+                if not os.path.isfile(os.path.join(entry, DEPS_COMPLETE_MARKER)):
+                    state = "built"
+                    result = _build_node_modules(entry, inputs=inputs, key=key, command=[exe_path] + list(args), timeout=timeout)
+                    if result.get("returncode") != 0:
+                        return result
+        except TimeoutError as e:
+            return {"error": "dependency cache lock timed out", "exception": str(e)}
+
+    try:
+        if os.path.realpath(link_path) != os.path.realpath(modules):
+            _link_into(link_path, modules)
+    except OSError as e:
+        # No symlink support (e.g. unprivileged Windows): let the caller install in place.
+        if state == "hit":
+            return None
+        result["deps_cache_link_error"] = str(e)
+        return result
+    result.setdefault("stdout", "")
+    if state == "hit":
+        result["stdout"] = f"dependencies served from shared cache ({key})"
+    result["deps_cache"] = state
+    result["deps_cache_key"] = key
+    result["duration_ms"] = int((time.monotonic() - started) * 1000)
+    return result
+
+
+def _venv_python(venv_dir: str) -> str:
+    if os.name == "nt":
+        return os.path.join(venv_dir, "Scripts", "python.exe")
+    return os.path.join(venv_dir, "bin", "python")
+
+
+def _venv_site_packages(venv_dir: str) -> str:
+    if os.name == "nt":
+        return os.path.join(venv_dir, "Lib", "site-packages")
+    return os.path.join(venv_dir, "lib", f"python{sys.version_info[0]}.{sys.version_info[1]}", "site-packages")
+
+
+def _plugin_site_dirs() -> list[str]:
+    # The plugin usually runs in a venv of its own; those site dirs, not the base interpreter's, hold its libraries.
+    dirs = list(site.getsitepackages())
+    if site.ENABLE_USER_SITE:
+        dirs.append(site.getusersitepackages())
+    return [d for d in dict.fromkeys(os.path.abspath(d) for d in dirs) if os.path.isdir(d)]
+
+
+def _ensure_python_env(requirements_path: str, *, timeout: float | None = None) -> dict[str, Any]:
+    if not os.path.isfile(requirements_path):
+        return {"ok": False, "error": "requirements.txt not found", "path": requirements_path}
+    site_dirs = _plugin_site_dirs()
+    salt = "|".join(
+        ["python", f"{sys.version_info[0]}.{sys.version_info[1]}", os.path.realpath(sys.executable), *site_dirs]
+    )
+    key = _hash_files([requirements_path], salt=salt)
+    root = os.path.join(_deps_cache_root(), "python")
+    entry = os.path.join(root, key)
+    if os.path.isfile(os.path.join(entry, DEPS_COMPLETE_MARKER)):
+        return {"ok": True, "python": _venv_python(entry), "deps_cache": "hit", "deps_cache_key": key}
+
+    pip_timeout = timeout if timeout is not None else _env_int("SKILL_AGENT_PIP_TIMEOUT", PIP_INSTALL_TIMEOUT_SECONDS)
+    try:
+        with _cache_lock(entry + ".lock", float(_env_int("SKILL_AGENT_DEPS_LOCK_TIMEOUT", DEPS_LOCK_TIMEOUT_SECONDS))):
+            if os.path.isfile(os.path.join(entry, DEPS_COMPLETE_MARKER)):
+                return {"ok": True, "python": _venv_python(entry), "deps_cache": "hit", "deps_cache_key": key}
+            shutil.rmtree(entry, ignore_errors=True)
+            os.makedirs(root, exist_ok=True)
+            created = _run_bounded(
+                [sys.executable, "-m", "venv", "--system-site-packages", entry], cwd=root, timeout=pip_timeout
+            )
+            if created.get("returncode") != 0:
+                shutil.rmtree(entry, ignore_errors=True)
+                return {"ok": False, "error": "venv creation failed", "stderr": created.get("stderr") or ""}
+            # --system-site-packages only reaches the base interpreter, not the plugin's own venv. A .pth file
+            # appends the plugin's site dirs after the venv's, so the skill's pins win and everything else the
+            # plugin ships stays importable (and already satisfies pip).
+            try:
+                with open(os.path.join(_venv_site_packages(entry), PLUGIN_SITE_PTH_NAME), "w", encoding="utf-8") as f:
+                    f.write("".join(d + "\n" for d in site_dirs))
+            except OSError as e:
+                shutil.rmtree(entry, ignore_errors=True)
+                return {"ok": False, "error": "venv creation failed", "exception": str(e)}
+            installed = _run_pip_preferring_wheelhouse(
+                [
+                    _venv_python(entry),
+                    "-m",
+                    "pip",
+                    "install",
+                    "-r",
+                    requirements_path,
+                    "--no-input",
+                    "--disable-pip-version-check",
+                ],
+                cwd=os.path.dirname(requirements_path),
+                timeout=pip_timeout,
+            )
+            if installed.get("returncode") != 0:
+                shutil.rmtree(entry, ignore_errors=True)
+                return {
+                    "ok": False,
+                    "error": "pip install timed out" if installed.get("timed_out") else "pip install failed",
+                    "returncode": installed.get("returncode"),
+                    "stdout": installed.get("stdout") or "",
+                    "stderr": installed.get("stderr") or "",
+                }
+            with open(os.path.join(entry, DEPS_COMPLETE_MARKER), "w", encoding="utf-8") as f:
+                f.write(key)
+    except TimeoutError as e:
+        return {"ok": False, "error": "dependency cache lock timed out", "exception": str(e)}
+    return {"ok": True, "python": _venv_python(entry), "deps_cache": "built", "deps_cache_key": key}
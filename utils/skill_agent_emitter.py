@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+import time
+from collections.abc import Iterator
+
+from utils.skill_agent_constants import STREAM_FLUSH_CHARS, STREAM_FLUSH_MS
+
+
+class _TextCoalescer:
+    def __init__(self, flush_chars: int = STREAM_FLUSH_CHARS, flush_ms: int = STREAM_FLUSH_MS) -> None:
+        self.flush_chars = max(1, int(flush_chars))
+        self.flush_seconds = max(0, int(flush_ms)) / 1000.0
+        self._buf: list[str] = []
+        self._buf_len = 0
+        self._last_flush = time.monotonic()
+
+    def push(self, text: str) -> Iterator[str]:
+        if not text:
+            return
+        self._buf.append(text)
+        self._buf_len += len(text)
+        # Size-triggered flushes cut on flush_chars boundaries; a timer flush sends whatever is buffered.
+        while self._buf_len >= self.flush_chars:
+            joined = "".join(self._buf)
+            head, rest = joined[: self.flush_chars], joined[self.flush_chars :]
+            self._buf = [rest] if rest else []
+            self._buf_len = len(rest)
+            self._last_flush = time.monotonic()
+            yield head
+        if self._buf and time.monotonic() - self._last_flush >= self.flush_seconds:
+            yield from self.flush()
+
+    def flush(self) -> Iterator[str]:
+        self._last_flush = time.monotonic()
+        if not self._buf:
+            return
+        joined = "".join(self._buf)
+        self._buf = []
+        self._buf_len = 0
+        yield joined
+
+    def split(self, text: str) -> Iterator[str]:
+        yield from self.push(text)
+        yield from self.flush()
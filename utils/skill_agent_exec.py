@@ -4,12 +4,45 @@ import importlib.util
 import os
 import re
 import shutil
+import signal
 import subprocess
 import sys
+import threading
 import time
 from typing import Any
 
-from utils.skill_agent_constants import TEMP_SESSION_PREFIX
+from utils.skill_agent_constants import (
+    ALLOWED_COMMANDS,
+    COMMAND_OUTPUT_HEAD_BYTES,
+    COMMAND_OUTPUT_TAIL_BYTES,
+    COMMAND_TIMEOUT_MAX_SECONDS,
+    COMMAND_TIMEOUT_SECONDS,
+    EXECUTABLE_PROBE_TIMEOUT_SECONDS,
+    EXECUTABLE_PROBE_WAIT_SECONDS,
+    EXECUTABLE_VERSION_ARGS,
+    MODULE_INSTALL_FAILURE_TTL_SECONDS,
+    MODULE_SPEC_NEGATIVE_TTL_SECONDS,
+    MODULE_SPEC_POSITIVE_TTL_SECONDS,
+    PIP_INSTALL_TIMEOUT_SECONDS,
+    PIP_PACKAGE_ALIASES,
+    TEMP_SESSION_PREFIX,
+)
+
+# module name -> (found, expires_at); entries are monotonic-clock based.
+_MODULE_SPEC_CACHE: dict[str, tuple[bool, float]] = {}
+# module name -> (expires_at, failure result) for installs that recently failed.
+_INSTALL_FAILURES: dict[str, tuple[float, dict[str, Any]]] = {}
+_MODULE_SPEC_LOCK = threading.Lock()
+
+# (PATH, name) -> resolved path or None; a PATH change simply misses.
+_EXE_CACHE: dict[tuple[str, str], str | None] = {}
+_EXE_CACHE_LOCK = threading.Lock()
+# PATH -> {name: {available, path, version}}
+_EXE_PROBE: dict[str, dict[str, dict[str, Any]]] = {}
+_EXE_PROBE_THREADS: dict[str, threading.Thread] = {}
+# PATH -> set once availability is recorded, before any version probe returns.
+_EXE_PROBE_READY: dict[str, threading.Event] = {}
+_EXE_PROBE_LOCK = threading.Lock()
 
 
 def _detect_skills_root(explicit_path: str | None) -> str | None:
@@ -68,11 +101,168 @@ def _cleanup_old_temp_sessions(temp_root: str, *, keep: int, protect_dirs: set[s
         return
 
 
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+def _command_timeout(requested: Any = None) -> float:
+    default = _env_int("SKILL_AGENT_COMMAND_TIMEOUT", COMMAND_TIMEOUT_SECONDS)
+    try:
+        value = float(requested) if requested not in (None, "") else float(default)
+    except (TypeError, ValueError):
+        value = float(default)
+    if value <= 0:
+        value = float(default)
+    return min(value, float(COMMAND_TIMEOUT_MAX_SECONDS))
+
+
+class _BoundedCapture:
+    def __init__(self, head_bytes: int, tail_bytes: int) -> None:
+        self.head_limit = max(0, int(head_bytes))
+        self.tail_limit = max(0, int(tail_bytes))
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def feed(self, data: bytes) -> None:
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data and self.tail_limit:
+            self.tail += data
+            if len(self.tail) > self.tail_limit:
+                del self.tail[: len(self.tail) - self.tail_limit]
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + len(self.tail)
+
+    def text(self) -> str:
+        if not self.truncated:
+            # head and tail are contiguous here; decode together so a character split across them survives.
+            return bytes(self.head + self.tail).decode("utf-8", errors="ignore").strip()
+        head = bytes(self.head).decode("utf-8", errors="ignore")
+        tail = bytes(self.tail).decode("utf-8", errors="ignore")
+        omitted = self.total - len(self.head) - len(self.tail)
+        return (head + f"\n...[truncated {omitted} bytes]...\n" + tail).strip()
+
+
+def _drain_pipe(pipe: Any, capture: _BoundedCapture) -> None:
+    try:
+        while True:
+            data = pipe.read1(65536) if hasattr(pipe, "read1") else pipe.read(65536)
+            if not data:
+                break
+            capture.feed(data)
+    except Exception:
+        pass
+    finally:
+        try:
+            pipe.close()
+        except Exception:
+            pass
+
+
+def _kill_process_tree(proc: subprocess.Popen) -> None:
+    try:
+        if os.name == "nt":
+            subprocess.run(
+                ["taskkill", "/F", "/T", "/PID", str(proc.pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                timeout=10,
+            )
+        else:
+            os.killpg(proc.pid, signal.SIGKILL)
+    except Exception:
+        try:
+            proc.kill()
+        except Exception:
+            pass
+
+
+def _run_bounded(
+    command: list[str],
+    *,
+    cwd: str,
+    timeout: float | None = None,
+    head_bytes: int | None = None,
+    tail_bytes: int | None = None,
+    env: dict[str, str] | None = None,
+) -> dict[str, Any]:
+    timeout_s = _command_timeout(timeout)
+    stdout_cap = _BoundedCapture(
+        head_bytes if head_bytes is not None else _env_int("SKILL_AGENT_OUTPUT_HEAD_BYTES", COMMAND_OUTPUT_HEAD_BYTES),
+        tail_bytes if tail_bytes is not None else _env_int("SKILL_AGENT_OUTPUT_TAIL_BYTES", COMMAND_OUTPUT_TAIL_BYTES),
+    )
+    stderr_cap = _BoundedCapture(stdout_cap.head_limit, stdout_cap.tail_limit)
+    popen_kwargs: dict[str, Any] = {}
+    if os.name == "nt":
+        popen_kwargs["creationflags"] = getattr(subprocess, "CREATE_NEW_PROCESS_GROUP", 0)
+    else:
+        popen_kwargs["start_new_session"] = True
+    started = time.monotonic()
+    proc = subprocess.Popen(
+        command,
+        cwd=cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        **popen_kwargs,
+    )
+    readers = [
+        threading.Thread(target=_drain_pipe, args=(proc.stdout, stdout_cap), daemon=True),
+        threading.Thread(target=_drain_pipe, args=(proc.stderr, stderr_cap), daemon=True),
+    ]
+    for t in readers:
+        t.start()
+    timed_out = False
+    try:
+        proc.wait(timeout=timeout_s)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        _kill_process_tree(proc)
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            pass
+    finally:
+        if proc.returncode is None:
+            _kill_process_tree(proc)
+    for t in readers:
+        # A detached grandchild may keep the pipe open; do not hang on it.
+        t.join(timeout=5)
+
+    result: dict[str, Any] = {
+        "returncode": proc.returncode,
+        "stdout": stdout_cap.text(),
+        "stderr": stderr_cap.text(),
+        "stdout_bytes": stdout_cap.total,
+        "stderr_bytes": stderr_cap.total,
+        "stdout_truncated": stdout_cap.truncated,
+        "stderr_truncated": stderr_cap.truncated,
+        "duration_ms": int((time.monotonic() - started) * 1000),
+    }
+    if timed_out:
+        result["timed_out"] = True
+        result["timeout_seconds"] = timeout_s
+    return result
+
+
 def _is_safe_module_name(name: str) -> bool:
     return bool(re.fullmatch(r"[A-Za-z0-9_.-]+", name or ""))
 
 
-def _skill_contains_python_module(skill_path: str, module_name: str) -> bool:
+def _skill_contains_python_module(skill_path: str, module_name: str, *, walk: bool = True) -> bool:
     base = (module_name or "").split(".", 1)[0].strip()
     if not base:
         return False
@@ -87,51 +277,203 @@ def _skill_contains_python_module(skill_path: str, module_name: str) -> bool:
     init_candidate = os.path.join(dir_candidate, "__init__.py")
     if os.path.isfile(init_candidate):
         return True
+    if not walk:
+        return False
     for _, _, files in os.walk(dir_candidate):
         if any(str(f).lower().endswith(".py") for f in files):
             return True
     return False
 
 
-def _ensure_python_module(module_name: str, *, auto_install: bool, cwd: str) -> dict[str, Any]:
-    if not module_name or not _is_safe_module_name(module_name):
-        return {"ok": False, "error": "invalid module name", "module": module_name}
-    if importlib.util.find_spec(module_name) is not None:
-        return {"ok": True, "module": module_name}
+def _module_available(module_name: str) -> bool:
+    now = time.monotonic()
+    with _MODULE_SPEC_LOCK:
+        cached = _MODULE_SPEC_CACHE.get(module_name)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+    try:
+        found = importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        found = False
+    ttl = MODULE_SPEC_POSITIVE_TTL_SECONDS if found else MODULE_SPEC_NEGATIVE_TTL_SECONDS
+    with _MODULE_SPEC_LOCK:
+        _MODULE_SPEC_CACHE[module_name] = (found, now + ttl)
+    return found
+
+
+def _forget_modules(module_names: list[str]) -> None:
+    with _MODULE_SPEC_LOCK:
+        for name in module_names:
+            _MODULE_SPEC_CACHE.pop(name, None)
+    importlib.invalidate_caches()
+
+
+def _wheelhouse_dir(*, create: bool = False) -> str | None:
+    env_path = os.getenv("SKILL_AGENT_WHEELHOUSE")
+    if env_path:
+        path = os.path.abspath(env_path)
+    else:
+        path = os.path.join(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")), ".wheelhouse")
+    if create:
+        os.makedirs(path, exist_ok=True)
+        return path
+    try:
+        return path if any(os.scandir(path)) else None
+    except OSError:
+        return None
+
+
+def _pip_offline() -> bool:
+    return str(os.getenv("SKILL_AGENT_PIP_OFFLINE") or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _pip_install_index(command: list[str]) -> int | None:
+    if not command:
+        return None
+    exe = os.path.basename(str(command[0] or "")).lower()
+    exe = exe[:-4] if exe.endswith(".exe") else exe
+    start = 1
+    if exe.startswith("python"):
+        if command[1:3] != ["-m", "pip"]:
+            return None
+        start = 3
+    elif exe not in {"pip", "pip3"} and not re.fullmatch(r"pip3\.\d+", exe):
+        return None
+    for i in range(start, len(command)):
+        arg = str(command[i])
+        if arg.startswith("-"):
+            continue
+        return i if arg == "install" else None
+    return None
+
+
+def _run_pip_preferring_wheelhouse(
+    command: list[str], *, cwd: str, timeout: float | None = None, env: dict[str, str] | None = None
+) -> dict[str, Any]:
+    idx = _pip_install_index(command)
+    wheelhouse = _wheelhouse_dir() if idx is not None else None
+    if idx is None or wheelhouse is None or "--no-index" in command:
+        return _run_bounded(command, cwd=cwd, timeout=timeout, env=env)
+    local = command[: idx + 1] + ["--no-index", "--find-links", wheelhouse] + command[idx + 1 :]
+    result = _run_bounded(local, cwd=cwd, timeout=timeout, env=env)
+    result["wheelhouse"] = wheelhouse
+    if result.get("returncode") == 0 or _pip_offline():
+        return result
+    # Something is missing from the wheelhouse; the package index is the fallback unless running offline.
+    fallback = _run_bounded(command, cwd=cwd, timeout=timeout, env=env)
+    fallback["wheelhouse_miss"] = True
+    return fallback
+
+
+def _pip_install(packages: list[str], *, cwd: str) -> dict[str, Any]:
+    return _run_pip_preferring_wheelhouse(
+        [sys.executable, "-m", "pip", "install", *packages, "--no-input", "--disable-pip-version-check"],
+        cwd=cwd,
+        timeout=_env_int("SKILL_AGENT_PIP_TIMEOUT", PIP_INSTALL_TIMEOUT_SECONDS),
+    )
+
+
+def _populate_wheelhouse(requirements_path: str, *, timeout: float | None = None) -> dict[str, Any]:
+    try:
+        wheelhouse = _wheelhouse_dir(create=True)
+    except OSError as e:
+        return {"ok": False, "error": f"wheelhouse unavailable: {e}"}
+    if wheelhouse is None:
+        return {"ok": False, "error": "wheelhouse unavailable"}
+    result = _run_bounded(
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "wheel",
+            "-r",
+            requirements_path,
+            "-w",
+            wheelhouse,
+            "--find-links",
+            wheelhouse,
+            "--no-input",
+            "--disable-pip-version-check",
+        ],
+        cwd=os.path.dirname(os.path.abspath(requirements_path)),
+        timeout=timeout if timeout is not None else _env_int("SKILL_AGENT_WHEELHOUSE_TIMEOUT", COMMAND_TIMEOUT_SECONDS),
+    )
+    result["wheelhouse"] = wheelhouse
+    return result
+
+
+def _pip_failure(result: dict[str, Any], module_names: list[str]) -> dict[str, Any]:
+    return {
+        "ok": False,
+        "error": "pip install timed out" if result.get("timed_out") else "pip install failed",
+        "module": module_names[0] if len(module_names) == 1 else module_names,
+        "returncode": result.get("returncode"),
+        "stdout": result.get("stdout") or "",
+        "stderr": result.get("stderr") or "",
+    }
+
+
+def _ensure_python_modules(module_names: list[str], *, auto_install: bool, cwd: str) -> dict[str, Any]:
+    names: list[str] = []
+    for raw in module_names:
+        name = str(raw or "").strip()
+        if not name or not _is_safe_module_name(name):
+            return {"ok": False, "error": "invalid module name", "module": name}
+        if name not in names:
+            names.append(name)
+    missing = [n for n in names if not _module_available(n)]
+    if not missing:
+        return {"ok": True, "modules": names}
     if not auto_install:
-        return {"ok": False, "error": "python module not found", "module": module_name}
+        return {"ok": False, "error": "python module not found", "module": missing[0] if len(missing) == 1 else missing}
 
+    now = time.monotonic()
+    with _MODULE_SPEC_LOCK:
+        for name in missing:
+            failed = _INSTALL_FAILURES.get(name)
+            if failed is not None and failed[0] > now:
+                return {**failed[1], "cached": True}
+
+    packages = {n: PIP_PACKAGE_ALIASES.get(n.split(".", 1)[0], n.split(".", 1)[0]) for n in missing}
     try:
-        result = subprocess.run(
-            [sys.executable, "-m", "pip", "install", module_name, "--no-input", "--disable-pip-version-check"],
-            cwd=cwd,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="ignore",
-        )
-        if result.returncode == 0:
-            return {"ok": True, "module": module_name, "installed": True}
-        return {
-            "ok": False,
-            "error": "pip install failed",
-            "module": module_name,
-            "returncode": result.returncode,
-            "stdout": (result.stdout or "").strip(),
-            "stderr": (result.stderr or "").strip(),
-        }
+        result = _pip_install(sorted(set(packages.values())), cwd=cwd)
+        _forget_modules(missing)
+        if result.get("returncode") == 0:
+            return {"ok": True, "modules": names, "installed": missing}
+        if len(missing) == 1:
+            failures = {missing[0]: _pip_failure(result, missing)}
+        else:
+            # One bad name fails the whole batch; retry one by one so only the culprit is remembered.
+            failures = {}
+            for name in missing:
+                single = _pip_install([packages[name]], cwd=cwd)
+                if single.get("returncode") != 0:
+                    failures[name] = _pip_failure(single, [name])
+            _forget_modules(missing)
     except Exception as e:
-        return {"ok": False, "error": "pip install exception", "module": module_name, "exception": str(e)}
+        return {"ok": False, "error": "pip install exception", "module": missing, "exception": str(e)}
 
+    expires = time.monotonic() + _env_int("SKILL_AGENT_INSTALL_FAILURE_TTL", MODULE_INSTALL_FAILURE_TTL_SECONDS)
+    with _MODULE_SPEC_LOCK:
+        for name, failure in failures.items():
+            _INSTALL_FAILURES[name] = (expires, failure)
+    if not failures:
+        return {"ok": True, "modules": names, "installed": missing}
+    first = next(iter(failures.values()))
+    return {**first, "module": list(failures)[0] if len(failures) == 1 else list(failures)}
 
-def _resolve_executable(exe: str) -> str | None:
-    e = str(exe or "").strip()
-    if not e:
-        return None
-    from utils.skill_agent_paths import _is_abs_path
 
-    if _is_abs_path(e):
-        return e
+def _ensure_python_module(module_name: str, *, auto_install: bool, cwd: str) -> dict[str, Any]:
+    result = _ensure_python_modules([module_name], auto_install=auto_install, cwd=cwd)
+    if not result.get("ok"):
+        return result
+    out: dict[str, Any] = {"ok": True, "module": module_name}
+    if result.get("installed"):
+        out["installed"] = True
+    return out
+
+
+def _which(e: str) -> str | None:
     found = shutil.which(e)
     if found:
         return found
@@ -143,6 +485,121 @@ def _resolve_executable(exe: str) -> str | None:
     return None
 
 
+def _resolve_executable(exe: str) -> str | None:
+    e = str(exe or "").strip()
+    if not e:
+        return None
+    from utils.skill_agent_paths import _is_abs_path
+
+    if _is_abs_path(e):
+        return e
+    key = (os.environ.get("PATH", ""), e)
+    with _EXE_CACHE_LOCK:
+        if key in _EXE_CACHE:
+            return _EXE_CACHE[key]
+    found = _which(e)
+    with _EXE_CACHE_LOCK:
+        if len(_EXE_CACHE) > 512:
+            _EXE_CACHE.clear()
+        _EXE_CACHE[key] = found
+    return found
+
+
+def _probe_version(name: str, path: str) -> str:
+    if name == "python":
+        return sys.version.split()[0]
+    try:
+        result = _run_bounded(
+            [path, *EXECUTABLE_VERSION_ARGS.get(name, ["--version"])],
+            cwd=os.path.dirname(path) or os.getcwd(),
+            timeout=EXECUTABLE_PROBE_TIMEOUT_SECONDS,
+            head_bytes=2000,
+            tail_bytes=0,
+        )
+    except Exception:
+        return ""
+    if result.get("timed_out"):
+        return ""
+    text = str(result.get("stdout") or "").strip() or str(result.get("stderr") or "").strip()
+    if not text:
+        return ""
+    first = text.splitlines()[0].strip()
+    m = re.search(r"\d+(?:\.\d+)+", first)
+    return m.group(0) if m else first[:40]
+
+
+def _run_executable_probe(path_env: str) -> None:
+    found: dict[str, str] = {}
+    for name in sorted(ALLOWED_COMMANDS):
+        path = sys.executable if name == "python" else _resolve_executable(name)
+        if path:
+            found[name] = path
+    probe: dict[str, dict[str, Any]] = {
+        name: {"available": name in found, "path": found.get(name)} for name in sorted(ALLOWED_COMMANDS)
+    }
+    with _EXE_PROBE_LOCK:
+        _EXE_PROBE[path_env] = probe
+        ready = _EXE_PROBE_READY.get(path_env)
+    if ready is not None:
+        ready.set()
+    # Versions are best effort and filled in as the probes finish; availability is known immediately.
+    threads = []
+    for name, path in found.items():
+
+        def work(name: str = name, path: str = path) -> None:
+            version = _probe_version(name, path)
+            with _EXE_PROBE_LOCK:
+                probe[name]["version"] = version
+
+        t = threading.Thread(target=work, daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join(timeout=EXECUTABLE_PROBE_TIMEOUT_SECONDS + 1)
+
+
+def _probe_executables(*, wait: float = 0.0) -> dict[str, dict[str, Any]]:
+    path_env = os.environ.get("PATH", "")
+    start = False
+    with _EXE_PROBE_LOCK:
+        probe = _EXE_PROBE.get(path_env)
+        worker = _EXE_PROBE_THREADS.get(path_env)
+        if probe is None and worker is None:
+            worker = threading.Thread(target=_run_executable_probe, args=(path_env,), daemon=True)
+            _EXE_PROBE_THREADS[path_env] = worker
+            _EXE_PROBE_READY[path_env] = threading.Event()
+            start = True
+        ready = _EXE_PROBE_READY.get(path_env)
+    if start and worker is not None:
+        worker.start()
+    if probe is None and ready is not None and wait > 0:
+        # Only availability is waited for; versions are reported once their probes have finished.
+        ready.wait(timeout=wait)
+    with _EXE_PROBE_LOCK:
+        probe = _EXE_PROBE.get(path_env)
+        if probe is None:
+            return {}
+        return {name: dict(info) for name, info in probe.items()}
+
+
+def _executable_summary(*, wait: float = EXECUTABLE_PROBE_WAIT_SECONDS) -> str:
+    probe = _probe_executables(wait=wait)
+    if not probe:
+        return ""
+    available: list[str] = []
+    missing: list[str] = []
+    for name, info in probe.items():
+        if not info.get("available"):
+            missing.append(name)
+            continue
+        version = str(info.get("version") or "")
+        available.append(f"{name}（{version}）" if version else name)
+    lines = ["本机命令可用性：可用 " + ("、".join(available) if available else "（无）")]
+    if missing:
+        lines.append("不可用 " + "、".join(missing) + "；不要规划依赖这些命令的步骤，改用其他可用工具或告知用户")
+    return "；".join(lines) + "\n"
+
+
 def _missing_executable_hint(exe: str) -> str:
     base = os.path.basename(str(exe or "")).lower()
     base = base.split(".", 1)[0]
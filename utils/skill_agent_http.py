@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+from urllib.parse import urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.skill_agent_constants import HTTP_MAX_ATTEMPTS, HTTP_POOL_MAXSIZE
+
+USER_AGENT = "dify-plugin-skill/1.0"
+# urllib3 drops a partially read block when the connection breaks, so keep reads small enough
+# that a resume loses little.
+HTTP_READ_CHUNK_BYTES = 64 * 1024
+
+_HTTP_SESSION: requests.Session | None = None
+_HTTP_SESSION_LOCK = threading.Lock()
+
+
+def _get_http_session() -> requests.Session:
+    global _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is None:
+            retry = Retry(
+                total=HTTP_MAX_ATTEMPTS - 1,
+                connect=HTTP_MAX_ATTEMPTS - 1,
+                read=HTTP_MAX_ATTEMPTS - 1,
+                status=HTTP_MAX_ATTEMPTS - 1,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset({"GET", "HEAD"}),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _HTTP_SESSION = session
+        return _HTTP_SESSION
+
+
+def _resolve_file_url(url: str) -> str:
+    u = str(url or "").strip()
+    if urlparse(u).scheme:
+        return u
+    # Dify may hand out relative file URLs; FILES_URL (or our override, e.g. a local test server) supplies the host.
+    base = os.getenv("SKILL_AGENT_FILES_BASE_URL") or os.getenv("FILES_URL") or ""
+    if not base:
+        raise RuntimeError(f"无法解析相对文件 URL：{u}（请配置 FILES_URL）")
+    return urljoin(base.rstrip("/") + "/", u.lstrip("/"))
+
+
+def _http_head(url: str, timeout: float) -> dict[str, Any] | None:
+    try:
+        resp = _get_http_session().head(_resolve_file_url(url), timeout=timeout, allow_redirects=True)
+    except Exception:
+        return None
+    with resp:
+        if resp.status_code >= 400:
+            return None
+        size = resp.headers.get("Content-Length")
+        if size is None or not str(size).isdigit():
+            return None
+        return {
+            "size": int(size),
+            "etag": str(resp.headers.get("ETag") or "").strip(),
+            "accept_ranges": "bytes" in str(resp.headers.get("Accept-Ranges") or "").lower(),
+        }
+
+
+def _http_get_bytes(url: str, timeout: float = 30) -> bytes:
+    resp = _get_http_session().get(_resolve_file_url(url), timeout=timeout)
+    with resp:
+        resp.raise_for_status()
+        return resp.content
+
+
+def _resume_validator(resp: requests.Response) -> str | None:
+    # Weak ETags are not allowed in If-Range; Last-Modified is the fallback.
+    etag = resp.headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return resp.headers.get("Last-Modified") or None
+
+
+def _http_download(
+    url: str,
+    path: str,
+    *,
+    timeout: float,
+    chunk_bytes: int = HTTP_READ_CHUNK_BYTES,
+    on_bytes: Callable[[int, int], None] | None = None,
+) -> tuple[str, int]:
+    full_url = _resolve_file_url(url)
+    session = _get_http_session()
+    h = hashlib.sha256()
+    received = 0
+    validator: str | None = None
+    attempt = 0
+    with open(path, "wb") as f:
+        while True:
+            if received and validator is None:
+                # Nothing to prove the resource is unchanged, so a byte range could splice two versions.
+                f.seek(0)
+                f.truncate()
+                h = hashlib.sha256()
+                received = 0
+            headers = {"Range": f"bytes={received}-", "If-Range": validator} if received and validator else {}
+            try:
+                with session.get(full_url, headers=headers, timeout=timeout, stream=True) as resp:
+                    if resp.status_code == 416 and received:
+                        break
+                    resp.raise_for_status()
+                    current = _resume_validator(resp)
+                    if received and (resp.status_code != 206 or current != validator):
+                        # Range ignored, or the resource changed since the first response: start over from byte zero.
+                        f.seek(0)
+                        f.truncate()
+                        h = hashlib.sha256()
+                        received = 0
+                        if resp.status_code == 206:
+                            validator = None
+                            raise requests.ConnectionError("resource changed during a resumed download")
+                    if not received:
+                        validator = current
+                    for block in resp.iter_content(chunk_size=chunk_bytes):
+                        if not block:
+                            continue
+                        received += len(block)
+                        if on_bytes is not None:
+                            on_bytes(len(block), received)
+                        h.update(block)
+                        f.write(block)
+                    expected = resp.headers.get("Content-Range", "").rpartition("/")[2]
+                    if expected.isdigit() and received < int(expected):
+                        raise requests.ConnectionError("connection closed before the body was complete")
+                break
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError):
+                attempt += 1
+                if attempt >= HTTP_MAX_ATTEMPTS:
+                    raise
+                f.flush()
+                time.sleep(min(8.0, 0.5 * (2 ** (attempt - 1))))
+    return h.hexdigest(), received
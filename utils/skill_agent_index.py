@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import stat
+import threading
+from typing import Any
+
+from utils.tools import _parse_frontmatter, _read_text
+
+# skills_root -> {"root_sig": ..., "folders": {folder: (sig, entry)}, "version": str}
+_SKILLS_INDEX_CACHE: dict[str, dict[str, Any]] = {}
+_SKILLS_INDEX_LOCK = threading.Lock()
+
+
+def _stat_sig(path: str) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _skill_folder_sig(skills_root: str, folder: str) -> tuple[Any, ...] | None:
+    path = os.path.join(skills_root, folder)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(st.st_mode):
+        return None
+    return ((st.st_mtime_ns, st.st_size), _stat_sig(os.path.join(path, "SKILL.md")))
+
+
+def _index_version(folders: dict[str, tuple[tuple[Any, ...], dict[str, Any]]]) -> str:
+    h = hashlib.sha1()
+    for folder in sorted(folders):
+        sig, _ = folders[folder]
+        h.update(f"{folder}|{sig!r}\n".encode("utf-8", errors="ignore"))
+    return h.hexdigest()[:16]
+
+
+def _get_skills_index(skills_root: str | None) -> dict[str, Any]:
+    if not skills_root:
+        return {"root": None, "skills": [], "version": ""}
+    root = os.path.realpath(skills_root)
+    with _SKILLS_INDEX_LOCK:
+        cached = _SKILLS_INDEX_CACHE.get(root)
+        root_sig = _stat_sig(root)
+        if root_sig is None:
+            _SKILLS_INDEX_CACHE.pop(root, None)
+            return {"root": skills_root, "skills": [], "version": ""}
+
+        if cached is not None and cached.get("root_sig") == root_sig:
+            names = list(cached["folders"].keys())
+        else:
+            try:
+                names = sorted(os.listdir(root))
+            except OSError:
+                names = []
+
+        old_folders: dict[str, tuple[tuple[Any, ...], dict[str, Any]]] = (cached or {}).get("folders") or {}
+        folders: dict[str, tuple[tuple[Any, ...], dict[str, Any]]] = {}
+        changed = cached is None or cached.get("root_sig") != root_sig
+        for folder in names:
+            sig = _skill_folder_sig(root, folder)
+            if sig is None:
+                if folder in old_folders:
+                    changed = True
+                continue
+            prev = old_folders.get(folder)
+            if prev is not None and prev[0] == sig:
+                folders[folder] = prev
+                continue
+            changed = True
+            meta: dict[str, str] = {}
+            if sig[1] is not None:
+                try:
+                    meta = _parse_frontmatter(_read_text(os.path.join(root, folder, "SKILL.md"), 4000))
+                except Exception:
+                    meta = {}
+            folders[folder] = (
+                sig,
+                {
+                    "name": meta.get("name") or folder,
+                    "folder": folder,
+                    "description": meta.get("description") or "",
+                },
+            )
+
+        if not changed and cached is not None:
+            version = str(cached.get("version") or "")
+        else:
+            version = _index_version(folders)
+        _SKILLS_INDEX_CACHE[root] = {"root_sig": root_sig, "folders": folders, "version": version}
+
+    return {
+        "root": skills_root,
+        "skills": [dict(entry) for _, entry in folders.values()],
+        "version": version,
+    }
+
+
+def _invalidate_skills_index(skills_root: str | None = None) -> None:
+    with _SKILLS_INDEX_LOCK:
+        if not skills_root:
+            _SKILLS_INDEX_CACHE.clear()
+            return
+        _SKILLS_INDEX_CACHE.pop(os.path.realpath(skills_root), None)
@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from typing import Any
+
+from utils.tools import LIST_DIR_DEFAULT_IGNORE, _iter_dir, _parse_frontmatter, _read_text
+
+# Legacy in-tree manifest name; such files are still left out of listings and exported archives.
+SKILL_MANIFEST_NAME = ".skill_manifest.json"
+SKILL_MANIFEST_VERSION = 4
+SKILL_MANIFEST_MAX_FILES = 5000
+SKILL_MANIFEST_MAX_DEPTH = 32
+SKILL_MANIFEST_IGNORE: tuple[str, ...] = LIST_DIR_DEFAULT_IGNORE + (SKILL_MANIFEST_NAME, SKILL_MANIFEST_NAME + ".*.tmp")
+
+# skill_path -> manifest
+_MANIFEST_CACHE: dict[str, dict[str, Any]] = {}
+_MANIFEST_LOCK = threading.Lock()
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _manifest_store_root() -> str:
+    env_path = os.getenv("SKILL_AGENT_MANIFEST_CACHE")
+    if env_path:
+        return os.path.abspath(env_path)
+    plugin_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(plugin_root, ".manifest_cache")
+
+
+def _manifest_path(skill_path: str) -> str:
+    # Kept outside the skill so writing it never bumps the skill folder's mtime (which the skills index watches).
+    digest = hashlib.sha256(os.path.abspath(skill_path).encode("utf-8", errors="surrogateescape")).hexdigest()
+    return os.path.join(_manifest_store_root(), digest[:32] + ".json")
+
+
+def _stat_pair(path: str) -> list[int] | None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _manifest_is_fresh(skill_path: str, manifest: dict[str, Any]) -> bool:
+    # Adding, removing or renaming an entry bumps its directory's mtime, so only directories are stat-ed, plus
+    # SKILL.md, whose frontmatter the manifest carries. In-place edits to other files are only looked for when a
+    # content hash is needed (_skill_content_hash).
+    dirs = manifest.get("dirs")
+    if not isinstance(dirs, dict) or "." not in dirs:
+        return False
+    for rel, mtime_ns in dirs.items():
+        path = skill_path if rel == "." else os.path.join(skill_path, str(rel))
+        try:
+            if os.stat(path).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+    return manifest.get("skill_md") == _stat_pair(os.path.join(skill_path, "SKILL.md"))
+
+
+def _build_skill_manifest(skill_path: str, previous: dict[str, Any] | None = None) -> dict[str, Any]:
+    root = os.path.abspath(skill_path)
+    files: list[dict[str, Any]] = []
+    # Taken before each directory is listed, so an entry added during the walk leaves the manifest stale.
+    dirs: dict[str, int] = {}
+    try:
+        dirs["."] = os.stat(root).st_mtime_ns
+    except OSError:
+        pass
+    skill_md = os.path.join(root, "SKILL.md")
+    skill_md_sig = _stat_pair(skill_md)
+    python_modules: set[str] = set()
+    python_files: list[str] = []
+    node_projects: list[dict[str, Any]] = []
+    requirements: list[str] = []
+    truncated = False
+
+    for item in _iter_dir(root, max_depth=SKILL_MANIFEST_MAX_DEPTH, ignore=SKILL_MANIFEST_IGNORE, with_stat=True):
+        if len(files) >= SKILL_MANIFEST_MAX_FILES:
+            truncated = True
+            break
+        rel = str(item["relative_path"]).replace(os.sep, "/")
+        if item["type"] == "dir":
+            entry: dict[str, Any] = {"type": "dir", "relative_path": rel}
+            if item.get("pruned"):
+                entry["pruned"] = True
+            elif item.get("mtime_ns") is not None:
+                dirs[rel] = int(item["mtime_ns"])
+            files.append(entry)
+            continue
+        files.append({"type": "file", "relative_path": rel})
+        name = rel.rsplit("/", 1)[-1]
+        lower = name.lower()
+        if lower.endswith(".py"):
+            python_files.append(rel)
+            top = rel.split("/", 1)[0]
+            python_modules.add(top[:-3] if "/" not in rel else top)
+        elif lower == "package.json":
+            scripts: list[str] = []
+            try:
+                pkg = json.loads(_read_text(str(item["path"]), 200000))
+                if isinstance(pkg, dict) and isinstance(pkg.get("scripts"), dict):
+                    scripts = sorted(str(k) for k in pkg["scripts"].keys())
+            except Exception:
+                scripts = []
+            node_projects.append({"dir": rel.rsplit("/", 1)[0] if "/" in rel else ".", "scripts": scripts})
+        elif lower == "requirements.txt":
+            requirements.append(rel)
+
+    frontmatter: dict[str, str] = {}
+    if skill_md_sig is not None:
+        frontmatter = _parse_frontmatter(_read_text(skill_md, 12000))
+
+    # Digests of files that are still listed carry over; _skill_content_hash re-checks them against a fresh stat.
+    listed = {e["relative_path"] for e in files if e["type"] == "file"}
+    digests = {
+        rel: d for rel, d in ((previous or {}).get("digests") or {}).items() if rel in listed and isinstance(d, list)
+    }
+
+    return {
+        "version": SKILL_MANIFEST_VERSION,
+        "root": root,
+        "skill": os.path.basename(root),
+        "frontmatter": frontmatter,
+        "skill_md": skill_md_sig,
+        "files": files,
+        "dirs": dirs,
+        "digests": digests,
+        "truncated": truncated,
+        "entry_points": {
+            "python_modules": sorted(python_modules),
+            "python_files": python_files,
+            "node_projects": node_projects,
+            "requirements": requirements,
+        },
+    }
+
+
+def _save_manifest(manifest: dict[str, Any]) -> None:
+    path = _manifest_path(str(manifest["root"]))
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except Exception:
+        # An unwritable cache dir still leaves the in-memory manifest.
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+
+def _write_skill_manifest(skill_path: str, manifest: dict[str, Any] | None = None) -> dict[str, Any]:
+    root = os.path.abspath(skill_path)
+    if manifest is None:
+        manifest = _build_skill_manifest(root)
+    _save_manifest(manifest)
+    with _MANIFEST_LOCK:
+        _MANIFEST_CACHE[root] = manifest
+    return manifest
+
+
+def _read_manifest_file(skill_path: str) -> dict[str, Any] | None:
+    try:
+        with open(_manifest_path(skill_path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or data.get("version") != SKILL_MANIFEST_VERSION:
+        return None
+    if data.get("root") != os.path.abspath(skill_path):
+        return None
+    return data
+
+
+def _get_skill_manifest(skill_path: str) -> dict[str, Any] | None:
+    root = os.path.abspath(skill_path)
+    if not os.path.isdir(root):
+        return None
+    with _MANIFEST_LOCK:
+        cached = _MANIFEST_CACHE.get(root)
+    if cached is not None and _manifest_is_fresh(root, cached):
+        return cached
+
+    manifest = _read_manifest_file(root)
+    if manifest is not None and _manifest_is_fresh(root, manifest):
+        with _MANIFEST_LOCK:
+            _MANIFEST_CACHE[root] = manifest
+        return manifest
+
+    try:
+        return _write_skill_manifest(root, _build_skill_manifest(root, manifest or cached))
+    except Exception:
+        return None
+
+
+def _skill_content_hash(skill_path: str, manifest: dict[str, Any]) -> str | None:
+    # Only memoized commands need this, so only cacheable skills pay for it. Every listed file is re-stat-ed,
+    # because an in-place edit (say to a helper module the entry script imports) bumps no directory mtime; files
+    # whose size and mtime still match keep their recorded digest.
+    if manifest.get("truncated"):
+        return None
+    root = os.path.abspath(skill_path)
+    digests: dict[str, Any] = dict(manifest.get("digests") or {})
+    changed = False
+    h = hashlib.sha256()
+    for e in manifest.get("files") or []:
+        rel = str(e.get("relative_path") or "")
+        if e.get("type") != "file":
+            h.update(f"\ndir|{rel}".encode("utf-8", errors="surrogateescape"))
+            continue
+        path = os.path.join(root, rel)
+        sig = _stat_pair(path)
+        if sig is None:
+            return None
+        prior = digests.get(rel)
+        if isinstance(prior, list) and len(prior) == 3 and prior[:2] == sig:
+            digest = str(prior[2])
+        else:
+            try:
+                digest = _file_sha256(path)
+            except OSError:
+                return None
+            digests[rel] = [*sig, digest]
+            changed = True
+        h.update(f"\nfile|{rel}|{digest}".encode("utf-8", errors="surrogateescape"))
+    if changed:
+        with _MANIFEST_LOCK:
+            manifest["digests"] = digests
+        _save_manifest(dict(manifest))
+    return h.hexdigest()
+
+
+def _manifest_list_entries(
+    skill_path: str, manifest: dict[str, Any], max_depth: int = 2, *, max_entries: int = 500
+) -> dict[str, Any]:
+    root = os.path.abspath(skill_path)
+    limit = max(1, int(max_entries))
+    entries: list[dict[str, Any]] = []
+    omitted = 0
+    for e in manifest.get("files") or []:
+        if not isinstance(e, dict):
+            continue
+        rel = str(e.get("relative_path") or "")
+        if not rel or rel.count("/") > max_depth:
+            continue
+        if len(entries) >= limit:
+            omitted += 1
+            continue
+        item: dict[str, Any] = {
+            "type": e.get("type"),
+            "path": os.path.join(root, *rel.split("/")),
+            "relative_path": rel.replace("/", os.sep),
+        }
+        if e.get("pruned"):
+            item["pruned"] = True
+        entries.append(item)
+    result: dict[str, Any] = {"entries": entries, "truncated": omitted > 0}
+    if omitted:
+        result["omitted"] = omitted
+    return result
+
+
+def _manifest_has_python_module(manifest: dict[str, Any], module_name: str) -> bool:
+    base = (module_name or "").split(".", 1)[0].strip()
+    if not base:
+        return False
+    modules = (manifest.get("entry_points") or {}).get("python_modules") or []
+    return base in modules
+
+
+def _invalidate_skill_manifest(skill_path: str | None = None) -> None:
+    with _MANIFEST_LOCK:
+        if not skill_path:
+            _MANIFEST_CACHE.clear()
+            return
+        _MANIFEST_CACHE.pop(os.path.abspath(skill_path), None)
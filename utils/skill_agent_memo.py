@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Any
+
+from utils.skill_agent_constants import RESULT_CACHE_MAX_BYTES
+from utils.skill_agent_deps import _cache_lock
+from utils.skill_agent_exec import _env_int, _pip_install_index
+from utils.skill_agent_manifest import _file_sha256
+
+RESULT_CACHE_VERSION = 2
+RESULT_CACHE_INDEX_NAME = "index.json"
+RESULT_CACHE_INDEX_VERSION = 1
+RESULT_CACHE_LOCK_TIMEOUT_SECONDS = 30
+SESSION_DIR_PLACEHOLDER = "<session_dir>"
+# Package-manager subcommands whose real effect lands outside the session dir (site-packages, node_modules,
+# lockfiles); a replayed stdout would skip it, so they are never memoized even under "cacheable: true".
+PACKAGE_MANAGERS = {"npm", "bun", "yarn", "pnpm", "uv"}
+INSTALL_SUBCOMMANDS = {"install", "i", "ci", "add", "remove", "rm", "uninstall", "update", "upgrade", "link", "sync", "pip"}
+
+
+def _result_cache_root() -> str:
+    env_path = os.getenv("SKILL_AGENT_RESULT_CACHE")
+    if env_path:
+        return os.path.abspath(env_path)
+    plugin_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(plugin_root, ".result_cache")
+
+
+def _cacheable_targets(frontmatter: dict[str, Any] | None) -> set[str] | None:
+    raw = str((frontmatter or {}).get("cacheable") or "").strip().strip("[]")
+    if not raw or raw.lower() in {"false", "no", "0", "off"}:
+        return None
+    if raw.lower() in {"true", "yes", "1", "on", "all"}:
+        return set()
+    return {t.strip().strip("'\"").replace("\\", "/") for t in raw.split(",") if t.strip()}
+
+
+def _is_install_command(command: list[str]) -> bool:
+    if not command:
+        return False
+    exe = os.path.basename(str(command[0] or "")).lower()
+    exe = exe[:-4] if exe.endswith(".exe") else exe
+    args = [str(a) for a in command[1:]]
+    if exe.startswith("python") and args[:2] == ["-m", "pip"]:
+        return True
+    if exe == "pip" or exe.startswith("pip3") or _pip_install_index(command) is not None:
+        return True
+    if exe in PACKAGE_MANAGERS:
+        subcommand = next((a for a in args if not a.startswith("-")), "")
+        return subcommand in INSTALL_SUBCOMMANDS
+    return False
+
+
+def _is_cacheable_command(frontmatter: dict[str, Any] | None, command: list[str]) -> bool:
+    if _is_install_command(command):
+        return False
+    targets = _cacheable_targets(frontmatter)
+    if targets is None:
+        return False
+    if not targets:
+        return True
+    # A listed target matches the module after -m or the script path, e.g. "pkg" or "scripts/build.py".
+    args = [str(a).replace("\\", "/") for a in command[1:]]
+    for i, arg in enumerate(args):
+        if arg == "-m" and i + 1 < len(args) and args[i + 1] in targets:
+            return True
+        if not arg.startswith("-") and arg in targets:
+            return True
+    return False
+
+
+def _is_within(root: str, path: str) -> bool:
+    try:
+        return os.path.commonpath([root, path]) == root
+    except ValueError:
+        return False
+
+
+def _command_memo_key(
+    *,
+    skill_hash: str,
+    command: list[str],
+    cwd_relative: str | None,
+    session_dir: str,
+    skill_path: str | None = None,
+) -> str | None:
+    root = os.path.abspath(session_dir)
+    skill_root = os.path.abspath(skill_path) if skill_path else None
+    argv: list[str] = [os.path.basename(str(command[0] or ""))]
+    inputs: dict[str, str] = {}
+    for arg in command[1:]:
+        s = str(arg)
+        value = s.split("=", 1)[-1] if s.startswith("-") and "=" in s else s
+        if os.path.isabs(value):
+            abs_value = os.path.abspath(value)
+            if _is_within(root, abs_value):
+                rel = os.path.relpath(abs_value, root).replace(os.sep, "/")
+                # Any existing file is hashed as it is now, whether it was uploaded or produced by an earlier
+                # step; outputs not yet written are identified by path alone.
+                if os.path.isfile(abs_value):
+                    try:
+                        inputs[rel] = _file_sha256(abs_value)
+                    except OSError:
+                        return None
+                elif os.path.isdir(abs_value):
+                    # Directory inputs are not hashed; such commands are not safe to memoize.
+                    return None
+                s = s[: len(s) - len(value)] + SESSION_DIR_PLACEHOLDER + "/" + rel
+            elif not (skill_root and _is_within(skill_root, abs_value)):
+                # Neither a session file nor part of the hashed skill: it can be neither keyed as an input nor
+                # captured as an output.
+                return None
+        argv.append(s)
+    payload = {
+        "v": RESULT_CACHE_VERSION,
+        "skill": skill_hash,
+        "argv": argv,
+        "cwd": str(cwd_relative or "").replace("\\", "/"),
+        "inputs": inputs,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _memo_restore(key: str, session_dir: str) -> dict[str, Any] | None:
+    entry = os.path.join(_result_cache_root(), key[:2], key)
+    try:
+        with open(os.path.join(entry, "result.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or data.get("version") != RESULT_CACHE_VERSION:
+        return None
+    restored: list[str] = []
+    root = os.path.abspath(session_dir)
+    for rel in data.get("outputs") or []:
+        rel = str(rel)
+        src = os.path.join(entry, "files", *rel.split("/"))
+        dst = os.path.join(root, *rel.split("/"))
+        try:
+            if os.path.commonpath([root, os.path.abspath(dst)]) != root:
+                return None
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            # Swapped in whole, so a failed copy never leaves a truncated output behind.
+            tmp = f"{dst}.{uuid.uuid4().hex[:8]}.tmp"
+            shutil.copy2(src, tmp)
+            os.replace(tmp, dst)
+        except (OSError, ValueError):
+            return None
+        restored.append(rel)
+    _update_result_index(_result_cache_root(), key)
+    result = dict(data.get("result") or {})
+    result["cached"] = True
+    if restored:
+        result["restored_files"] = restored
+    return result
+
+
+def _memo_store(key: str, result: dict[str, Any], session_dir: str, outputs: list[str]) -> None:
+    root = _result_cache_root()
+    entry = os.path.join(root, key[:2], key)
+    staging = f"{entry}.tmp-{uuid.uuid4().hex[:8]}"
+    try:
+        os.makedirs(staging, exist_ok=True)
+        stored: list[str] = []
+        for rel in outputs:
+            src = os.path.join(os.path.abspath(session_dir), *str(rel).split("/"))
+            if not os.path.isfile(src):
+                continue
+            dst = os.path.join(staging, "files", *str(rel).split("/"))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy2(src, dst)
+            stored.append(str(rel))
+        keep = {k: v for k, v in result.items() if k not in {"duration_ms", "warm"}}
+        with open(os.path.join(staging, "result.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": RESULT_CACHE_VERSION, "created_at": int(time.time()), "result": keep, "outputs": stored},
+                f,
+                ensure_ascii=False,
+            )
+        size = _dir_bytes(staging)
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(staging, entry)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+        return
+    _update_result_index(root, key, size=size)
+
+
+def _dir_bytes(path: str) -> int:
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                continue
+    return total
+
+
+def _load_result_index(root: str) -> dict[str, Any] | None:
+    try:
+        with open(os.path.join(root, RESULT_CACHE_INDEX_NAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or data.get("version") != RESULT_CACHE_INDEX_VERSION:
+        return None
+    if not isinstance(data.get("entries"), dict):
+        return None
+    return data
+
+
+def _save_result_index(root: str, index: dict[str, Any]) -> None:
+    path = os.path.join(root, RESULT_CACHE_INDEX_NAME)
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _scan_result_cache(root: str) -> dict[str, Any]:
+    # Only when the index is missing or unreadable; afterwards sizes come from the index.
+    entries: dict[str, dict[str, Any]] = {}
+    try:
+        shards = [e.path for e in os.scandir(root) if e.is_dir()]
+    except OSError:
+        shards = []
+    for shard in shards:
+        try:
+            items = list(os.scandir(shard))
+        except OSError:
+            continue
+        for item in items:
+            if not item.is_dir() or ".tmp-" in item.name:
+                continue
+            try:
+                last_used = item.stat().st_mtime
+            except OSError:
+                last_used = 0.0
+            entries[item.name] = {"bytes": _dir_bytes(item.path), "last_used": last_used}
+    return {"version": RESULT_CACHE_INDEX_VERSION, "entries": entries}
+
+
+def _update_result_index(root: str, key: str, *, size: int | None = None) -> None:
+    try:
+        with _cache_lock(os.path.join(root, "index.lock"), RESULT_CACHE_LOCK_TIMEOUT_SECONDS):
+            index = _load_result_index(root) or _scan_result_cache(root)
+            entries: dict[str, Any] = index["entries"]
+            info = entries.get(key)
+            if size is not None or info is None:
+                info = entries[key] = {
+                    "bytes": size if size is not None else _dir_bytes(os.path.join(root, key[:2], key))
+                }
+            info["last_used"] = time.time()
+            if size is not None:
+                _evict_result_cache(root, index)
+            _save_result_index(root, index)
+    except (OSError, TimeoutError):
+        return
+
+
+def _evict_result_cache(root: str, index: dict[str, Any]) -> None:
+    limit = _env_int("SKILL_AGENT_RESULT_CACHE_BYTES", RESULT_CACHE_MAX_BYTES)
+    entries: dict[str, Any] = index["entries"]
+    total = sum(int(e.get("bytes") or 0) for e in entries.values())
+    if total <= limit:
+        return
+    for key, info in sorted(entries.items(), key=lambda kv: float(kv[1].get("last_used") or 0)):
+        if total <= limit:
+            break
+        shutil.rmtree(os.path.join(root, key[:2], key), ignore_errors=True)
+        total -= int(info.get("bytes") or 0)
+        entries.pop(key, None)
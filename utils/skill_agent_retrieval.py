@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any
+
+import numpy as np
+
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+_NAME_BOOST = 2
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯豈-﫿]+")
+
+# index version -> built model
+_RETRIEVER_CACHE: dict[str, "_SkillRetriever"] = {}
+_RETRIEVER_CACHE_MAX = 8
+_RETRIEVER_LOCK = threading.Lock()
+
+
+def _tokenize(text: str) -> list[str]:
+    s = str(text or "").lower()
+    if not s:
+        return []
+    tokens: list[str] = []
+    for run in _CJK_RE.findall(s):
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+    tokens.extend(_WORD_RE.findall(_CJK_RE.sub(" ", s)))
+    return tokens
+
+
+class _SkillRetriever:
+    def __init__(self, skills: list[dict[str, Any]]) -> None:
+        self.skills = [s for s in skills if isinstance(s, dict)]
+        self.vocab: dict[str, int] = {}
+        docs: list[dict[int, int]] = []
+        for skill in self.skills:
+            name_tokens = _tokenize(str(skill.get("name") or "")) + _tokenize(str(skill.get("folder") or ""))
+            tokens = name_tokens * _NAME_BOOST + _tokenize(str(skill.get("description") or ""))
+            counts: dict[int, int] = {}
+            for tok in tokens:
+                tid = self.vocab.setdefault(tok, len(self.vocab))
+                counts[tid] = counts.get(tid, 0) + 1
+            docs.append(counts)
+
+        n_docs = len(docs)
+        tf = np.zeros((n_docs, max(1, len(self.vocab))), dtype=np.float32)
+        for row, counts in enumerate(docs):
+            if counts:
+                tf[row, list(counts.keys())] = list(counts.values())
+        doc_len = tf.sum(axis=1)
+        avg_len = float(doc_len.mean()) if n_docs else 0.0
+        df = (tf > 0).sum(axis=0).astype(np.float32)
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        norm = _BM25_K1 * (1.0 - _BM25_B + _BM25_B * (doc_len / avg_len if avg_len > 0 else 1.0))
+        # Precomputed BM25 term weights: a query score is a column gather plus one matvec.
+        self.weights = (tf * (_BM25_K1 + 1.0)) / (tf + norm[:, None])
+        self.weights *= self.idf[None, :]
+
+    def score(self, text: str) -> np.ndarray:
+        counts: dict[int, int] = {}
+        for tok in _tokenize(text):
+            tid = self.vocab.get(tok)
+            if tid is not None:
+                counts[tid] = counts.get(tid, 0) + 1
+        if not counts or not self.skills:
+            return np.zeros(len(self.skills), dtype=np.float32)
+        ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        qtf = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return self.weights[:, ids] @ qtf
+
+    def top_k(self, text: str, k: int) -> list[dict[str, Any]]:
+        if k <= 0 or not self.skills:
+            return []
+        scores = self.score(text)
+        k = min(k, len(self.skills))
+        if k < len(scores):
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(len(scores))
+        ranked = sorted(candidates.tolist(), key=lambda i: (-float(scores[i]), i))
+        picked: list[dict[str, Any]] = []
+        for i in ranked:
+            if scores[i] <= 0:
+                break
+            picked.append({**self.skills[i], "score": round(float(scores[i]), 4)})
+        return picked
+
+
+def _get_skill_retriever(skills_index: dict[str, Any]) -> _SkillRetriever:
+    skills = skills_index.get("skills") if isinstance(skills_index, dict) else None
+    skills = skills if isinstance(skills, list) else []
+    version = str(skills_index.get("version") or "") if isinstance(skills_index, dict) else ""
+    if not version:
+        return _SkillRetriever(skills)
+    with _RETRIEVER_LOCK:
+        cached = _RETRIEVER_CACHE.get(version)
+        if cached is not None:
+            return cached
+    retriever = _SkillRetriever(skills)
+    with _RETRIEVER_LOCK:
+        if len(_RETRIEVER_CACHE) >= _RETRIEVER_CACHE_MAX:
+            _RETRIEVER_CACHE.pop(next(iter(_RETRIEVER_CACHE)))
+        _RETRIEVER_CACHE[version] = retriever
+    return retriever
+
+
+def _shortlist_skills(skills_index: dict[str, Any], text: str, top_k: int) -> list[dict[str, Any]]:
+    skills = skills_index.get("skills") if isinstance(skills_index, dict) else None
+    if not isinstance(skills, list) or top_k <= 0:
+        return []
+    if len(skills) <= top_k:
+        return [dict(s) for s in skills if isinstance(s, dict)]
+    picked = _get_skill_retriever(skills_index).top_k(text, top_k)
+    if len(picked) < top_k:
+        # Queries with no lexical overlap ("继续", "ok, do it") still need skills in the prompt: pad in index order.
+        seen = {str(s.get("folder") or s.get("name") or "") for s in picked}
+        for s in skills:
+            if len(picked) >= top_k:
+                break
+            if isinstance(s, dict) and str(s.get("folder") or s.get("name") or "") not in seen:
+                picked.append(dict(s))
+    return picked
@@ -1,24 +1,77 @@
 from __future__ import annotations
 
 import os
-import subprocess
 import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
-from utils.skill_agent_constants import ALLOWED_COMMANDS
+try:
+    from gevent import monkey as _gevent_monkey
+    from gevent.threadpool import ThreadPoolExecutor as _NativeThreadPoolExecutor
+except ImportError:
+    _gevent_monkey = None
+    _NativeThreadPoolExecutor = None
+
+from utils.skill_agent_cache import _FILE_READ_CACHE
+from utils.skill_agent_constants import ALLOWED_COMMANDS, TOOL_CALL_MAX_WORKERS
+from utils.skill_agent_deps import _ensure_node_modules, _ensure_python_env, _is_bare_node_install
 from utils.skill_agent_exec import (
-    _ensure_python_module,
+    _ensure_python_modules,
     _missing_executable_hint,
+    _pip_install_index,
     _resolve_executable,
+    _run_bounded,
+    _run_pip_preferring_wheelhouse,
     _skill_contains_python_module,
 )
+from utils.skill_agent_index import _get_skills_index
+from utils.skill_agent_manifest import (
+    SKILL_MANIFEST_IGNORE,
+    _get_skill_manifest,
+    _manifest_has_python_module,
+    _manifest_list_entries,
+    _skill_content_hash,
+)
+from utils.skill_agent_memo import _command_memo_key, _is_cacheable_command, _memo_restore, _memo_store
 from utils.skill_agent_paths import (
     _normalize_relative_file_path,
     _rewrite_existing_session_files_to_abs,
     _rewrite_out_arg_to_session_dir,
     _rewrite_uploads_paths_to_session_dir,
 )
-from utils.tools import _list_dir, _parse_frontmatter, _read_text, _safe_join
+from utils.skill_agent_retrieval import _get_skill_retriever
+from utils.skill_agent_session_files import SESSION_FILES_IGNORE, TOOL_RESULTS_DIR_NAME, _SessionFileManifest
+from utils.skill_agent_warm_pool import _get_warm_pool, _run_warm_python
+from utils.tools import _list_dir_bounded, _parse_frontmatter, _read_text_head, _read_text_range, _safe_join
+
+
+_TOOL_EXECUTOR: ThreadPoolExecutor | None = None
+_TOOL_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_tool_executor() -> ThreadPoolExecutor:
+    global _TOOL_EXECUTOR
+    with _TOOL_EXECUTOR_LOCK:
+        if _TOOL_EXECUTOR is None:
+            if _NativeThreadPoolExecutor is not None and _gevent_monkey.is_module_patched("threading"):
+                # The plugin SDK monkey-patches threading, so a stdlib pool would run its workers as greenlets and
+                # the blocking file I/O in read-only tools would still run one call at a time.
+                _TOOL_EXECUTOR = _NativeThreadPoolExecutor(max_workers=TOOL_CALL_MAX_WORKERS)
+            else:
+                _TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=TOOL_CALL_MAX_WORKERS, thread_name_prefix="skill-tool")
+        return _TOOL_EXECUTOR
+
+
+def _page_hint(path: str, read_bytes: int) -> dict[str, Any]:
+    try:
+        total = os.path.getsize(path)
+    except OSError:
+        return {}
+    if read_bytes >= total:
+        return {}
+    return {"total_bytes": total, "next_offset": read_bytes, "eof": False}
 
 
 class _AgentRuntime:
@@ -36,31 +89,65 @@ class _AgentRuntime:
         self.memory_turns = memory_turns
         self._skill_metadata_cache: dict[str, dict[str, Any]] = {}
         self._skill_files_listed: set[str] = set()
+        self._session_files: _SessionFileManifest | None = None
+        # Start preloading interpreters while the model is still planning.
+        _get_warm_pool()
+
+    def session_files(self) -> _SessionFileManifest:
+        if self._session_files is None:
+            manifest = _SessionFileManifest(self.session_dir)
+            manifest.load()
+            manifest.refresh()
+            self._session_files = manifest
+        return self._session_files
+
+    def _run_command(self, command: list[str], *, cwd: str, timeout: float | None, python: bool) -> dict[str, Any]:
+        if python:
+            result = _run_warm_python(command[1:], cwd=cwd, timeout=timeout)
+            if result is not None:
+                return result
+        if _pip_install_index(command) is not None:
+            return _run_pip_preferring_wheelhouse(command, cwd=cwd, timeout=timeout)
+        return _run_bounded(command, cwd=cwd, timeout=timeout)
+
+    def _session_relative_args(self, command: list[str]) -> list[str]:
+        root = os.path.abspath(self.session_dir)
+        rels: list[str] = []
+        for arg in command[1:]:
+            if not isinstance(arg, str) or not arg:
+                continue
+            value = arg.split("=", 1)[-1] if arg.startswith("-") and "=" in arg else arg
+            if not os.path.isabs(value):
+                continue
+            try:
+                if os.path.commonpath([root, os.path.abspath(value)]) != root:
+                    continue
+            except ValueError:
+                continue
+            rel = os.path.relpath(os.path.abspath(value), root).replace(os.sep, "/")
+            if rel and rel != ".":
+                rels.append(rel)
+        return rels
 
     def has_skill_metadata(self, skill_name: str) -> bool:
         cached = self._skill_metadata_cache.get(skill_name)
         return bool(isinstance(cached, dict) and cached.get("skill") == skill_name)
 
     def load_skills_index(self) -> dict[str, Any]:
+        return _get_skills_index(self.skills_root)
+
+    def search_skills(self, query: str, top_k: int = 10) -> dict[str, Any]:
         if not self.skills_root:
-            return {"root": None, "skills": []}
-        skills: list[dict[str, Any]] = []
-        for folder in sorted(os.listdir(self.skills_root)):
-            path = os.path.join(self.skills_root, folder)
-            if not os.path.isdir(path):
-                continue
-            skill_md = os.path.join(path, "SKILL.md")
-            meta: dict[str, str] = {}
-            if os.path.isfile(skill_md):
-                meta = _parse_frontmatter(_read_text(skill_md, 4000))
-            skills.append(
-                {
-                    "name": meta.get("name") or folder,
-                    "folder": folder,
-                    "description": meta.get("description") or "",
-                }
-            )
-        return {"root": self.skills_root, "skills": skills}
+            return {"error": "skills_root not found"}
+        skills_index = self.load_skills_index()
+        skills = skills_index.get("skills") or []
+        top_k = max(1, min(int(top_k or 10), 50))
+        q = str(query or "").strip()
+        if not q:
+            picked = [dict(s) for s in skills[:top_k]]
+        else:
+            picked = _get_skill_retriever(skills_index).top_k(q, top_k)
+        return {"query": q, "total_skills": len(skills), "skills": picked}
 
     def get_skill_metadata(self, skill_name: str) -> dict[str, Any]:
         if not self.skills_root:
@@ -69,29 +156,57 @@ class _AgentRuntime:
         skill_md = os.path.join(path, "SKILL.md")
         if not os.path.isfile(skill_md):
             return {"error": "SKILL.md not found", "skill": skill_name}
-        content = _read_text(skill_md, 12000)
+        content = _FILE_READ_CACHE.read_text(skill_md, 12000)
         meta = _parse_frontmatter(content)
         self._skill_metadata_cache[skill_name] = {"skill": skill_name, "metadata": meta}
         return {"skill": skill_name, "metadata": meta, "skill_md": content}
 
-    def list_skill_files(self, skill_name: str, max_depth: int = 2) -> dict[str, Any]:
+    def list_skill_files(self, skill_name: str, max_depth: int = 2, max_entries: int = 500) -> dict[str, Any]:
         if not self.skills_root:
             return {"error": "skills_root not found"}
         skill_path = _safe_join(self.skills_root, skill_name)
         self._skill_files_listed.add(skill_name)
-        return {"skill": skill_name, "entries": _list_dir(skill_path, max_depth=max_depth)}
+        manifest = _get_skill_manifest(skill_path) if os.path.isdir(skill_path) else None
+        if manifest is not None and not manifest.get("truncated"):
+            listing = _manifest_list_entries(skill_path, manifest, max_depth=max_depth, max_entries=max_entries)
+        else:
+            listing = _list_dir_bounded(
+                skill_path, max_depth=max_depth, max_entries=max_entries, ignore=SKILL_MANIFEST_IGNORE
+            )
+        return {"skill": skill_name, **listing}
 
     def has_listed_skill_files(self, skill_name: str) -> bool:
         return str(skill_name or "").strip() in self._skill_files_listed
 
-    def read_skill_file(self, skill_name: str, relative_path: str, max_chars: int = 12000) -> dict[str, Any]:
+    def read_skill_file(
+        self,
+        skill_name: str,
+        relative_path: str,
+        max_chars: int = 12000,
+        *,
+        offset: int | None = None,
+        length: int | None = None,
+        start_line: int | None = None,
+        end_line: int | None = None,
+    ) -> dict[str, Any]:
         if not self.skills_root:
             return {"error": "skills_root not found"}
         skill_path = _safe_join(self.skills_root, skill_name)
         file_path = _safe_join(skill_path, relative_path)
         if not os.path.isfile(file_path):
             return {"error": "file not found", "path": relative_path}
-        return {"path": file_path, "content": _read_text(file_path, max_chars)}
+        if offset is None and length is None and start_line is None and end_line is None:
+            content, read_bytes = _FILE_READ_CACHE.read_head(file_path, max_chars)
+            return {"path": file_path, "content": content, **_page_hint(file_path, read_bytes)}
+        ranged = _read_text_range(
+            file_path,
+            offset=offset,
+            length=length,
+            start_line=start_line,
+            end_line=end_line,
+            max_bytes=max_chars,
+        )
+        return {"path": file_path, **ranged}
 
     def write_temp_file(self, relative_path: str, content: str) -> dict[str, Any]:
         os.makedirs(self.session_dir, exist_ok=True)
@@ -105,14 +220,31 @@ class _AgentRuntime:
         if os.path.isdir(path):
             return {"error": "path is a directory", "relative_path": relative_path, "path": path}
         os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and swapped in, so a failed write never leaves a truncated file behind.
+        tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
         try:
-            with open(path, "w", encoding="utf-8", newline="\n") as f:
+            with open(tmp, "w", encoding="utf-8", newline="\n") as f:
                 f.write(content or "")
+            os.replace(tmp, path)
         except Exception as e:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
             return {"error": "write failed", "relative_path": relative_path, "path": path, "exception": str(e)}
+        self.session_files().record([rp])
         return {"path": path, "bytes": len((content or "").encode("utf-8"))}
 
-    def read_temp_file(self, relative_path: str, max_chars: int = 12000) -> dict[str, Any]:
+    def read_temp_file(
+        self,
+        relative_path: str,
+        max_chars: int = 12000,
+        *,
+        offset: int | None = None,
+        length: int | None = None,
+        start_line: int | None = None,
+        end_line: int | None = None,
+    ) -> dict[str, Any]:
         os.makedirs(self.session_dir, exist_ok=True)
         rp = _normalize_relative_file_path(relative_path)
         if not rp:
@@ -126,13 +258,29 @@ class _AgentRuntime:
         if not os.path.isfile(path):
             return {"error": "file not found", "relative_path": relative_path}
         try:
-            return {"path": path, "content": _read_text(path, max_chars)}
+            if offset is None and length is None and start_line is None and end_line is None:
+                content, read_bytes = _read_text_head(path, max_chars)
+                return {"path": path, "content": content, **_page_hint(path, read_bytes)}
+            ranged = _read_text_range(
+                path,
+                offset=offset,
+                length=length,
+                start_line=start_line,
+                end_line=end_line,
+                max_bytes=max_chars,
+            )
+            return {"path": path, **ranged}
         except Exception as e:
             return {"error": "read failed", "relative_path": relative_path, "path": path, "exception": str(e)}
 
-    def list_temp_files(self, max_depth: int = 4) -> dict[str, Any]:
+    def list_temp_files(self, max_depth: int = 4, max_entries: int = 500) -> dict[str, Any]:
         os.makedirs(self.session_dir, exist_ok=True)
-        return {"session_dir": self.session_dir, "entries": _list_dir(self.session_dir, max_depth=max_depth)}
+        listing = _list_dir_bounded(
+            self.session_dir, max_depth=max_depth, max_entries=max_entries, ignore=SESSION_FILES_IGNORE
+        )
+        # Stored tool results are reached through the handle in the tool message, not by browsing.
+        listing["entries"] = [e for e in listing.get("entries") or [] if e.get("relative_path") != TOOL_RESULTS_DIR_NAME]
+        return {"session_dir": self.session_dir, **listing}
 
     def get_session_context(self) -> dict[str, Any]:
         return {
@@ -147,6 +295,8 @@ class _AgentRuntime:
         command: list[str],
         cwd_relative: str | None = None,
         auto_install: bool = False,
+        timeout: float | None = None,
+        requirements: list[str] | None = None,
     ) -> dict[str, Any]:
         if not self.skills_root:
             return {"error": "skills_root not found"}
@@ -154,21 +304,29 @@ class _AgentRuntime:
             return {"error": "command must be a non-empty list"}
         skill_path = _safe_join(self.skills_root, skill_name)
         exe = command[0]
+        wanted = [str(m) for m in (requirements or []) if str(m or "").strip()]
         if exe == "python":
             if "-m" in command:
                 module_index = command.index("-m") + 1
                 if module_index < len(command):
                     module_name = command[module_index]
-                    if not _skill_contains_python_module(skill_path, str(module_name)):
+                    # A module file or package __init__ is a couple of isfile calls; only namespace packages need
+                    # the manifest (or, failing that, a walk).
+                    has_module = _skill_contains_python_module(skill_path, str(module_name), walk=False)
+                    if not has_module:
+                        manifest = _get_skill_manifest(skill_path)
+                        if manifest is not None and not manifest.get("truncated"):
+                            has_module = _manifest_has_python_module(manifest, str(module_name))
+                        else:
+                            has_module = _skill_contains_python_module(skill_path, str(module_name))
+                    if not has_module:
                         return {
                             "error": "no_executable_found",
                             "skill": skill_name,
                             "reason": "python -m module not found in skill folder",
                             "module": str(module_name),
                         }
-                    module_check = _ensure_python_module(str(module_name), auto_install=auto_install, cwd=self.session_dir)
-                    if not module_check.get("ok"):
-                        return module_check
+                    wanted.append(str(module_name))
             command = [sys.executable] + command[1:]
         elif exe not in ALLOWED_COMMANDS:
             return {"error": f"command not allowed: {exe}"}
@@ -181,38 +339,105 @@ class _AgentRuntime:
         command = _rewrite_existing_session_files_to_abs(command, session_dir=self.session_dir)
         command = _rewrite_out_arg_to_session_dir(command, session_dir=self.session_dir)
         cwd = skill_path if not cwd_relative else _safe_join(skill_path, cwd_relative)
+        use_warm = exe == "python"
         try:
-            result = subprocess.run(
-                command,
-                cwd=cwd,
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="ignore",
-            )
-            return {"returncode": result.returncode, "stdout": result.stdout.strip(), "stderr": result.stderr.strip()}
+            # Looked up before any dependency work, so a hit pays for neither pip nor the venv.
+            memo_key, skill_hash = self._memo_key(skill_path, command, cwd_relative)
+            if memo_key:
+                cached = _memo_restore(memo_key, self.session_dir)
+                if cached is not None:
+                    self.session_files().refresh(touched=list(cached.get("restored_files") or []))
+                    return cached
+            requirements_txt = None
+            if exe == "python" and auto_install:
+                requirements_txt = next(
+                    (p for p in (os.path.join(cwd, "requirements.txt"), os.path.join(skill_path, "requirements.txt")) if os.path.isfile(p)),
+                    None,
+                )
+            if requirements_txt:
+                # The skill's venv runs the command, so nothing is installed into the plugin interpreter.
+                env = _ensure_python_env(requirements_txt)
+                if not env.get("ok"):
+                    return env
+                command = [str(env["python"])] + command[1:]
+                use_warm = False
+            elif wanted:
+                module_check = _ensure_python_modules(wanted, auto_install=auto_install, cwd=self.session_dir)
+                if not module_check.get("ok"):
+                    return module_check
+            if _is_bare_node_install(exe, command[1:]):
+                cached = _ensure_node_modules(cwd, exe=exe, exe_path=resolved0, args=command[1:], timeout=timeout)
+                if cached is not None:
+                    return cached
+            if memo_key:
+                # Settle the baseline so the post-run diff holds only this command's outputs.
+                self.session_files().refresh()
+            result = self._run_command(command, cwd=cwd, timeout=timeout, python=use_warm)
+            changes = self.session_files().refresh(touched=self._session_relative_args(command))
+            if memo_key and result.get("returncode") == 0 and not result.get("timed_out"):
+                # Only the session diff is replayed on a hit, so a run that also changed its own skill folder
+                # (caches, generated files, edited helpers) is reported and not stored.
+                after = _get_skill_manifest(skill_path)
+                if after is None or _skill_content_hash(skill_path, after) != skill_hash:
+                    result["memo_skipped"] = "command wrote outside the session directory"
+                else:
+                    outputs = changes["added"] + changes["modified"]
+                    _memo_store(memo_key, result, self.session_dir, outputs)
+            return result
         except FileNotFoundError as e:
             return {"error": "executable_not_found", "exe": str(command[0] or exe), "exception": str(e)}
         except Exception as e:
             return {"error": "subprocess_failed", "exe": str(command[0] or exe), "exception": str(e)}
 
+    def _memo_key(
+        self, skill_path: str, command: list[str], cwd_relative: str | None
+    ) -> tuple[str | None, str | None]:
+        manifest = _get_skill_manifest(skill_path)
+        if manifest is None or not _is_cacheable_command(manifest.get("frontmatter"), command):
+            return None, None
+        skill_hash = _skill_content_hash(skill_path, manifest)
+        if not skill_hash:
+            return None, None
+        key = _command_memo_key(
+            skill_hash=skill_hash,
+            command=command,
+            cwd_relative=cwd_relative,
+            session_dir=self.session_dir,
+            skill_path=skill_path,
+        )
+        return key, skill_hash
+
     def run_temp_command(
-        self, *, command: list[str], cwd_relative: str | None = None, auto_install: bool = False
+        self,
+        *,
+        command: list[str],
+        cwd_relative: str | None = None,
+        auto_install: bool = False,
+        timeout: float | None = None,
+        requirements: list[str] | None = None,
     ) -> dict[str, Any]:
         if not command:
             return {"error": "command must be a non-empty list"}
         exe = command[0]
+        wanted = [str(m) for m in (requirements or []) if str(m or "").strip()]
         if exe == "python":
             if "-m" in command:
                 module_index = command.index("-m") + 1
                 if module_index < len(command):
                     module_name = command[module_index]
-                    module_check = _ensure_python_module(str(module_name), auto_install=auto_install, cwd=self.session_dir)
+                    module_check = _ensure_python_modules(
+                        [*wanted, str(module_name)], auto_install=auto_install, cwd=self.session_dir
+                    )
                     if not module_check.get("ok"):
                         return module_check
+                    wanted = []
             command = [sys.executable] + command[1:]
         elif exe not in ALLOWED_COMMANDS:
             return {"error": f"command not allowed: {exe}"}
+        if wanted:
+            module_check = _ensure_python_modules(wanted, auto_install=auto_install, cwd=self.session_dir)
+            if not module_check.get("ok"):
+                return module_check
         resolved0 = _resolve_executable(str(command[0] or ""))
         if not resolved0:
             missing = str(command[0] or exe)
@@ -223,15 +448,9 @@ class _AgentRuntime:
         os.makedirs(self.session_dir, exist_ok=True)
         cwd = self.session_dir if not cwd_relative else _safe_join(self.session_dir, cwd_relative)
         try:
-            result = subprocess.run(
-                command,
-                cwd=cwd,
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="ignore",
-            )
-            return {"returncode": result.returncode, "stdout": result.stdout.strip(), "stderr": result.stderr.strip()}
+            result = self._run_command(command, cwd=cwd, timeout=timeout, python=exe == "python")
+            self.session_files().refresh(touched=self._session_relative_args(command))
+            return result
         except FileNotFoundError as e:
             return {"error": "executable_not_found", "exe": str(command[0] or exe), "exception": str(e)}
         except Exception as e:
@@ -3,7 +3,34 @@ from __future__ import annotations
 from typing import Any
 
 
+READ_ONLY_TOOLS = frozenset(
+    {
+        "search_skills",
+        "get_skill_metadata",
+        "list_skill_files",
+        "read_skill_file",
+        "read_temp_file",
+        "list_temp_files",
+        "get_session_context",
+    }
+)
+
 TOOL_SCHEMAS: list[dict[str, Any]] = [
+    {
+        "type": "function",
+        "function": {
+            "name": "search_skills",
+            "description": "按关键词检索技能索引（name/description），用于查找未列入候选清单的技能",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string"},
+                    "top_k": {"type": "integer", "default": 10},
+                },
+                "required": ["query"],
+            },
+        },
+    },
     {
         "type": "function",
         "function": {
@@ -20,12 +47,13 @@ TOOL_SCHEMAS: list[dict[str, Any]] = [
         "type": "function",
         "function": {
             "name": "list_skill_files",
-            "description": "列出指定技能包内的文件结构",
+            "description": "列出指定技能包内的文件结构（node_modules/.git 等目录只列出不展开，超过 max_entries 的条目会被截断并给出 omitted 数量）",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "skill_name": {"type": "string"},
                     "max_depth": {"type": "integer", "default": 2},
+                    "max_entries": {"type": "integer", "default": 500},
                 },
                 "required": ["skill_name"],
             },
@@ -35,13 +63,17 @@ TOOL_SCHEMAS: list[dict[str, Any]] = [
         "type": "function",
         "function": {
             "name": "read_skill_file",
-            "description": "读取技能包内的文件内容",
+            "description": "读取技能包内的文件内容；大文件可用 offset/length（字节）或 start_line/end_line（行号，从 1 开始）分页读取，结果中的 next_offset/next_line 指向下一页",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "skill_name": {"type": "string"},
                     "relative_path": {"type": "string"},
                     "max_chars": {"type": "integer", "default": 12000},
+                    "offset": {"type": "integer", "minimum": 0},
+                    "length": {"type": "integer", "minimum": 1},
+                    "start_line": {"type": "integer", "minimum": 1},
+                    "end_line": {"type": "integer", "minimum": 1},
                 },
                 "required": ["skill_name", "relative_path"],
             },
@@ -51,7 +83,7 @@ TOOL_SCHEMAS: list[dict[str, Any]] = [
         "type": "function",
         "function": {
             "name": "run_skill_command",
-            "description": "在技能包目录内执行命令（限定可执行程序）",
+            "description": "在技能包目录内执行命令（限定可执行程序）；超时（默认 600 秒，可用 timeout_seconds 调整）会终止整个进程组，stdout/stderr 仅保留首尾片段并报告总字节数",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -59,6 +91,12 @@ TOOL_SCHEMAS: list[dict[str, Any]] = [
                     "command": {"type": "array", "items": {"type": "string"}},
                     "cwd_relative": {"type": "string"},
                     "auto_install": {"type": "boolean", "default": False},
+                    "timeout_seconds": {"type": "integer", "minimum": 1},
+                    "requirements": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "运行前需要可导入的 Python 模块名；缺失时配合 auto_install 一次性批量安装",
+                    },
                 },
                 "required": ["skill_name", "command"],
             },
@@ -91,12 +129,16 @@ TOOL_SCHEMAS: list[dict[str, Any]] = [
         "type": "function",
         "function": {
             "name": "read_temp_file",
-            "description": "读取 temp 会话目录文件内容（相对路径）",
+            "description": "读取 temp 会话目录文件内容（相对路径）；大文件可用 offset/length（字节）或 start_line/end_line（行号，从 1 开始）分页读取，结果中的 next_offset/next_line 指向下一页",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "relative_path": {"type": "string", "minLength": 1},
                     "max_chars": {"type": "integer", "default": 12000},
+                    "offset": {"type": "integer", "minimum": 0},
+                    "length": {"type": "integer", "minimum": 1},
+                    "start_line": {"type": "integer", "minimum": 1},
+                    "end_line": {"type": "integer", "minimum": 1},
                 },
                 "required": ["relative_path"],
             },
@@ -106,10 +148,13 @@ TOOL_SCHEMAS: list[dict[str, Any]] = [
         "type": "function",
         "function": {
             "name": "list_temp_files",
-            "description": "列出 temp 会话目录文件结构",
+            "description": "列出 temp 会话目录文件结构（node_modules/.git 等目录只列出不展开，超过 max_entries 的条目会被截断并给出 omitted 数量）",
             "parameters": {
                 "type": "object",
-                "properties": {"max_depth": {"type": "integer", "default": 4}},
+                "properties": {
+                    "max_depth": {"type": "integer", "default": 4},
+                    "max_entries": {"type": "integer", "default": 500},
+                },
             },
         },
     },
@@ -117,13 +162,19 @@ TOOL_SCHEMAS: list[dict[str, Any]] = [
         "type": "function",
         "function": {
             "name": "run_temp_command",
-            "description": "在 temp 会话目录内执行命令（限定可执行程序）",
+            "description": "在 temp 会话目录内执行命令（限定可执行程序）；超时（默认 600 秒，可用 timeout_seconds 调整）会终止整个进程组，stdout/stderr 仅保留首尾片段并报告总字节数",
             "parameters": {
                 "type": "object",
                 "properties": {
                     "command": {"type": "array", "items": {"type": "string"}},
                     "cwd_relative": {"type": "string"},
                     "auto_install": {"type": "boolean", "default": False},
+                    "timeout_seconds": {"type": "integer", "minimum": 1},
+                    "requirements": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "运行前需要可导入的 Python 模块名；缺失时配合 auto_install 一次性批量安装",
+                    },
                 },
                 "required": ["command"],
             },
@@ -153,6 +204,7 @@ def _validate_tool_arguments(tool_name: str, arguments: Any) -> tuple[bool, str]
         return False, "arguments 必须是对象(dict)"
 
     required: dict[str, list[str]] = {
+        "search_skills": ["query"],
         "get_skill_metadata": ["skill_name"],
         "list_skill_files": ["skill_name"],
         "read_skill_file": ["skill_name", "relative_path"],
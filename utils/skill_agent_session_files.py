@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Any
+
+from utils.tools import LIST_DIR_DEFAULT_IGNORE, _matches_any
+
+SESSION_FILES_MANIFEST_NAME = ".session_files.json"
+SESSION_FILES_MANIFEST_VERSION = 1
+SESSION_FILES_MAX_DEPTH = 10
+TOOL_RESULTS_DIR_NAME = ".tool_results"
+SESSION_FILES_IGNORE: tuple[str, ...] = LIST_DIR_DEFAULT_IGNORE + (SESSION_FILES_MANIFEST_NAME, TOOL_RESULTS_DIR_NAME)
+
+
+class _DirState:
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns: int = -1, files: set[str] | None = None, subdirs: set[str] | None = None) -> None:
+        self.mtime_ns = mtime_ns
+        self.files = files if files is not None else set()
+        self.subdirs = subdirs if subdirs is not None else set()
+
+
+def _join_rel(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+class _SessionFileManifest:
+    def __init__(
+        self,
+        session_dir: str,
+        *,
+        max_depth: int = SESSION_FILES_MAX_DEPTH,
+        ignore: tuple[str, ...] = SESSION_FILES_IGNORE,
+    ) -> None:
+        self.session_dir = os.path.abspath(session_dir)
+        self.max_depth = max_depth
+        self.ignore = ignore
+        self._files: dict[str, tuple[int, int]] = {}
+        self._dirs: dict[str, _DirState] = {}
+        self._lock = threading.RLock()
+
+    def _abs(self, rel: str) -> str:
+        return os.path.join(self.session_dir, *rel.split("/")) if rel else self.session_dir
+
+    @staticmethod
+    def _depth(rel: str) -> int:
+        return rel.count("/") + 1 if rel else 0
+
+    def _drop_dir(self, rel: str, changes: dict[str, list[str]]) -> None:
+        state = self._dirs.pop(rel, None)
+        if state is None:
+            return
+        for name in state.files:
+            child = _join_rel(rel, name)
+            if self._files.pop(child, None) is not None:
+                changes["removed"].append(child)
+        for name in state.subdirs:
+            self._drop_dir(_join_rel(rel, name), changes)
+
+    def _scan_dir(self, rel: str, changes: dict[str, list[str]]) -> None:
+        path = self._abs(rel)
+        try:
+            st = os.stat(path)
+            with os.scandir(path) as it:
+                items = list(it)
+        except OSError:
+            self._drop_dir(rel, changes)
+            return
+        old = self._dirs.get(rel) or _DirState()
+        state = _DirState(st.st_mtime_ns)
+        self._dirs[rel] = state
+        new_subdirs: list[str] = []
+        for entry in items:
+            name = entry.name
+            if _matches_any(name, self.ignore):
+                continue
+            child = _join_rel(rel, name)
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                state.subdirs.add(name)
+                if child not in self._dirs and not entry.is_symlink() and self._depth(child) <= self.max_depth:
+                    new_subdirs.append(child)
+                continue
+            try:
+                est = entry.stat()
+            except OSError:
+                continue
+            state.files.add(name)
+            sig = (est.st_size, est.st_mtime_ns)
+            prev = self._files.get(child)
+            if prev != sig:
+                self._files[child] = sig
+                changes["added" if prev is None else "modified"].append(child)
+        for name in old.files - state.files:
+            child = _join_rel(rel, name)
+            if self._files.pop(child, None) is not None:
+                changes["removed"].append(child)
+        for name in old.subdirs - state.subdirs:
+            self._drop_dir(_join_rel(rel, name), changes)
+        for child in new_subdirs:
+            self._scan_dir(child, changes)
+
+    def refresh(self, *, touched: list[str] | None = None) -> dict[str, list[str]]:
+        changes: dict[str, list[str]] = {"added": [], "modified": [], "removed": []}
+        with self._lock:
+            if not self._dirs:
+                self._scan_dir("", changes)
+            else:
+                for rel in sorted(self._dirs, key=self._depth):
+                    state = self._dirs.get(rel)
+                    if state is None:
+                        continue
+                    try:
+                        mtime_ns = os.stat(self._abs(rel)).st_mtime_ns
+                    except OSError:
+                        self._drop_dir(rel, changes)
+                        continue
+                    if mtime_ns != state.mtime_ns:
+                        self._scan_dir(rel, changes)
+            # In-place rewrites do not bump the directory mtime; callers pass the paths they know were written.
+            for rel in touched or []:
+                self._record_locked(rel, changes)
+        return changes
+
+    def _record_locked(self, rel: str, changes: dict[str, list[str]]) -> None:
+        rel = str(rel or "").replace("\\", "/").strip("/")
+        if not rel:
+            return
+        parent, _, name = rel.rpartition("/")
+        if parent not in self._dirs:
+            # Register any newly created parents before the file itself.
+            parts = parent.split("/") if parent else []
+            for i in range(len(parts) + 1):
+                d = "/".join(parts[:i])
+                if d not in self._dirs:
+                    self._scan_dir(d, changes)
+            return
+        try:
+            st = os.stat(self._abs(rel))
+        except OSError:
+            if self._files.pop(rel, None) is not None:
+                self._dirs[parent].files.discard(name)
+                changes["removed"].append(rel)
+            return
+        sig = (st.st_size, st.st_mtime_ns)
+        prev = self._files.get(rel)
+        state = self._dirs[parent]
+        state.files.add(name)
+        if prev != sig:
+            self._files[rel] = sig
+            changes["added" if prev is None else "modified"].append(rel)
+        try:
+            state.mtime_ns = os.stat(self._abs(parent)).st_mtime_ns
+        except OSError:
+            pass
+
+    def record(self, relative_paths: list[str]) -> dict[str, list[str]]:
+        changes: dict[str, list[str]] = {"added": [], "modified": [], "removed": []}
+        with self._lock:
+            if not self._dirs:
+                self._scan_dir("", changes)
+                return changes
+            for rel in relative_paths:
+                self._record_locked(rel, changes)
+        return changes
+
+    def files(self) -> list[str]:
+        with self._lock:
+            return sorted(self._files)
+
+    def file_info(self, rel: str) -> tuple[int, int] | None:
+        with self._lock:
+            return self._files.get(rel)
+
+    def has_files(self) -> bool:
+        with self._lock:
+            return bool(self._files)
+
+    def load(self) -> None:
+        path = os.path.join(self.session_dir, SESSION_FILES_MANIFEST_NAME)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if not isinstance(data, dict) or data.get("version") != SESSION_FILES_MANIFEST_VERSION:
+            return
+        dirs: dict[str, _DirState] = {}
+        files: dict[str, tuple[int, int]] = {}
+        try:
+            for rel, (mtime_ns, names, subdirs) in (data.get("dirs") or {}).items():
+                dirs[str(rel)] = _DirState(int(mtime_ns), set(names), set(subdirs))
+            for rel, (size, mtime_ns) in (data.get("files") or {}).items():
+                files[str(rel)] = (int(size), int(mtime_ns))
+        except Exception:
+            return
+        with self._lock:
+            self._dirs = dirs
+            self._files = files
+
+    def save(self) -> None:
+        with self._lock:
+            data: dict[str, Any] = {
+                "version": SESSION_FILES_MANIFEST_VERSION,
+                "dirs": {
+                    rel: [s.mtime_ns, sorted(s.files), sorted(s.subdirs)] for rel, s in self._dirs.items()
+                },
+                "files": {rel: list(sig) for rel, sig in self._files.items()},
+            }
+        path = os.path.join(self.session_dir, SESSION_FILES_MANIFEST_NAME)
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        except Exception:
+            return
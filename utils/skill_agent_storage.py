@@ -4,7 +4,13 @@ import json
 import time
 from typing import Any
 
-from utils.skill_agent_constants import HISTORY_KEY_PREFIX, RESUME_KEY_PREFIX, SESSION_DIR_KEY_PREFIX
+from utils.skill_agent_constants import (
+    HISTORY_KEY_PREFIX,
+    HISTORY_MAX_TURNS,
+    HISTORY_SEGMENT_TURNS,
+    RESUME_KEY_PREFIX,
+    SESSION_DIR_KEY_PREFIX,
+)
 from utils.tools import _safe_get
 
 
@@ -78,18 +84,85 @@ def _storage_set_json(storage: Any, key: str, value: dict[str, Any] | None) -> N
         return
 
 
+HISTORY_STORE_VERSION = 2
+
+
+def _history_segment_key(history_key: str, segment: int) -> str:
+    return f"{history_key}:seg:{segment}"
+
+
+def _storage_delete(storage: Any, key: str) -> None:
+    try:
+        storage.delete(key)
+    except Exception:
+        _storage_set_text(storage, key, "")
+
+
+def _history_head(state: dict[str, Any]) -> dict[str, int] | None:
+    if state.get("v") != HISTORY_STORE_VERSION:
+        return None
+    try:
+        return {"count": int(state["count"]), "first": int(state["first"]), "seg": max(1, int(state["seg"]))}
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _read_history_segment(storage: Any, history_key: str, segment: int) -> list[dict[str, Any]]:
+    turns = _storage_get_json(storage, _history_segment_key(history_key, segment)).get("turns")
+    return turns if isinstance(turns, list) else []
+
+
+def _migrate_legacy_history(storage: Any, history_key: str, turns: list[Any], *, max_turns: int) -> dict[str, int]:
+    # Pre-segment layout kept every turn in one blob under history_key; re-home it as segments once.
+    turns = [t for t in turns if isinstance(t, dict)][-max_turns:]
+    seg = HISTORY_SEGMENT_TURNS
+    for start in range(0, len(turns), seg):
+        _storage_set_json(storage, _history_segment_key(history_key, start // seg), {"turns": turns[start : start + seg]})
+    return {"count": len(turns), "first": 0, "seg": seg}
+
+
+def _read_history_turns(storage: Any, history_key: str, limit: int) -> list[dict[str, Any]]:
+    if limit <= 0:
+        return []
+    state = _storage_get_json(storage, history_key)
+    head = _history_head(state)
+    if head is None:
+        turns = state.get("turns")
+        return [t for t in turns if isinstance(t, dict)][-limit:] if isinstance(turns, list) else []
+    count, seg = head["count"], head["seg"]
+    start = max(head["first"], count - limit)
+    if start >= count:
+        return []
+    picked: list[dict[str, Any]] = []
+    for segment in range(start // seg, (count - 1) // seg + 1):
+        base = segment * seg
+        for offset, turn in enumerate(_read_history_segment(storage, history_key, segment)):
+            if start <= base + offset < count and isinstance(turn, dict):
+                picked.append(turn)
+    return picked
+
+
 def _append_history_turn(
     storage: Any,
     *,
     history_key: str,
     user_text: str,
     assistant_text: str,
-    max_turns: int = 50,
+    max_turns: int = HISTORY_MAX_TURNS,
 ) -> None:
+    if max_turns < 1:
+        max_turns = 1
     state = _storage_get_json(storage, history_key)
-    turns = state.get("turns")
-    if not isinstance(turns, list):
-        turns = []
+    head = _history_head(state)
+    if head is None:
+        legacy = state.get("turns")
+        head = _migrate_legacy_history(
+            storage, history_key, legacy if isinstance(legacy, list) else [], max_turns=max_turns
+        )
+    seg = head["seg"]
+    index = head["count"]
+    segment = index // seg
+    turns = _read_history_segment(storage, history_key, segment)[: index - segment * seg] if index % seg else []
     turns.append(
         {
             "user": str(user_text or ""),
@@ -97,8 +170,10 @@ def _append_history_turn(
             "created_at": int(time.time()),
         }
     )
-    if max_turns < 1:
-        max_turns = 1
-    if len(turns) > max_turns:
-        turns = turns[-max_turns:]
-    _storage_set_json(storage, history_key, {"turns": turns})
+    _storage_set_json(storage, _history_segment_key(history_key, segment), {"turns": turns})
+    count = index + 1
+    first = max(head["first"], count - max_turns)
+    # Segments that fell entirely out of the window are released.
+    for old in range(head["first"] // seg, first // seg):
+        _storage_delete(storage, _history_segment_key(history_key, old))
+    _storage_set_json(storage, history_key, {"v": HISTORY_STORE_VERSION, "count": count, "first": first, "seg": seg})
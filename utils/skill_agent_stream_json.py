@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import io
+import json
+
+PROTOCOL_ACTION_TYPES = {"tool", "final"}
+
+
+class _JsonStreamSniffer:
+    # Streaming counterpart of should_emit_user_text(_extract_first_json_object(...)): the brace/string
+    # state is carried across chunks, so every character is scanned at most once per reply.
+    def __init__(self) -> None:
+        self._buf = io.StringIO()
+        self._started = False
+        self._head = ""
+        self._fences = 0
+        self._fence_tail = ""
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._obj: list[str] = []
+        self._decided: bool | None = None
+        self._pending = ""
+
+    def feed(self, text: str) -> None:
+        if not text:
+            return
+        self._buf.write(text)
+        if not self._started:
+            text = text.lstrip()
+            if not text:
+                return
+            self._started = True
+        if len(self._head) < 3:
+            self._head += text[: 3 - len(self._head)]
+        self._pending += text
+        if self._fences < 2:
+            # Matched left to right like str.count, so the carried tail starts after the last counted fence.
+            window = self._fence_tail + text
+            end = 0
+            pos = window.find("```")
+            while pos >= 0:
+                self._fences += 1
+                end = pos + 3
+                pos = window.find("```", end)
+            self._fence_tail = window[end:][-2:]
+        if self._decided is None:
+            self._scan(text)
+
+    def _scan(self, text: str) -> None:
+        for ch in text:
+            if self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+                    self._obj.append(ch)
+                continue
+            self._obj.append(ch)
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+                continue
+            if ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._decided = not self._is_protocol_action("".join(self._obj))
+                    self._obj = []
+                    return
+
+    @staticmethod
+    def _is_protocol_action(json_text: str) -> bool:
+        try:
+            obj = json.loads(json_text)
+        except Exception:
+            return False
+        return isinstance(obj, dict) and obj.get("type") in PROTOCOL_ACTION_TYPES
+
+    def should_emit(self) -> bool:
+        if not self._started:
+            return False
+        if self._head.startswith("{") and self._decided is None:
+            return False
+        if self._head.startswith("```") and self._fences < 2:
+            return False
+        return True if self._decided is None else self._decided
+
+    def take_visible(self) -> str:
+        # Trailing whitespace is held back, matching the stripped text the caller would otherwise re-join.
+        visible = self._pending.rstrip()
+        self._pending = self._pending[len(visible) :]
+        return visible
+
+    def text(self) -> str:
+        return self._buf.getvalue().strip()
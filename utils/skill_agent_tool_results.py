@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import json
+import os
+import uuid
+from typing import Any
+
+from utils.skill_agent_constants import TOOL_RESULT_INLINE_MAX_CHARS, TOOL_RESULT_PREVIEW_CHARS
+from utils.skill_agent_exec import _env_int
+from utils.skill_agent_session_files import TOOL_RESULTS_DIR_NAME
+from utils.tools import _safe_filename
+
+
+# Paged reads are already bounded by their own max_chars/length and would otherwise be offloaded page by page.
+TOOL_RESULT_INLINE_TOOLS = frozenset({"read_skill_file", "read_temp_file", "get_skill_metadata"})
+# Command output: errors and summaries usually sit at the end, so previews keep head and tail.
+TOOL_RESULT_TAIL_FIELDS = ("stdout", "stderr")
+
+
+def _preview_value(value: Any, limit: int, *, keep_tail: bool = False) -> Any:
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    if len(text) <= limit:
+        return value
+    if keep_tail:
+        head = limit // 2
+        return text[:head] + f"\n…（共 {len(text)} 字符，中间已省略）…\n" + text[len(text) - (limit - head) :]
+    return text[:limit] + f"…（共 {len(text)} 字符，已截断）"
+
+
+def _tool_result_preview(result: Any, limit: int, *, tail_fields: tuple[str, ...] = ()) -> Any:
+    if not isinstance(result, dict):
+        return _preview_value(result, limit)
+    # Small fields (returncode, path, error...) stay intact; the large ones share the preview budget.
+    small = {k: v for k, v in result.items() if len(json.dumps(v, ensure_ascii=False)) <= 200}
+    large = [k for k in result if k not in small]
+    share = max(200, limit // max(1, len(large)))
+    return {
+        k: (small[k] if k in small else _preview_value(result[k], share, keep_tail=k in tail_fields)) for k in result
+    }
+
+
+def _offload_tool_result(result: Any, *, session_dir: str, name: str, call_id: str = "") -> Any:
+    limit = _env_int("SKILL_AGENT_TOOL_RESULT_INLINE_CHARS", TOOL_RESULT_INLINE_MAX_CHARS)
+    if limit <= 0 or name in TOOL_RESULT_INLINE_TOOLS:
+        return result
+    text = json.dumps(result, ensure_ascii=False)
+    if len(text) <= limit:
+        return result
+    handle = f"{_safe_filename(call_id or name)}-{uuid.uuid4().hex[:8]}.json"
+    rel = f"{TOOL_RESULTS_DIR_NAME}/{handle}"
+    try:
+        os.makedirs(os.path.join(session_dir, TOOL_RESULTS_DIR_NAME), exist_ok=True)
+        # Indented so read_temp_file can page it by line as well as by offset.
+        with open(os.path.join(session_dir, TOOL_RESULTS_DIR_NAME, handle), "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=1)
+    except OSError:
+        return result
+    return {
+        "result_stored": {"relative_path": rel, "chars": len(text)},
+        "preview": _tool_result_preview(
+            result,
+            TOOL_RESULT_PREVIEW_CHARS,
+            tail_fields=TOOL_RESULT_TAIL_FIELDS if name.startswith("run_") and name.endswith("_command") else (),
+        ),
+        "note": f"结果较大，完整内容已保存到会话目录；需要时用 read_temp_file(relative_path={rel!r}) 按 offset/start_line 分页读取。",
+    }
@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from utils.skill_agent_constants import (
+    UPLOAD_MAX_FILE_BYTES,
+    UPLOAD_MAX_TOTAL_BYTES,
+    UPLOAD_MAX_WORKERS,
+    UPLOAD_STORE_MAX_BYTES,
+)
+from utils.skill_agent_deps import _cache_lock
+from utils.skill_agent_exec import _env_int
+from utils.skill_agent_http import _http_download, _http_head
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None  # type: ignore[assignment]
+
+# FICLONE from linux/fs.h: share the blob's extents copy-on-write instead of copying its bytes.
+FICLONE = 0x40049409
+UPLOAD_STORE_INDEX_NAME = "index.json"
+UPLOAD_STORE_INDEX_VERSION = 2
+# Query parameters that only sign or expire a URL; everything else may select different content.
+UPLOAD_URL_SIGNATURE_PARAMS = frozenset(
+    {
+        "timestamp",
+        "nonce",
+        "sign",
+        "signature",
+        "expires",
+        "x-amz-algorithm",
+        "x-amz-credential",
+        "x-amz-date",
+        "x-amz-expires",
+        "x-amz-signature",
+        "x-amz-signedheaders",
+        "x-amz-security-token",
+        "x-goog-algorithm",
+        "x-goog-credential",
+        "x-goog-date",
+        "x-goog-expires",
+        "x-goog-signature",
+        "x-goog-signedheaders",
+        "ossaccesskeyid",
+        "accesskeyid",
+        "security-token",
+        "se",
+        "sig",
+        "sp",
+        "sv",
+        "st",
+        "sr",
+    }
+)
+
+_UPLOAD_EXECUTOR: ThreadPoolExecutor | None = None
+_UPLOAD_EXECUTOR_LOCK = threading.Lock()
+
+
+class _UploadLimitError(RuntimeError):
+    pass
+
+
+class _ByteBudget:
+    def __init__(self, limit: int) -> None:
+        self.limit = max(0, int(limit))
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def consume(self, n: int) -> None:
+        with self._lock:
+            if self.used + n > self.limit:
+                raise _UploadLimitError(f"本次请求上传总量超过上限 {self.limit} 字节")
+            self.used += n
+
+    def refund(self, n: int) -> None:
+        with self._lock:
+            self.used = max(0, self.used - n)
+
+
+def _get_upload_executor() -> ThreadPoolExecutor:
+    global _UPLOAD_EXECUTOR
+    with _UPLOAD_EXECUTOR_LOCK:
+        if _UPLOAD_EXECUTOR is None:
+            _UPLOAD_EXECUTOR = ThreadPoolExecutor(
+                max_workers=_env_int("SKILL_AGENT_UPLOAD_WORKERS", UPLOAD_MAX_WORKERS), thread_name_prefix="skill-upload"
+            )
+        return _UPLOAD_EXECUTOR
+
+
+def _upload_store_root() -> str:
+    env_path = os.getenv("SKILL_AGENT_UPLOAD_STORE")
+    if env_path:
+        return os.path.abspath(env_path)
+    plugin_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    return os.path.join(plugin_root, ".upload_store")
+
+
+def _blob_path(root: str, sha256: str) -> str:
+    return os.path.join(root, "blobs", sha256[:2], sha256)
+
+
+def _upload_key(url: str, meta: dict[str, Any]) -> str:
+    # Signed file URLs carry a fresh timestamp/nonce per message; drop only those and keep the rest of the query.
+    parsed = urlparse(url)
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True) if k.lower() not in UPLOAD_URL_SIGNATURE_PARAMS
+    )
+    raw = f"{parsed.netloc}|{parsed.path}|{urlencode(query)}|{meta.get('size')}|{meta.get('etag') or ''}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _load_index(root: str) -> dict[str, Any]:
+    try:
+        with open(os.path.join(root, UPLOAD_STORE_INDEX_NAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return {"version": UPLOAD_STORE_INDEX_VERSION, "keys": {}, "blobs": {}}
+    if not isinstance(data, dict) or data.get("version") != UPLOAD_STORE_INDEX_VERSION:
+        return {"version": UPLOAD_STORE_INDEX_VERSION, "keys": {}, "blobs": {}}
+    data.setdefault("keys", {})
+    data.setdefault("blobs", {})
+    return data
+
+
+def _save_index(root: str, index: dict[str, Any]) -> None:
+    path = os.path.join(root, UPLOAD_STORE_INDEX_NAME)
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _clone_blob(src: str, dst: str) -> bool:
+    if fcntl is None or not hasattr(fcntl, "ioctl"):
+        return False
+    try:
+        with open(src, "rb") as fin, open(dst, "wb") as fout:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def _copy_blob(src: str, dst: str) -> None:
+    # Every session gets a private, writable file so edits never reach the blob or another session's copy: a
+    # reflink where the filesystem supports it (copy-on-write, no extra space), a plain copy otherwise.
+    tmp = f"{dst}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        if not _clone_blob(src, tmp):
+            shutil.copyfile(src, tmp)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _blob_intact(root: str, sha256: str, info: dict[str, Any]) -> bool:
+    path = _blob_path(root, sha256)
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    if st.st_size != info.get("size"):
+        return False
+    if st.st_mtime_ns == info.get("mtime_ns"):
+        return True
+    # Touched since it was stored (e.g. a process allowed to ignore the read-only mode wrote to it): re-verify.
+    return _sha256_file(path) == sha256
+
+
+def _download_to(
+    url: str, path: str, *, timeout: int, max_bytes: int | None = None, budget: _ByteBudget | None = None
+) -> tuple[str, int]:
+    high_water = 0
+
+    def on_bytes(n: int, received: int) -> None:
+        nonlocal high_water
+        if max_bytes is not None and received > max_bytes:
+            raise _UploadLimitError(f"文件超过单文件上限 {max_bytes} 字节")
+        # A restarted transfer re-reads bytes already counted against the request budget.
+        if budget is not None and received > high_water:
+            budget.consume(received - high_water)
+        high_water = max(high_water, received)
+
+    try:
+        return _http_download(url, path, timeout=timeout, on_bytes=on_bytes)
+    except BaseException:
+        # A failed file must not eat into the allowance of the files that follow it.
+        if budget is not None and high_water:
+            budget.refund(high_water)
+        raise
+
+
+def _evict_upload_store(root: str, index: dict[str, Any]) -> None:
+    limit = _env_int("SKILL_AGENT_UPLOAD_STORE_BYTES", UPLOAD_STORE_MAX_BYTES)
+    blobs: dict[str, Any] = index["blobs"]
+    total = sum(int(b.get("size") or 0) for b in blobs.values())
+    if total <= limit:
+        return
+    for sha256, info in sorted(blobs.items(), key=lambda kv: float(kv[1].get("last_used") or 0)):
+        if total <= limit:
+            break
+        try:
+            os.unlink(_blob_path(root, sha256))
+        except OSError:
+            pass
+        total -= int(info.get("size") or 0)
+        blobs.pop(sha256, None)
+    index["keys"] = {k: v for k, v in index["keys"].items() if v in blobs}
+
+
+def _fetch_upload(
+    url: str,
+    dest_path: str,
+    *,
+    timeout: int = 45,
+    max_bytes: int | None = None,
+    budget: _ByteBudget | None = None,
+) -> dict[str, Any]:
+    root = _upload_store_root()
+    os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+    meta = _http_head(url, timeout)
+    if meta is not None and max_bytes is not None and meta["size"] > max_bytes:
+        raise _UploadLimitError(f"文件大小 {meta['size']} 字节超过单文件上限 {max_bytes} 字节")
+    key = _upload_key(url, meta) if meta is not None else None
+    lock_timeout = float(timeout) * 4
+
+    if key is not None:
+        with _cache_lock(os.path.join(root, "index.lock"), lock_timeout):
+            index = _load_index(root)
+            sha256 = index["keys"].get(key)
+            info = index["blobs"].get(sha256) if sha256 else None
+            if sha256 and info and _blob_intact(root, sha256, info):
+                if budget is not None:
+                    budget.consume(int(info["size"]))
+                try:
+                    _copy_blob(_blob_path(root, sha256), dest_path)
+                except BaseException:
+                    if budget is not None:
+                        budget.refund(int(info["size"]))
+                    raise
+                info["last_used"] = time.time()
+                _save_index(root, index)
+                return {"bytes": int(info["size"]), "sha256": sha256, "cached": True}
+
+    tmp = os.path.join(root, f"download-{uuid.uuid4().hex}.part")
+    charged = 0
+    try:
+        sha256, size = _download_to(url, tmp, timeout=timeout, max_bytes=max_bytes, budget=budget)
+        charged = size
+        if meta is not None and meta["size"] != size:
+            raise RuntimeError(f"下载不完整：期望 {meta['size']} 字节，实际 {size} 字节")
+        with _cache_lock(os.path.join(root, "index.lock"), lock_timeout):
+            index = _load_index(root)
+            blob = _blob_path(root, sha256)
+            info = index["blobs"].get(sha256)
+            if info is None or not _blob_intact(root, sha256, info):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(tmp, blob)
+                os.chmod(blob, 0o444)
+                info = {"size": size, "mtime_ns": os.stat(blob).st_mtime_ns}
+                index["blobs"][sha256] = info
+            info["last_used"] = time.time()
+            if key is not None:
+                index["keys"][key] = sha256
+            _copy_blob(blob, dest_path)
+            _evict_upload_store(root, index)
+            _save_index(root, index)
+    except BaseException:
+        if budget is not None and charged:
+            budget.refund(charged)
+        raise
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+    return {"bytes": size, "sha256": sha256, "cached": False}
+
+
+def _fetch_uploads(jobs: list[dict[str, Any]], uploads_dir: str, *, timeout: int = 45) -> list[dict[str, Any]]:
+    max_file = _env_int("SKILL_AGENT_UPLOAD_MAX_FILE_BYTES", UPLOAD_MAX_FILE_BYTES)
+    budget = _ByteBudget(_env_int("SKILL_AGENT_UPLOAD_MAX_TOTAL_BYTES", UPLOAD_MAX_TOTAL_BYTES))
+
+    def work(job: dict[str, Any]) -> dict[str, Any]:
+        dest = os.path.join(uploads_dir, str(job["filename"]))
+        try:
+            fetched = _fetch_upload(str(job["url"]), dest, timeout=timeout, max_bytes=max_file, budget=budget)
+        except Exception as e:
+            return {**job, "ok": False, "error": str(e) or e.__class__.__name__}
+        return {**job, "ok": True, **fetched}
+
+    if len(jobs) <= 1:
+        return [work(job) for job in jobs]
+    return list(_get_upload_executor().map(work, jobs))
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import atexit
+import itertools
+import json
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any
+
+from utils.skill_agent_constants import (
+    COMMAND_OUTPUT_HEAD_BYTES,
+    COMMAND_OUTPUT_TAIL_BYTES,
+    WARM_POOL_PRELOAD,
+    WARM_POOL_READY_TIMEOUT_SECONDS,
+    WARM_POOL_SIZE,
+)
+from utils.skill_agent_exec import _BoundedCapture, _command_timeout, _drain_pipe, _env_int
+
+_WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "skill_agent_warm_worker.py")
+
+# Modules that install packages or build environments must see a fresh interpreter, not preloaded state.
+_COLD_ONLY_MODULES = {"pip", "venv", "ensurepip", "virtualenv"}
+
+_WARM_POOL: "_WarmPool | None" = None
+_WARM_POOL_LOCK = threading.Lock()
+
+
+def _warm_pool_enabled() -> bool:
+    if os.name != "posix" or not hasattr(os, "fork"):
+        return False
+    return str(os.getenv("SKILL_AGENT_WARM_POOL") or "").strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _warm_pool_preload() -> list[str]:
+    raw = os.getenv("SKILL_AGENT_WARM_PRELOAD")
+    if raw is None:
+        return list(WARM_POOL_PRELOAD)
+    return [m.strip() for m in raw.split(",") if m.strip()]
+
+
+def _warm_python_target(args: list[str]) -> tuple[str, str, list[str]] | None:
+    if not args:
+        return None
+    first = str(args[0] or "")
+    if first == "-m":
+        if len(args) < 2 or not str(args[1] or "").strip():
+            return None
+        if str(args[1]).strip().split(".", 1)[0] in _COLD_ONLY_MODULES:
+            return None
+        return ("module", str(args[1]), [str(a) for a in args[2:]])
+    # Interpreter flags (-c, -u, -X ...) change startup semantics; leave those to a fresh process.
+    if first.startswith("-") or not first.lower().endswith(".py"):
+        return None
+    return ("script", first, [str(a) for a in args[1:]])
+
+
+def _open_output_fifo(path: str) -> tuple[int, int]:
+    # The child writes into a FIFO drained into a bounded capture, so a chatty script never fills the disk.
+    # The parent holds a write end until the child is reaped; otherwise the reader could see EOF before the
+    # child has opened its side.
+    os.mkfifo(path, 0o600)
+    read_fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        write_fd = os.open(path, os.O_WRONLY | os.O_NONBLOCK)
+    except OSError:
+        os.close(read_fd)
+        raise
+    os.set_blocking(read_fd, True)
+    return read_fd, write_fd
+
+
+class _WarmInterpreter:
+    def __init__(self, preload: list[str]) -> None:
+        self.preload = preload
+        self.proc: subprocess.Popen | None = None
+        self.ready = threading.Event()
+        self.dead = False
+        self.started_at = 0.0
+        self._lines: queue.Queue[dict[str, Any] | None] = queue.Queue()
+        self._ids = itertools.count(1)
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-u", _WORKER_SCRIPT, ",".join(self.preload)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def _read_loop(self) -> None:
+        proc = self.proc
+        try:
+            assert proc is not None and proc.stdout is not None
+            for raw in proc.stdout:
+                try:
+                    msg = json.loads(raw.decode("utf-8", errors="ignore"))
+                except Exception:
+                    continue
+                if not isinstance(msg, dict):
+                    continue
+                if msg.get("ready"):
+                    self.ready.set()
+                    continue
+                self._lines.put(msg)
+        except Exception:
+            pass
+        finally:
+            self.dead = True
+            self.ready.set()
+            self._lines.put(None)
+
+    def alive(self) -> bool:
+        return not self.dead and self.proc is not None and self.proc.poll() is None
+
+    def stalled(self) -> bool:
+        limit = float(_env_int("SKILL_AGENT_WARM_READY_TIMEOUT", WARM_POOL_READY_TIMEOUT_SECONDS))
+        return not self.ready.is_set() and time.monotonic() - self.started_at > limit
+
+    def _next(self, job_id: int, timeout: float) -> dict[str, Any] | None:
+        deadline = time.monotonic() + max(0.0, timeout)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            try:
+                msg = self._lines.get(timeout=remaining)
+            except queue.Empty:
+                raise TimeoutError
+            if msg is None:
+                return None
+            if msg.get("id") == job_id:
+                return msg
+
+    def run(
+        self,
+        *,
+        mode: str,
+        target: str,
+        args: list[str],
+        cwd: str,
+        timeout: float,
+        head_bytes: int,
+        tail_bytes: int,
+    ) -> dict[str, Any]:
+        proc = self.proc
+        if proc is None or proc.stdin is None:
+            raise RuntimeError("warm interpreter not started")
+        job_id = next(self._ids)
+        out_dir = tempfile.mkdtemp(prefix="skill-warm-")
+        stdout_path = os.path.join(out_dir, "stdout")
+        stderr_path = os.path.join(out_dir, "stderr")
+        stdout_cap = _BoundedCapture(head_bytes, tail_bytes)
+        stderr_cap = _BoundedCapture(head_bytes, tail_bytes)
+        hold_fds: list[int] = []
+        readers: list[threading.Thread] = []
+        started = time.monotonic()
+        try:
+            for path, cap in ((stdout_path, stdout_cap), (stderr_path, stderr_cap)):
+                read_fd, write_fd = _open_output_fifo(path)
+                hold_fds.append(write_fd)
+                reader = threading.Thread(
+                    target=_drain_pipe, args=(os.fdopen(read_fd, "rb", buffering=0), cap), daemon=True
+                )
+                reader.start()
+                readers.append(reader)
+            request = {
+                "id": job_id,
+                "mode": mode,
+                "target": target,
+                "args": args,
+                "cwd": cwd,
+                "stdout": stdout_path,
+                "stderr": stderr_path,
+            }
+            proc.stdin.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+            proc.stdin.flush()
+            started_msg = self._next(job_id, 30)
+            if started_msg is None or not isinstance(started_msg.get("pid"), int):
+                self.dead = True
+                raise RuntimeError("warm interpreter exited")
+            child_pid = int(started_msg["pid"])
+
+            timed_out = False
+            try:
+                done = self._next(job_id, timeout)
+            except TimeoutError:
+                timed_out = True
+                try:
+                    os.killpg(child_pid, signal.SIGKILL)
+                except OSError:
+                    pass
+                try:
+                    done = self._next(job_id, 10)
+                except TimeoutError:
+                    done = None
+            if done is None:
+                self.dead = True
+            returncode = done.get("returncode") if isinstance(done, dict) else None
+
+            while hold_fds:
+                os.close(hold_fds.pop())
+            for reader in readers:
+                reader.join(timeout=5)
+            result: dict[str, Any] = {
+                "returncode": returncode,
+                "stdout": stdout_cap.text(),
+                "stderr": stderr_cap.text(),
+                "stdout_bytes": stdout_cap.total,
+                "stderr_bytes": stderr_cap.total,
+                "stdout_truncated": stdout_cap.truncated,
+                "stderr_truncated": stderr_cap.truncated,
+                "duration_ms": int((time.monotonic() - started) * 1000),
+                "warm": True,
+            }
+            if timed_out:
+                result["timed_out"] = True
+                result["timeout_seconds"] = timeout
+            return result
+        finally:
+            for fd in hold_fds:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            shutil.rmtree(out_dir, ignore_errors=True)
+
+    def stop(self) -> None:
+        proc = self.proc
+        if proc is None:
+            return
+        self.dead = True
+        try:
+            if proc.stdin is not None:
+                proc.stdin.close()
+        except Exception:
+            pass
+        try:
+            proc.wait(timeout=2)
+        except Exception:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except Exception:
+                pass
+
+
+class _WarmPool:
+    def __init__(self, size: int, preload: list[str]) -> None:
+        self.size = max(1, int(size))
+        self.preload = preload
+        self._idle: list[_WarmInterpreter] = []
+        self._busy = 0
+        self._lock = threading.Lock()
+
+    def _spawn(self) -> _WarmInterpreter | None:
+        worker = _WarmInterpreter(self.preload)
+        try:
+            worker.start()
+        except Exception:
+            return None
+        return worker
+
+    def warm_up(self) -> None:
+        with self._lock:
+            while len(self._idle) + self._busy < self.size:
+                worker = self._spawn()
+                if worker is None:
+                    break
+                self._idle.append(worker)
+
+    def acquire(self) -> _WarmInterpreter | None:
+        # Never block on a busy or still-preloading worker: a cold subprocess is the fallback.
+        with self._lock:
+            keep: list[_WarmInterpreter] = []
+            for w in self._idle:
+                if w.alive() and not w.stalled():
+                    keep.append(w)
+                else:
+                    w.stop()
+            self._idle = keep
+            for i, worker in enumerate(self._idle):
+                if worker.ready.is_set() and worker.alive():
+                    self._busy += 1
+                    return self._idle.pop(i)
+        self.warm_up()
+        return None
+
+    def release(self, worker: _WarmInterpreter) -> None:
+        with self._lock:
+            self._busy = max(0, self._busy - 1)
+            if worker.alive():
+                self._idle.append(worker)
+                return
+        worker.stop()
+        self.warm_up()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            worker.stop()
+
+
+def _get_warm_pool() -> _WarmPool | None:
+    global _WARM_POOL
+    if not _warm_pool_enabled():
+        return None
+    with _WARM_POOL_LOCK:
+        if _WARM_POOL is None:
+            _WARM_POOL = _WarmPool(_env_int("SKILL_AGENT_WARM_POOL_SIZE", WARM_POOL_SIZE), _warm_pool_preload())
+            _WARM_POOL.warm_up()
+            atexit.register(_WARM_POOL.shutdown)
+        return _WARM_POOL
+
+
+def _run_warm_python(args: list[str], *, cwd: str, timeout: float | None = None) -> dict[str, Any] | None:
+    target = _warm_python_target(args)
+    if target is None:
+        return None
+    pool = _get_warm_pool()
+    if pool is None:
+        return None
+    worker = pool.acquire()
+    if worker is None:
+        return None
+    mode, name, rest = target
+    try:
+        return worker.run(
+            mode=mode,
+            target=name,
+            args=rest,
+            cwd=cwd,
+            timeout=_command_timeout(timeout),
+            head_bytes=_env_int("SKILL_AGENT_OUTPUT_HEAD_BYTES", COMMAND_OUTPUT_HEAD_BYTES),
+            tail_bytes=_env_int("SKILL_AGENT_OUTPUT_TAIL_BYTES", COMMAND_OUTPUT_TAIL_BYTES),
+        )
+    except Exception:
+        worker.dead = True
+        return None
+    finally:
+        pool.release(worker)
+
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import importlib
+import json
+import os
+import runpy
+import sys
+import traceback
+
+
+def _preload(modules: list[str]) -> list[str]:
+    loaded: list[str] = []
+    for name in modules:
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            importlib.import_module(name)
+            loaded.append(name)
+        except Exception:
+            continue
+    return loaded
+
+
+def _run_child(req: dict, proto_fd: int) -> None:
+    code = 0
+    try:
+        os.close(proto_fd)
+        os.setsid()
+        cwd = str(req.get("cwd") or os.getcwd())
+        os.chdir(cwd)
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        out_fd = os.open(str(req["stdout"]), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        err_fd = os.open(str(req["stderr"]), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.dup2(out_fd, 1)
+        os.dup2(err_fd, 2)
+        args = [str(a) for a in (req.get("args") or [])]
+        target = str(req.get("target") or "")
+        if req.get("mode") == "module":
+            sys.argv = ["-m", *args]
+            sys.path[0] = cwd
+            runpy.run_module(target, run_name="__main__", alter_sys=True)
+        else:
+            sys.argv = [target, *args]
+            sys.path[0] = os.path.dirname(os.path.abspath(target))
+            runpy.run_path(target, run_name="__main__")
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except Exception:
+            pass
+        os._exit(code & 0xFF)
+
+
+def main() -> None:
+    # Keep the protocol channel private so preloaded libraries printing to stdout cannot corrupt it.
+    proto_fd = os.dup(1)
+    os.dup2(2, 1)
+    proto = os.fdopen(proto_fd, "w", buffering=1, encoding="utf-8")
+    loaded = _preload(sys.argv[1].split(",") if len(sys.argv) > 1 else [])
+    proto.write(json.dumps({"ready": True, "preloaded": loaded}) + "\n")
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            req = json.loads(line)
+        except Exception:
+            continue
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            _run_child(req, proto_fd)
+        proto.write(json.dumps({"id": req.get("id"), "pid": pid}) + "\n")
+        _, status = os.waitpid(pid, 0)
+        if os.WIFSIGNALED(status):
+            returncode = -os.WTERMSIG(status)
+        else:
+            returncode = os.WEXITSTATUS(status)
+        proto.write(json.dumps({"id": req.get("id"), "returncode": returncode}) + "\n")
+
+
+if __name__ == "__main__":
+    main()
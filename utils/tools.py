@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+import codecs
+import fnmatch
 import json
 import mimetypes
 import os
 import re
+import threading
 import uuid
+from collections.abc import Iterator
 from typing import Any, TypeVar
 from urllib.parse import urlparse
-from urllib.request import Request, urlopen
+
+from utils.skill_agent_http import _http_get_bytes
 
 
 def _safe_get(obj: Any, key: str) -> Any:
@@ -78,32 +83,321 @@ def _read_text(path: str, max_chars: int = 12000) -> str:
         return f.read(max_chars)
 
 
-def _list_dir(root: str, max_depth: int = 2) -> list[dict[str, Any]]:
+_LINE_INDEX_STRIDE = 1024
+_LINE_INDEX_CACHE: dict[tuple[str, int, int], list[int]] = {}
+_LINE_INDEX_CACHE_MAX = 64
+_LINE_INDEX_LOCK = threading.Lock()
+
+
+def _utf8_tail_cut(buf: bytes) -> int:
+    # Length of buf without a trailing, incomplete UTF-8 sequence.
+    n = len(buf)
+    i = n - 1
+    while i >= 0 and n - i <= 4 and (buf[i] & 0xC0) == 0x80:
+        i -= 1
+    if i < 0 or n - i > 4:
+        return n
+    lead = buf[i]
+    if lead >= 0xF0:
+        need = 4
+    elif lead >= 0xE0:
+        need = 3
+    elif lead >= 0xC0:
+        need = 2
+    else:
+        need = 1
+    return n if n - i >= need else i
+
+
+def _read_text_head(path: str, max_chars: int = 12000) -> tuple[str, int]:
+    # Same text as _read_text (undecodable bytes dropped, then newlines folded to "\n"), read in binary so
+    # the returned byte count is a valid offset for _read_text_range.
+    limit = max(0, int(max_chars))
+    with open(path, "rb") as f:
+        raw = f.read(limit * 4 + 1)
+        if b"\r" not in raw:
+            cut = _utf8_tail_cut(raw) if len(raw) == limit * 4 + 1 else len(raw)
+            try:
+                text = raw[:cut].decode("utf-8")
+            except UnicodeDecodeError:
+                pass
+            else:
+                head = text[:limit]
+                return head, len(head.encode("utf-8"))
+
+        def chars() -> Iterator[str]:
+            decoder = codecs.getincrementaldecoder("utf-8")("surrogateescape")
+            chunk = raw
+            while chunk:
+                yield from decoder.decode(chunk)
+                chunk = f.read(65536)
+            yield from decoder.decode(b"", final=True)
+
+        out: list[str] = []
+        consumed = 0
+        after_cr = False
+        for ch in chars():
+            if "\udc80" <= ch <= "\udcff":
+                consumed += 1
+                continue
+            if after_cr and ch == "\n":
+                after_cr = False
+                consumed += 1
+                continue
+            if len(out) >= limit:
+                break
+            after_cr = ch == "\r"
+            out.append("\n" if after_cr else ch)
+            consumed += len(ch.encode("utf-8"))
+    return "".join(out), consumed
+
+
+def _line_offset(f: Any, key: tuple[str, int, int], line_no: int) -> int | None:
+    with _LINE_INDEX_LOCK:
+        checkpoints = _LINE_INDEX_CACHE.get(key)
+        if checkpoints is None:
+            while len(_LINE_INDEX_CACHE) >= _LINE_INDEX_CACHE_MAX:
+                _LINE_INDEX_CACHE.pop(next(iter(_LINE_INDEX_CACHE)), None)
+            checkpoints = [0]
+            _LINE_INDEX_CACHE[key] = checkpoints
+    target = line_no - 1
+    slot = min(target // _LINE_INDEX_STRIDE, len(checkpoints) - 1)
+    f.seek(checkpoints[slot])
+    current = slot * _LINE_INDEX_STRIDE
+    while current < target:
+        if not f.readline():
+            return None
+        current += 1
+        if current % _LINE_INDEX_STRIDE == 0 and current // _LINE_INDEX_STRIDE == len(checkpoints):
+            with _LINE_INDEX_LOCK:
+                if current // _LINE_INDEX_STRIDE == len(checkpoints):
+                    checkpoints.append(f.tell())
+    return f.tell()
+
+
+def _read_text_range(
+    path: str,
+    *,
+    offset: int | None = None,
+    length: int | None = None,
+    start_line: int | None = None,
+    end_line: int | None = None,
+    max_bytes: int = 12000,
+) -> dict[str, Any]:
+    st = os.stat(path)
+    total = st.st_size
+    limit = max(1, int(length if length is not None else max_bytes))
+    with open(path, "rb") as f:
+        if start_line is not None or end_line is not None:
+            first = max(1, int(start_line or 1))
+            last = int(end_line) if end_line is not None else None
+            pos = _line_offset(f, (os.path.abspath(path), st.st_mtime_ns, total), first)
+            if pos is None:
+                return {
+                    "content": "",
+                    "start_line": first,
+                    "end_line": first - 1,
+                    "total_bytes": total,
+                    "next_line": None,
+                    "eof": True,
+                }
+            chunks: list[bytes] = []
+            used = 0
+            line_no = first - 1
+            while last is None or line_no < last:
+                line = f.readline()
+                if not line:
+                    break
+                if used + len(line) > limit and chunks:
+                    f.seek(-len(line), os.SEEK_CUR)
+                    break
+                if len(line) > limit:
+                    # A single line longer than the page: return its head and continue by byte offset.
+                    part = line[:limit]
+                    part = part[: _utf8_tail_cut(part)] or part
+                    end_pos = pos + len(part)
+                    return {
+                        "content": part.decode("utf-8", errors="ignore"),
+                        "start_line": first,
+                        "end_line": first,
+                        "offset": pos,
+                        "bytes_read": len(part),
+                        "total_bytes": total,
+                        "line_truncated": True,
+                        "next_line": first + 1 if last is None or first < last else None,
+                        "next_offset": end_pos,
+                        "eof": False,
+                    }
+                chunks.append(line)
+                used += len(line)
+                line_no += 1
+            end_pos = f.tell()
+            eof = end_pos >= total
+            return {
+                "content": b"".join(chunks).decode("utf-8", errors="ignore"),
+                "start_line": first,
+                "end_line": line_no,
+                "offset": pos,
+                "bytes_read": used,
+                "total_bytes": total,
+                "next_line": None if eof or (last is not None and line_no >= last) else line_no + 1,
+                "next_offset": None if eof else end_pos,
+                "eof": eof,
+            }
+
+        start = max(0, min(int(offset or 0), total))
+        f.seek(start)
+        raw = f.read(limit + 3)
+    skip = 0
+    while skip < 3 and skip < len(raw) and (raw[skip] & 0xC0) == 0x80:
+        skip += 1
+    data = raw[skip : skip + limit]
+    if start + skip + len(data) < total:
+        data = data[: _utf8_tail_cut(data)] or data
+    end = start + skip + len(data)
+    eof = end >= total
+    return {
+        "content": data.decode("utf-8", errors="ignore"),
+        "offset": start + skip,
+        "bytes_read": len(data),
+        "total_bytes": total,
+        "next_offset": None if eof else end,
+        "eof": eof,
+    }
+
+
+def _coerce_optional_int(value: Any) -> int | None:
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _coerce_string_list(value: Any) -> list[str]:
+    if isinstance(value, str):
+        value = [v for v in value.replace(",", " ").split()]
+    if not isinstance(value, list):
+        return []
+    return [str(v).strip() for v in value if str(v or "").strip()]
+
+
+LIST_DIR_DEFAULT_IGNORE: tuple[str, ...] = (
+    "node_modules",
+    ".git",
+    "__pycache__",
+    ".venv",
+    "venv",
+    ".mypy_cache",
+    ".pytest_cache",
+    "*.pyc",
+    ".DS_Store",
+)
+LIST_DIR_COUNT_LIMIT = 100000
+
+
+def _matches_any(name: str, patterns: tuple[str, ...]) -> bool:
+    for p in patterns:
+        if name == p or (any(c in p for c in "*?[") and fnmatch.fnmatchcase(name, p)):
+            return True
+    return False
+
+
+def _iter_dir(
+    root: str,
+    max_depth: int = 2,
+    *,
+    ignore: tuple[str, ...] | None = LIST_DIR_DEFAULT_IGNORE,
+    with_stat: bool = False,
+) -> Iterator[dict[str, Any]]:
     root_abs = os.path.abspath(root)
-    entries: list[dict[str, Any]] = []
-    root_depth = root_abs.count(os.sep)
-    for current_root, dirs, files in os.walk(root_abs):
-        depth = current_root.count(os.sep) - root_depth
-        if depth > max_depth:
-            dirs[:] = []
+    patterns = tuple(ignore or ())
+    stack: list[tuple[str, int]] = [(root_abs, 0)]
+    while stack:
+        current, depth = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                items = list(it)
+        except OSError:
             continue
-        for name in sorted(dirs):
-            entries.append(
-                {
-                    "type": "dir",
-                    "path": os.path.join(current_root, name),
-                    "relative_path": os.path.relpath(os.path.join(current_root, name), root_abs),
+        dirs: list[os.DirEntry[str]] = []
+        files: list[os.DirEntry[str]] = []
+        for entry in items:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            (dirs if is_dir else files).append(entry)
+        dirs.sort(key=lambda e: e.name)
+        files.sort(key=lambda e: e.name)
+        descend: list[str] = []
+        for group, kind in ((dirs, "dir"), (files, "file")):
+            for entry in group:
+                pruned = bool(patterns) and _matches_any(entry.name, patterns)
+                if pruned and kind == "file":
+                    continue
+                item: dict[str, Any] = {
+                    "type": kind,
+                    "path": entry.path,
+                    "relative_path": os.path.relpath(entry.path, root_abs),
                 }
-            )
-        for name in sorted(files):
-            entries.append(
-                {
-                    "type": "file",
-                    "path": os.path.join(current_root, name),
-                    "relative_path": os.path.relpath(os.path.join(current_root, name), root_abs),
-                }
-            )
-    return entries
+                if pruned:
+                    item["pruned"] = True
+                if with_stat:
+                    try:
+                        st = entry.stat(follow_symlinks=False)
+                        if kind == "file":
+                            item["bytes"] = st.st_size
+                        item["mtime"] = int(st.st_mtime)
+                        item["mtime_ns"] = st.st_mtime_ns
+                    except OSError:
+                        pass
+                yield item
+                if kind == "dir" and not pruned and depth < max_depth:
+                    try:
+                        if not entry.is_symlink():
+                            descend.append(entry.path)
+                    except OSError:
+                        continue
+        for path in reversed(descend):
+            stack.append((path, depth + 1))
+
+
+def _list_dir(
+    root: str,
+    max_depth: int = 2,
+    *,
+    ignore: tuple[str, ...] | None = LIST_DIR_DEFAULT_IGNORE,
+    with_stat: bool = False,
+) -> list[dict[str, Any]]:
+    return list(_iter_dir(root, max_depth=max_depth, ignore=ignore, with_stat=with_stat))
+
+
+def _list_dir_bounded(
+    root: str,
+    max_depth: int = 2,
+    *,
+    max_entries: int = 500,
+    ignore: tuple[str, ...] | None = LIST_DIR_DEFAULT_IGNORE,
+    with_stat: bool = False,
+) -> dict[str, Any]:
+    limit = max(1, int(max_entries))
+    entries: list[dict[str, Any]] = []
+    omitted = 0
+    for item in _iter_dir(root, max_depth=max_depth, ignore=ignore, with_stat=with_stat):
+        if len(entries) < limit:
+            entries.append(item)
+            continue
+        omitted += 1
+        if omitted >= LIST_DIR_COUNT_LIMIT:
+            break
+    result: dict[str, Any] = {"entries": entries, "truncated": omitted > 0}
+    if omitted:
+        result["omitted"] = omitted
+        if omitted >= LIST_DIR_COUNT_LIMIT:
+            result["omitted_is_lower_bound"] = True
+    return result
 
 
 def _parse_frontmatter(content: str) -> dict[str, str]:
@@ -356,6 +650,4 @@ def _safe_filename(preferred_name: str | None, fallback_ext: str = "") -> str:
     return f"{uuid.uuid4().hex}{fallback_ext}"
 
 def _download_file_content(url: str, timeout: int = 30) -> bytes:
-    req = Request(url, headers={"User-Agent": "dify-plugin-skill/1.0"})
-    with urlopen(req, timeout=timeout) as resp:
-        return resp.read()
+    return _http_get_bytes(url, timeout=timeout)